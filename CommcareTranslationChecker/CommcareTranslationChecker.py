@@ -1,24 +1,68 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 import argparse
+import cProfile
+import collections
+import concurrent.futures
+import contextlib
 import datetime
+import functools
+import glob
+import io
+import itertools
+import multiprocessing
+import operator
 import os
-import re
 import sys
+import time
 import traceback as tb
+import zipfile
 
 import openpyxl as xl
 
-from .exceptions import FatalError
+from .exceptions import CheckCancelled, FatalError
+from .profiling import CheckFunctions, Profile
+from .reports import REPORT_FORMATS, ReportRecordList, createReportWriter
+from .results import MismatchStore
+from .rules import RULES, CellComparison, RuleSet
+from .spill import MB, MemoryBudget, SpooledWorkbook, spoolOutputRow
+from .xlsx_patch import WorksheetPatch, savePatchedWorkbook
+from .xlsx_reader import READERS, openWorkbook
 from .utils import (BLOCK_FORMATTING_TAGS, INLINE_FORMATTING_TAGS,
-                    fix_block_tags_mismatch, normalizeQuotes,
-                    regex_match_count, removeExtraOutputValues,
-                    swapOutputValues)
+                    block_structure, cell_signature, fix_block_structure,
+                    fix_output_values, fixed_format_tag_counts, format_tag_counts,
+                    get_character_counter, normalizeQuotes,
+                    tokenize_output_values)
+
+# Result of checking a workbook, see check_workbook
+# file (str): Path of the workbook
+# wbOut (xl.Workbook): Output workbook
+# messages (list): Summary messages
+# wsMismatchDict (dict): Number of mismatched rows of each worksheet that has any, by title
+# missingSheets (list): Sheets missing from the workbook according to the configuration sheet
+# rowCount (int): Number of rows checked
+# error (str): Why the workbook could not be checked, None if it was
+# mismatches (results.MismatchStore): Mismatch of every mismatched cell, None unless keepMismatches was passed (see
+# check_workbook) or if the workbook could not be checked
+WorkbookResult = collections.namedtuple(
+    'WorkbookResult', ['file', 'wbOut', 'messages', 'wsMismatchDict', 'missingSheets', 'rowCount', 'error',
+                       'mismatches'], defaults=(None,))
+
+# Result of checking a worksheet, see WorksheetChecker.getSummary
+WorksheetSummary = collections.namedtuple(
+    'WorksheetSummary', ['title', 'mismatchCount', 'missingSheetList', 'rowCount', 'cellCount', 'mismatchFlagIdx'])
 
 # DEFINE GLOBALS #
 NON_LINGUISTIC_CHARACTERS = "~`!@#$%^&*()_-+={[}]|\\:;\"'<,>.?/"
 MISMATCH_FILL_STYLE_NAME = "mismatchFillStyle"
+SPARSE_ROW_NUMBER_COLUMN = "input_row"
+OUTPUT_ENGINES = ("workbook", "patch")
 LESSER_MISMATCH_FILL_STYLE_NAME = "lesserMismatchFillStyle"
+DEFAULT_CHUNK_ROWS = 5000
+DEFAULT_MEMO_SIZE = 65536
+# Comparisons kept with --dedup-pairs, unless --memo-size is larger, so that workbooks with more unique pairs than
+# this do not keep every one of them
+DEFAULT_DEDUP_MEMO_SIZE = 1 << 20
 
 # DEFINE COLORS
 RED = '00FF0000'
@@ -28,9 +72,12 @@ YELLOW = '00FFFF00'
 # DEFINE METHODS #
 
 
-def parseArguments():
+def getArgumentParser():
     parser = argparse.ArgumentParser()
-    parser.add_argument("file", help="Location of Translation file to check", type=str)
+    parser.add_argument("file",
+                        help="Location of Translation file to check. Several files, directories containing .xlsx "
+                             "files and glob patterns can be passed to check them all in one run.",
+                        type=str, nargs="+")
     parser.add_argument("--columns",
                         help="Comma-separated list of column names to check. "
                              "By default, all columns that start with 'default_' will be checked.",
@@ -73,6 +120,15 @@ def parseArguments():
     parser.add_argument("--skip-format-check",
                         help="If passed, check for text formatting and output values will be skipped.",
                         action="store_true", default=False, dest="skipFormatCheckFlag")
+    parser.add_argument("--skip-rules",
+                        help="Comma-separated list of the rules not to run on the compared cells, among %s. "
+                             "--skip-format-check skips character_counts and format_tags." % (",".join(RULES),),
+                        type=str, default=None, dest="skipRules")
+    parser.add_argument("--no-prefilter",
+                        help="If passed, every compared cell is analysed, even when a cheap signature of the cell "
+                             "and of its base cell proves they cannot mismatch. Only useful to measure the time the "
+                             "signatures save; the results are the same.",
+                        action="store_false", default=True, dest="prefilterFlag")
     parser.add_argument("--format-check-characters",
                         help="A list of characters considered non-linguistic that will be counted when "
                              "format-check is run. The characters \\ and \" need to be escaped as \\\\ and \\\". "
@@ -82,8 +138,96 @@ def parseArguments():
                         help="A list of characters to be added to the default or passed format-check-characters "
                              "list. The characters \\ and \" need to be escaped as \\\\ and \\\". Defaults to None.",
                         type=str, default=None, dest="formatCheckCharactersAdd")
+    parser.add_argument("--stream",
+                        help="If passed, the file is read and the output file written one row at a time, so that "
+                             "memory use does not grow with the size of the workbook. Useful for very large files. "
+                             "With --output-mismatch-types, a mismatch column is added for every compared column.",
+                        action="store_true", default=False)
+    parser.add_argument("--jobs", "-j",
+                        help="Number of processes in which worksheets are checked in parallel. "
+                             "0 uses one process per CPU. Defaults to 1.",
+                        type=int, default=1)
+    parser.add_argument("--chunk-rows",
+                        help="When checking in several processes, worksheets with more rows than this are checked "
+                             "in chunks of this many rows, spread over all of the processes. 0 checks every "
+                             "worksheet in a single process. Defaults to %s." % (DEFAULT_CHUNK_ROWS,),
+                        type=int, default=DEFAULT_CHUNK_ROWS, dest="chunkRows")
+    parser.add_argument("--memo-size",
+                        help="Number of comparisons of pairs of cell values kept, so that values repeated across "
+                             "the workbook are only compared once. 0 compares every row. Defaults to %s." %
+                             (DEFAULT_MEMO_SIZE,),
+                        type=int, default=DEFAULT_MEMO_SIZE, dest="memoSize")
+    parser.add_argument("--dedup-pairs",
+                        help="If passed, every unique pair of base and translated values of the workbook is only "
+                             "compared once, up to %s pairs or --memo-size if larger, and the number of unique "
+                             "pairs and the repetition factor of the workbook are reported in the summary. With "
+                             "--jobs, the unique pairs are compared in the worker processes before the rows are "
+                             "checked in the main process, unless --max-mismatches is passed." %
+                             (DEFAULT_DEDUP_MEMO_SIZE,),
+                        action="store_true", default=False, dest="dedupPairsFlag")
+    parser.add_argument("--profile",
+                        help="If passed, the time spent in each phase (load, read, check, copy, save), in each "
+                             "worksheet and in each check is written as a JSON report to the given file, or printed "
+                             "if no file is given.",
+                        type=str, nargs="?", const="-", default=None)
+    parser.add_argument("--profile-stats",
+                        help="If passed, cProfile statistics of the run are saved to the given file, to be read "
+                             "with pstats or snakeviz.",
+                        type=str, default=None, dest="profileStatsFile")
+    parser.add_argument("--report-format",
+                        help="If passed, a record is written for each mismatched cell as the rows are checked, as "
+                             "JSON lines or CSV, instead of building an output file. Records have the file, sheet, "
+                             "row, column, mismatch types and proposed fix of the cell.",
+                        type=str, choices=REPORT_FORMATS, default=None, dest="reportFormat")
+    parser.add_argument("--report-file",
+                        help="File the --report-format records are written to. Defaults to printing them, in which "
+                             "case every other message is printed to stderr.",
+                        type=str, default="-", dest="reportFile")
+    parser.add_argument("--sparse-output",
+                        help="If passed, the output file only has the worksheets and rows with mismatches or "
+                             "missing sheets, with their row number in the input file in an %s column." %
+                             (SPARSE_ROW_NUMBER_COLUMN,),
+                        action="store_true", default=False, dest="sparseOutputFlag")
+    parser.add_argument("--output-engine",
+                        help="How the output file is built. 'workbook' (the default) copies every cell to a new "
+                             "workbook. 'patch' copies the input file and only rewrites the worksheets with "
+                             "compared columns, keeping the formatting and column widths of the input file, and is "
+                             "much faster on large files.",
+                        type=str, choices=OUTPUT_ENGINES, default="workbook", dest="outputEngine")
+    parser.add_argument("--reader",
+                        help="How the input file is read. 'openpyxl' (the default) builds the cells of every "
+                             "worksheet with openpyxl. 'xml' parses the worksheets directly, and with "
+                             "--report-format or --output-engine patch only reads the compared columns. Files that "
+                             "cannot be read that way are read with openpyxl.",
+                        type=str, choices=READERS, default="openpyxl")
+    parser.add_argument("--memory-budget",
+                        help="If passed, the input file is read one row at a time, and the output rows (or flagged "
+                             "rows with --output-engine patch) kept until the output file is written, and the "
+                             "mismatches kept from Python, are limited to this many MB in memory, the rest being "
+                             "spilled to a temporary file. The budget does not cover the comparison memo (see "
+                             "--memo-size and --dedup-pairs), the shared strings of the input file, nor the rows of "
+                             "the worksheet each worker process checks with --jobs. The MB spilled and the peak RSS, "
+                             "which includes this memory, are added to the summary.",
+                        type=float, default=None, dest="memoryBudgetMb")
+    parser.add_argument("--max-mismatches",
+                        help="If passed, checking stops as soon as the workbook has more than this number of "
+                             "mismatched rows and missing sheets, and the command exits with status 1. No output "
+                             "file is built, and worksheets are checked largest first after the configuration "
+                             "sheet. Useful to gate CI on translation files.",
+                        type=int, default=None, dest="maxMismatches")
+    parser.add_argument("--fail-fast",
+                        help="Same as --max-mismatches 0: stop at the first mismatched row or missing sheet.",
+                        action="store_const", const=0, dest="maxMismatches")
     parser.add_argument("--debug-mode", "-d", action="store_true", default=False, dest="debugMode")
-    return parser.parse_args()
+    return parser
+
+
+def parseArguments(argv=None):
+    """
+    Output:
+    argparse.Namespace of the options. file is the list of paths passed, see validate_workbooks
+    """
+    return getArgumentParser().parse_args(argv)
 
 
 def register_styles(wb):
@@ -112,31 +256,40 @@ def convertCellToOutputValueList(cell):
     List of unicode objects, each representing an instance of <output value...> in cell.
     Any of these values that appear suspicious will be prepended with "ILL-FORMATTED TAG : "
     """
-    messages = []
-    openTag = "<output value=\""
-    closeTag = "\"/>"
-    outputList = []
-    currentIndex = 0
     try:
-        while cell.value[currentIndex:].find(openTag) != -1:
-            currentIndex += cell.value[currentIndex:].find(openTag) + len(openTag)
-            closeTagIndex = cell.value[currentIndex:].find(closeTag)
-            if closeTagIndex != -1:
-                outputValue = cell.value[currentIndex:closeTagIndex + currentIndex]
-                if outputValue.find(openTag) == -1:
-                    outputList.append(outputValue)
-                else:
-                    outputList.append("ILL-FORMATTED TAG : " + outputValue)
-            else:
-                outputValue = cell.value[currentIndex:]
-                messages.append("closeTag not found for " + outputValue)
-                outputList.append("ILL-FORMATTED TAG : " + outputValue)
-    except TypeError:
-        return [], messages
+        return convertValueToOutputValueList(cell.value)
     except Exception as e:
         raise FatalError("FATAL ERROR determining output values for worksheet %s cell %s : %s" %
                          (cell.parent.title, cell.coordinate, str(e)))
 
+
+def convertValueToOutputValueList(value, tokens=None):
+    """
+    Convert a cell value to a list of <output value...> tags contained within it
+
+    Input:
+    value (str): Cell value to be parsed
+    tokens (list [opt]): utils.tokenize_output_values(value), if already computed
+
+    Output:
+    List of unicode objects, each representing an instance of <output value...> in value.
+    Any of these values that appear suspicious will be prepended with "ILL-FORMATTED TAG : "
+    """
+    messages = []
+    outputList = []
+    if tokens is None:
+        try:
+            tokens = tokenize_output_values(value)
+        except (AttributeError, TypeError):
+            return [], messages
+    for token in tokens:
+        if not token.closed:
+            messages.append("closeTag not found for " + token.value)
+        if token.ill_formatted:
+            outputList.append("ILL-FORMATTED TAG : " + token.value)
+        else:
+            outputList.append(token.value)
+
     return outputList, messages
 
 
@@ -191,17 +344,9 @@ def getNonLinguisticCharacterCount(val, characterList=NON_LINGUISTIC_CHARACTERS,
     Output:
     Dictionary mapping non-linguistic character to count of appearance in val 
     """
-    charCountDict = {}
     if val is None:
         val = ""
-
-    if additionalCharactersToCatch:
-        characterList += "".join([x for x in additionalCharactersToCatch if x not in characterList])
-
-    for char in characterList:
-        charCountDict[char] = val.count(char)
-
-    return charCountDict
+    return get_character_counter(characterList, additionalCharactersToCatch).count(val)
 
 
 def get_invalid_format_tags(base_column_value, output_column_value):
@@ -209,26 +354,485 @@ def get_invalid_format_tags(base_column_value, output_column_value):
     checks for number of occurrences of specific formatting tags in between base and output column
     :return: list of tags that don't match for the number of occurrences in both sentences
     """
+    if not base_column_value or not output_column_value:
+        return [], []
+    return get_invalid_format_tags_from_counts(format_tag_counts(base_column_value),
+                                               format_tag_counts(output_column_value))
+
+
+def get_invalid_format_tags_from_counts(base_column_counts, output_column_counts):
+    """
+    Same as get_invalid_format_tags, for tag counts already computed by format_tag_counts
+    :return: list of inline tags and list of block tags whose counts don't match
+    """
     invalid_inline_format_tags = []
     invalid_block_format_tags = []
-    if not base_column_value or not output_column_value:
-        return invalid_inline_format_tags, invalid_block_format_tags
-    for tag in INLINE_FORMATTING_TAGS:
-        base_column_matches_count = len(re.findall(tag, base_column_value))
-        output_column_matches_count = len(re.findall(tag, output_column_value))
-        if base_column_matches_count != output_column_matches_count:
+    for index, tag in enumerate(INLINE_FORMATTING_TAGS):
+        if base_column_counts[index] != output_column_counts[index]:
             invalid_inline_format_tags.append(tag)
-    for tag in BLOCK_FORMATTING_TAGS:
-        base_column_matches_count = regex_match_count(tag, base_column_value)
-        output_column_matches_count = regex_match_count(tag, output_column_value)
-        if base_column_matches_count != output_column_matches_count:
+    for index, tag in enumerate(BLOCK_FORMATTING_TAGS, len(INLINE_FORMATTING_TAGS)):
+        if base_column_counts[index] != output_column_counts[index]:
             invalid_block_format_tags.append(tag)
     return invalid_inline_format_tags, invalid_block_format_tags
 
 
+# Functions of the checks, as called when they are not timed, see rules.RuleSet.startTiming
+CHECKS = CheckFunctions(globals())
+
+
+class CellAnalysis(object):
+    """
+    Everything the rules need to know about a single cell value. It is computed once per cell, so that the
+    base column of a row is analysed once rather than once for every column compared against it. The output values
+    are analysed up front, as are the character counts unless countCharacters is False; the rest is only analysed
+    when a rule needs it.
+
+    Input:
+    value (str): Cell value to analyse
+    ignoreOrder, skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd: see checkRowForMismatch
+    countCharacters (bool [opt]): If False, the character counts are only computed when a rule needs them
+    checks (profiling.CheckFunctions [opt]): Functions of the checks the value is analysed with, see
+    rules.RuleSet.checks. Defaults to CHECKS.
+    """
+    __slots__ = ('value', 'outputValueTokens', 'outputValueList', 'messages', 'skipFormatCheckFlag',
+                 'formatCheckCharacters', 'formatCheckCharactersAdd', 'checks', '_normalizedText', '_formatDict',
+                 '_formatTagCounts', '_blockStructure')
+
+    def __init__(self, value, ignoreOrder=False, skipFormatCheckFlag=False, formatCheckCharacters=None,
+                 formatCheckCharactersAdd=None, countCharacters=True, checks=None):
+        if checks is None:
+            checks = CHECKS
+        self.checks = checks
+        self.value = value
+        try:
+            self.outputValueTokens = checks.tokenize_output_values(value)
+        except (AttributeError, TypeError):
+            self.outputValueTokens = []
+        self.outputValueList, self.messages = checks.convertValueToOutputValueList(value, self.outputValueTokens)
+        if ignoreOrder:
+            self.outputValueList = sorted(self.outputValueList)
+        self.skipFormatCheckFlag = skipFormatCheckFlag
+        self.formatCheckCharacters = formatCheckCharacters
+        self.formatCheckCharactersAdd = formatCheckCharactersAdd
+        self._normalizedText = None
+        self._formatDict = None
+        self._formatTagCounts = None
+        self._blockStructure = None
+        if countCharacters and not skipFormatCheckFlag:
+            self._countCharacters()
+
+    def _countCharacters(self):
+        self._normalizedText = self.checks.normalizeQuotes(self.value)
+        self._formatDict = self.checks.getNonLinguisticCharacterCount(self._normalizedText, self.formatCheckCharacters,
+                                                                      self.formatCheckCharactersAdd)
+
+    @property
+    def normalizedText(self):
+        """
+        Value with its quotes normalized, see utils.normalizeQuotes. None with skipFormatCheckFlag.
+        """
+        if self.skipFormatCheckFlag:
+            return None
+        if self._formatDict is None:
+            self._countCharacters()
+        return self._normalizedText
+
+    @property
+    def formatDict(self):
+        """
+        Count of each non-linguistic character in the value, see getNonLinguisticCharacterCount. Empty with
+        skipFormatCheckFlag.
+        """
+        if self.skipFormatCheckFlag:
+            return {}
+        if self._formatDict is None:
+            self._countCharacters()
+        return self._formatDict
+
+    @property
+    def formatTagCounts(self):
+        """
+        Count of each format tag in the value, see utils.format_tag_counts. None for an empty value or with
+        skipFormatCheckFlag.
+        """
+        if self._formatTagCounts is None and self.value and not self.skipFormatCheckFlag:
+            self._formatTagCounts = self.checks.format_tag_counts(self.value, self.blockStructure)
+        return self._formatTagCounts
+
+    @property
+    def blockStructure(self):
+        """
+        Lines of the value classified by their block tags, see utils.BlockStructure. None for an empty value or with
+        skipFormatCheckFlag.
+        """
+        if self._blockStructure is None and self.value and not self.skipFormatCheckFlag:
+            self._blockStructure = self.checks.block_structure(self.value)
+        return self._blockStructure
+
+    @property
+    def lines(self):
+        """
+        Lines of the value. None for an empty value or with skipFormatCheckFlag.
+        """
+        blockStructure = self.blockStructure
+        return blockStructure.lines if blockStructure is not None else None
+
+    @property
+    def blockTagPrefixes(self):
+        """
+        Block tag prefix of each line of the value, see utils.block_tag_prefixes
+        """
+        return self.blockStructure.prefixes
+
+    def fixBlockTags(self, baseAnalysis, analysisOptions):
+        """
+        Fix the block tags of the value to those of the base cell, see utils.fix_block_structure. The format tags of
+        the fixed value are counted from those of the value, only the fixed lines being scanned again.
+
+        Input:
+        baseAnalysis (CellAnalysis): Analysis of the base cell
+        analysisOptions (tuple): Options the fixed value is analysed with, see rules.CellComparison
+
+        Output:
+        CellAnalysis of the fixed value, None if the block tags could not be fixed or the value is unchanged
+        """
+        blockFix = self.checks.fix_block_structure(baseAnalysis.blockStructure, self.blockStructure)
+        if blockFix is None or blockFix.text == self.value:
+            return None
+        fixAnalysis = CellAnalysis(blockFix.text, *analysisOptions)
+        fixAnalysis._blockStructure = blockFix.structure
+        fixAnalysis._formatTagCounts = self.checks.fixed_format_tag_counts(self.formatTagCounts, self.blockStructure,
+                                                                           blockFix)
+        return fixAnalysis
+
+    def getInvalidFormatTags(self, other):
+        """
+        Same as get_invalid_format_tags(self.value, other.value), using the precomputed tag counts
+        """
+        if not self.value or not other.value:
+            return [], []
+        return self.checks.get_invalid_format_tags_from_counts(self.formatTagCounts, other.formatTagCounts)
+
+
+class ComparisonMemo(object):
+    """
+    Bounded least-recently-used memo of the comparisons of pairs of cell values, see compareRowValues. Bulk
+    translation files repeat the same labels across many forms and modules, so most pairs are only compared once.
+    Values read from the shared strings of a file are the same string objects wherever they occur, so their hashes
+    are only computed once.
+
+    Input:
+    maxSize (int): Maximum number of comparisons kept, None to keep every comparison so that each unique pair is
+    only compared once
+    """
+    __slots__ = ('maxSize', 'hits', 'misses', 'evictions', '_comparisons', '_precomputed')
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        # Comparisons dropped as the memo was full, whose pairs are compared again if they occur again
+        self.evictions = 0
+        self._comparisons = collections.OrderedDict()
+        # Comparisons added before their pair was looked up, see addPrecomputed
+        self._precomputed = {}
+
+    def __len__(self):
+        return len(self._comparisons)
+
+    def get(self, key):
+        """
+        Output:
+        The comparison stored for key, None if there is none
+        """
+        comparison = self._comparisons.get(key)
+        if comparison is None:
+            self.misses += 1
+            if self._precomputed:
+                comparison = self._precomputed.pop(key, None)
+                if comparison is not None:
+                    self.put(key, comparison)
+        else:
+            self.hits += 1
+            if self.maxSize is not None:
+                self._comparisons.move_to_end(key)
+        return comparison
+
+    def put(self, key, comparison):
+        self._comparisons[key] = comparison
+        if self.maxSize is not None and len(self._comparisons) > self.maxSize:
+            self._comparisons.popitem(last=False)
+            self.evictions += 1
+
+    def addPrecomputed(self, key, comparison):
+        """
+        Add the comparison of a pair compared before it is looked up, see buildPairIndex. Its first lookup counts as
+        a miss, as if the pair was compared then, so that the summaries are the same as without it.
+        """
+        self._precomputed[key] = comparison
+
+    def getStats(self):
+        """
+        Output:
+        Tuple of the numbers of hits and misses
+        """
+        return self.hits, self.misses
+
+    def addStats(self, stats):
+        """
+        Add the hits and misses of a memo of another process, as returned by getStats
+        """
+        self.hits += stats[0]
+        self.misses += stats[1]
+
+    def getSummary(self):
+        """
+        Output:
+        Message reporting the hits and misses, to size the memo
+        """
+        lookups = self.hits + self.misses
+        return "Comparison memo: %s hits, %s misses (%.1f%% hit rate), at most %s comparisons kept per process" % (
+            self.hits, self.misses, 100.0 * self.hits / lookups if lookups else 0.0,
+            "all" if self.maxSize is None else self.maxSize)
+
+    def getRepetitionSummary(self):
+        """
+        Output:
+        Message reporting the number of compared cells, of unique pairs of values compared and their ratio, the
+        repetition factor. With several processes, a pair is compared once in every process it occurs in, unless the
+        pairs were compared before the rows, see buildPairIndex. Once the memo is full, the pairs whose comparison
+        was dropped are compared and counted again if they occur again, which the message then reports.
+        """
+        lookups = self.hits + self.misses
+        summary = "%s compared cell%s checked as %s unique pair%s of base and translated values " \
+                  "(repetition factor %.1fx)" % (lookups, "" if lookups == 1 else "s", self.misses,
+                                                 "" if self.misses == 1 else "s",
+                                                 float(lookups) / self.misses if self.misses else 1.0)
+        if self.evictions:
+            summary += ", %s comparison%s dropped beyond the %s kept, see --memo-size" % (
+                self.evictions, "" if self.evictions == 1 else "s", self.maxSize)
+        return summary
+
+
+def getMismatchFillStyle(mismatchTypes):
+    """
+    Determine the fill style for a mismatched cell. Cells with output value mismatches are styled with
+    MISMATCH_FILL_STYLE, cells with only text formatting mismatches with LESSER_MISMATCH_FILL_STYLE
+    """
+    curMismatchFillStyle = LESSER_MISMATCH_FILL_STYLE_NAME
+    for mismatch in mismatchTypes:
+        if not mismatch.isLesser:
+            curMismatchFillStyle = MISMATCH_FILL_STYLE_NAME
+    return curMismatchFillStyle
+
+
+def getRowMismatchFillStyle(mismatchDict):
+    """
+    Determine the fill style for the mismatchFlag cell of a row, based on the first mismatch type of each
+    mismatched column in mismatchDict
+    """
+    curMismatchFillStyle = LESSER_MISMATCH_FILL_STYLE_NAME
+    for key in mismatchDict:
+        if len(mismatchDict[key][1]) > 0 and not mismatchDict[key][1][0].isLesser:
+            curMismatchFillStyle = MISMATCH_FILL_STYLE_NAME
+    return curMismatchFillStyle
+
+
+def compareCellToBase(baseAnalysis, curValue, ignoreOrder=False, skipFormatCheckFlag=False,
+                      formatCheckCharacters=None, formatCheckCharactersAdd=None, rules=None):
+    """
+    Compare the value of a cell against the base cell of its row by running rules on them. The result only depends
+    on the two values and the options, so that it can be shared by every row with the same pair of values, see
+    ComparisonMemo.
+
+    Input:
+    baseAnalysis (CellAnalysis): Analysis of the value of the base cell
+    curValue (str): Value of the cell to compare
+    ignoreOrder, skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd: see checkRowForMismatch
+    rules (rules.RuleSet [opt]): Rules run on the cell. Defaults to every registered rule, apart from
+    rules.FORMAT_CHECK_RULES with skipFormatCheckFlag.
+
+    Output:
+    Tuple consisting of the output values of the base cell, the entry of the cell in the mismatchDict described in
+    checkRowForMismatch (None if it does not mismatch), and the entry of the cell in the dictionary of fixes
+    described in compareRowValues (None if it is not checked for fixes)
+    """
+    if rules is None:
+        rules = RuleSet(skipFormatCheckFlag=skipFormatCheckFlag)
+    baseOutputValueList = baseAnalysis.outputValueList
+    mismatch = None
+    fix = None
+    try:
+        analysisOptions = (ignoreOrder, skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd,
+                           "character_counts" in rules, rules.checks)
+        comparison = CellComparison(baseAnalysis, CellAnalysis(curValue, *analysisOptions), ignoreOrder, rules,
+                                    analysisOptions)
+        rules.run(comparison)
+        if comparison.differs:
+            mismatchTypes = comparison.mismatchTypes
+            # Mismatches are listed in the order of their kinds, whichever rule found them
+            if len(mismatchTypes) > 1:
+                mismatchTypes.sort(key=operator.attrgetter('kind'))
+            if len(mismatchTypes) > 0:
+                mismatch = (comparison.cur.outputValueList, mismatchTypes)
+            fix = getCellFix(comparison)
+    except AttributeError:
+        pass
+    return baseOutputValueList, mismatch, fix
+
+
+def getCellFix(comparison):
+    """
+    Fix the block tags and output values of a cell that differs from its base cell, as found by the rules
+
+    Input:
+    comparison (rules.CellComparison): Comparison of the cell, once the rules were run
+
+    Output:
+    Tuple of the fixed text (None if no fix could be applied) and its fill style (None if it should not be styled)
+    """
+    baseOutputValueList = comparison.base.outputValueList
+    curOutputValueList = comparison.cur.outputValueList
+    checks = comparison.cur.checks
+    fixAnalysis = comparison.fixAnalysis
+    if fixAnalysis is not None:
+        outputText = fixAnalysis.value
+        outputValueTokens = fixAnalysis.outputValueTokens
+    else:
+        outputText = comparison.cur.value
+        outputValueTokens = comparison.cur.outputValueTokens
+    # If there are any extra output values remove them
+    fixOutputTags = False
+    if comparison.extraValueList:
+        fixOutputTags = True
+
+    # Swap output tags when tags are out of order and only two output tags are present
+    swapValueList = None
+    if comparison.outOfOrder and len(curOutputValueList) == 2:
+        swapValueList = curOutputValueList
+        fixOutputTags = True
+
+    if fixOutputTags:
+        outputText = checks.fix_output_values(outputText, outputValueTokens, comparison.extraValueList,
+                                              swapValueList)
+
+    # If any fix is applied, record the fixed text and
+    # if output value mismatch is present style it with MISMATCH_FILL_STYLE
+    # if only text formatting mismatch occurs style it with LESSER_MISMATCH_FILL_STYLE
+    fixedText = None
+    fixedStyle = None
+    if fixAnalysis is not None or fixOutputTags:
+        fixedText = outputText
+        if fixAnalysis is not None and comparison.fixFormatMismatch:
+            fixedStyle = LESSER_MISMATCH_FILL_STYLE_NAME
+        if fixOutputTags:
+            fixedOutputValueList = checks.convertValueToOutputValueList(fixedText)[0]
+            if fixedOutputValueList != baseOutputValueList:
+                fixedStyle = MISMATCH_FILL_STYLE_NAME
+        else:
+            if baseOutputValueList != curOutputValueList:
+                fixedStyle = MISMATCH_FILL_STYLE_NAME
+    return fixedText, fixedStyle
+
+
+def compareRowValues(values, columnDict, baseColumnIdx=None, ignoreOrder=False, skipFormatCheckFlag=False,
+                     formatCheckCharacters=None, formatCheckCharactersAdd=None, verbose=False, sheetTitle=None,
+                     rowNumber=None, memo=None, rules=None):
+    """
+    Compare the values of all of the given columns in a row against the base column, without touching any
+    worksheet.
+
+    Input:
+    values(list): list of cell values representing a single row in an Excel sheet
+    columnDict, baseColumnIdx, ignoreOrder, skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd,
+    verbose: see checkRowForMismatch
+    sheetTitle(str [opt]): Title of the worksheet the row belongs to, used in error messages
+    rowNumber(int [opt]): 1-based row number of the row in its worksheet, used in error messages
+    memo(ComparisonMemo [opt]): If passed, the comparison of each pair of base and compared values is looked up
+    in and added to memo rather than always computed. The lists in the output are then shared by the rows with the
+    same values, and must not be modified.
+    rules(rules.RuleSet [opt]): see compareCellToBase. Unless rules.prefilter is False, the cells with the same
+    signature as the base cell, see utils.cell_signature, are not compared to it as they cannot mismatch.
+
+    Output:
+    Tuple consisting of the baseColumnDict and mismatchDict described in checkRowForMismatch, with a list of
+    results.Mismatch rather than of messages for each mismatched cell, and a dictionary
+    mapping the column indexes of mismatched cells to a tuple of the fixed text (None if no fix could be applied)
+    and the fill style of the fixed text (None if it should not be styled).
+    """
+    mismatchDict = {}
+    fixDict = {}
+    if rules is None:
+        rules = RuleSet(skipFormatCheckFlag=skipFormatCheckFlag)
+    countCharacters = "character_counts" in rules
+    checks = rules.checks if rules.checks is not None else CHECKS
+    prefilter = rules.prefilter and (formatCheckCharacters is not None or not countCharacters)
+    characterCounter = None
+    if prefilter and countCharacters and not skipFormatCheckFlag:
+        characterCounter = get_character_counter(formatCheckCharacters, formatCheckCharactersAdd)
+
+    # Get columnDictKeyList for Python3
+    columnDictKeyList = list(columnDict.keys())
+
+    # The base column is only analysed if a comparison is not found in memo
+    if baseColumnIdx is None:
+        baseColumnIdx = sorted(columnDictKeyList)[0]
+    baseValue = values[baseColumnIdx]
+    baseAnalysis = None
+    baseSignature = None
+    baseOutputValueList = None
+
+    for colIdx in columnDictKeyList:
+        if colIdx == baseColumnIdx:
+            continue
+        curValue = values[colIdx]
+        comparison = None
+        if memo is not None:
+            memoKey = (baseValue, curValue, ignoreOrder, skipFormatCheckFlag, formatCheckCharacters,
+                       formatCheckCharactersAdd, rules.names)
+            comparison = memo.get(memoKey)
+        if comparison is None:
+            rules.prefilterCounts[0] += 1
+        if comparison is None and prefilter:
+            if baseSignature is None:
+                baseSignature = checks.cell_signature(baseValue, characterCounter)
+                # The base cell has output values or is not text, so that no cell of the row can be skipped
+                prefilter = baseSignature is not None
+            if prefilter and checks.cell_signature(curValue, characterCounter) == baseSignature:
+                rules.prefilterCounts[1] += 1
+                comparison = ([], None, None)
+                if memo is not None:
+                    memo.put(memoKey, comparison)
+        if comparison is None:
+            if baseAnalysis is None:
+                baseAnalysis = CellAnalysis(baseValue, ignoreOrder, skipFormatCheckFlag, formatCheckCharacters,
+                                            formatCheckCharactersAdd, countCharacters, checks)
+            try:
+                comparison = compareCellToBase(baseAnalysis, curValue, ignoreOrder, skipFormatCheckFlag,
+                                               formatCheckCharacters, formatCheckCharactersAdd, rules)
+            except Exception as e:
+                if verbose:
+                    tb.print_exc(e)
+                raise FatalError("FATAL ERROR comparing to baseColumn worksheet %s cell %s%s : %s" %
+                                 (sheetTitle, xl.utils.get_column_letter(colIdx + 1), rowNumber, str(e)))
+            if memo is not None:
+                memo.put(memoKey, comparison)
+        baseOutputValueList, mismatch, fix = comparison
+        if mismatch is not None:
+            mismatchDict[colIdx] = mismatch
+        if fix is not None:
+            fixDict[colIdx] = fix
+
+    if baseOutputValueList is None:
+        baseOutputValueList = CellAnalysis(baseValue, ignoreOrder, skipFormatCheckFlag, formatCheckCharacters,
+                                           formatCheckCharactersAdd, countCharacters, checks).outputValueList
+    baseColumnDict = {baseColumnIdx: baseOutputValueList}
+    return baseColumnDict, mismatchDict, fixDict
+
+
 def checkRowForMismatch(row, columnDict, fixedColumnDict, baseColumnIdx=None, ignoreOrder=False, wsOut=None, mismatchFlagIdx=None,
                         outputMismatchTypesFlag=False, skipFormatCheckFlag=False, formatCheckCharacters=None,
-                        formatCheckCharactersAdd=None, verbose=False):
+                        formatCheckCharactersAdd=None, verbose=False, headerIndex=None, rules=None):
     """
     Check all of the given columns in a row provided for any mismatch in the columns' OutputValueList 
 
@@ -249,223 +853,117 @@ def checkRowForMismatch(row, columnDict, fixedColumnDict, baseColumnIdx=None, ig
     Defaults to False
     skipFormatCheckFlag(bool [opt]): Flag indicating whether to skip check for bad text formatting outside of
     output value. Defaults to False
+    headerIndex(HeaderIndex [opt]): Index of the header row of wsOut, used to add mismatch type columns.
+    Built from wsOut if not passed.
+    rules(rules.RuleSet [opt]): Rules run on every compared cell. Defaults to every registered rule, apart from
+    rules.FORMAT_CHECK_RULES with skipFormatCheckFlag.
 
     Output:
     Tuple consisting of a single-element dictionary mapping the baseColumn's index to its outputValueList,
     and a dictionary mapping the column indexes of mismatched cells to a tuple consisting of the associated cell's
-    OutputValueList and a list of mismatchTypes. wsOut altered so that every Cell that is mismatched is filled with Red,
+    OutputValueList and a list of mismatchTypes (messages of its results.Mismatch). wsOut altered so that every
+    Cell that is mismatched is filled with Red,
     and mismatchFlag column filled with "Y" if there was a mismatch in the row, "N" otherwise.
     """
-    messages = []
-    invalid_format_tags = []
-    mismatchDict = {}
-    baseFormatDict = {}
-
-    # Get columnDictKeyList for Python3
-    columnDictKeyList = list(columnDict.keys())
-
-    # Build baseColumnDict
-    if baseColumnIdx is None:
-        baseColumnIdx = sorted(columnDictKeyList)[0]
-    baseOutputValueList, error_messages = convertCellToOutputValueList(row[baseColumnIdx])
-    messages.extend(error_messages)
-    if ignoreOrder:
-        baseOutputValueList = sorted(baseOutputValueList)
-    baseColumnDict = {baseColumnIdx: baseOutputValueList}
-
-    # Build baseFormatDict if needed
-    if not skipFormatCheckFlag:
-        baseFormatDict = getNonLinguisticCharacterCount(normalizeQuotes(row[baseColumnIdx].value), formatCheckCharacters,
-                                                        formatCheckCharactersAdd)
-
-    for colIdx in columnDictKeyList:
-        try:
-            curOutputValueList, error_messages = convertCellToOutputValueList(row[colIdx])
-            messages.extend(error_messages)
-            if ignoreOrder:
-                curOutputValueList = sorted(curOutputValueList)
-            curFormatDict = {}
-
-            # Initialize block_tags_fixed_flag to False, if any fix is applied, set to True
-            block_tags_fixed_flag = False
-            if not skipFormatCheckFlag:
-                curFormatDict = getNonLinguisticCharacterCount(normalizeQuotes(row[colIdx].value), formatCheckCharacters,
-                                                               formatCheckCharactersAdd)
-                # invalid_inline_format_tags contains mismatches for bold, italic, bold italic and strikethrough
-                # invalid_block_format_tags contains mismatches for headings, and lists
-                invalid_inline_format_tags, invalid_block_format_tags = get_invalid_format_tags(row[baseColumnIdx].value, row[colIdx].value)
-
-                # Fix block tag mismatches, and calculate mismatches, non linguistic character count on fixed text
-                if colIdx != baseColumnIdx and invalid_block_format_tags:
-                    outputText = fix_block_tags_mismatch(row[baseColumnIdx].value, row[colIdx].value)
-                    if outputText != row[colIdx].value and outputText is not None:
-                        block_tags_fixed_flag = True
-                        fix_invalid_inline_format_tags, fix_invalid_block_format_tags = get_invalid_format_tags(row[baseColumnIdx].value, outputText)
-                        fixFormatDict = getNonLinguisticCharacterCount(normalizeQuotes(outputText), formatCheckCharacters,
-                                                               formatCheckCharactersAdd)
-
-            # Join invalid inline format tags and invalid block tag mismatches
-            invalid_format_tags = invalid_inline_format_tags.extend(invalid_block_format_tags)
-
-            if (colIdx != baseColumnIdx and
-                    (baseOutputValueList != curOutputValueList or baseFormatDict != curFormatDict or
-                     invalid_format_tags)):
-                # Determine how everything is mismatched
-                mismatchTypes = []
-
-                # Determine whether any ill-formatted tags exist:
-                illFormattedValueList = []
-                for value in curOutputValueList:
-                    if value.startswith("ILL-FORMATTED TAG : "):
-                        illFormattedValueList.append(value[20:])
-                if illFormattedValueList:
-                    mismatchTypes.append("Ill-Formatted Tags - " + ",".join(illFormattedValueList))
-
-                # Determine whether any values missing from current list
-                missingValueList = []
-                for value in baseOutputValueList:
-                    if value not in curOutputValueList:
-                        missingValueList.append(value)
-                if missingValueList:
-                    mismatchTypes.append("Missing Values - " + ",".join(missingValueList))
-
-                # Determine whether extra values have been added in current list
-                extraValueList = []
-                for value in curOutputValueList:
-                    if value not in baseOutputValueList:
-                        extraValueList.append(value)
-                if extraValueList:
-                    mismatchTypes.append("Extra Values - " + ",".join(extraValueList))
-
-                # Determine if, after considering missing/extra values, there are sort issues
-                if not ignoreOrder and len(baseOutputValueList) != 0:
-                    baseListIndex = 0
-                    for value in curOutputValueList:
-                        if value not in extraValueList:
-                            while (len(baseOutputValueList) > baseListIndex and
-                                           baseOutputValueList[baseListIndex] in missingValueList):
-                                baseListIndex += 1
-                            if (len(baseOutputValueList) > baseListIndex and
-                                        value != baseOutputValueList[baseListIndex]):
-                                mismatchTypes.append("Out of Order")
-                                break
-                            baseListIndex += 1
-
-                # Determine whether there are any text formatting mismatches
-                if baseFormatDict != curFormatDict:
-                    formatDiffList = []
-                    for key in baseFormatDict.keys():
-                        keyDiff = curFormatDict[key] - baseFormatDict[key]
-                        if keyDiff != 0:
-                            formatDiffList.append("%s : %s" %
-                                                  (key,
-                                                   str(keyDiff) if keyDiff < 0 else "+" + str(keyDiff)))
-                    mismatchTypes.append("Text Formatting Mismatch - " + ",".join(formatDiffList))
-
-                if invalid_format_tags:
-                    for invalid_format_tag in invalid_format_tags:
-                        mismatchTypes.append("Text Formatting Mismatch - %s" % invalid_format_tag)
-
-                if len(mismatchTypes) > 0:
-                    mismatchDict[colIdx] = (curOutputValueList, mismatchTypes)
-
-                if wsOut:
-                    cellOut = getOutputCell(row[colIdx], wsOut)
-                    # If output value mismatch is present, style the cell with MISMATCH_FILL_STYLE
-                    # If Text Formatting mismatch is present, style the cell with LESSER_MISMATCH_FILL_STYLE
-                    if len(mismatchTypes) > 0:
-                        curMismatchFillStyle = LESSER_MISMATCH_FILL_STYLE_NAME
-                        for mismatch in mismatchTypes:
-                            if "Text Formatting Mismatch" not in mismatch:
-                                curMismatchFillStyle = MISMATCH_FILL_STYLE_NAME
-                        cellOut.style = curMismatchFillStyle
-                    if outputMismatchTypesFlag:
-                        mismatchTypesColIdx = appendColumnIfNotExist(wsOut, "mismatch_%s"%(columnDict[colIdx],))
-                        mismatchTypesCellOut = wsOut.rows[getOutputCell(row[0], wsOut).row-1][mismatchTypesColIdx]
-                        mismatchTypesCellOut.value = ",".join(mismatchTypes)
-                        mismatchTypesCellOut.style = curMismatchFillStyle
-
-                if not block_tags_fixed_flag:
-                    outputText = row[colIdx].value
-                # If there are any extra output values remove them
-                fixOutputTags = False
-                if extraValueList:
-                    if block_tags_fixed_flag:
-                        outputText = removeExtraOutputValues(extraValueList, outputText)
-                    else:
-                        outputText = removeExtraOutputValues(extraValueList, row[colIdx].value)
-                    fixOutputTags = True
-
-                # Swap output tags when tags are out of order and only two output tags are present
-                if "Out of Order" in mismatchTypes and len(curOutputValueList) == 2:
-                    if fixOutputTags or block_tags_fixed_flag:
-                        outputText = swapOutputValues(curOutputValueList, outputText) or outputText
-                    else:
-                        outputText = swapOutputValues(curOutputValueList, row[colIdx].value) or row[colIdx].value
-                    fixOutputTags = True
-
-                # If any fix is applied, fill the fixed text column and
-                # if output value mismatch is present style the cell with MISMATCH_FILL_STYLE
-                # if only text formatting mismatch occurs style the cell with LESSER_MISMATCH_FILL_STYLE
-                currFixedCell = wsOut.cell(row=getOutputCell(row[0], wsOut).row, column=1).offset(column=fixedColumnDict[colIdx])
-                if block_tags_fixed_flag or fixOutputTags:
-                    currFixedCell.value = outputText
-                    if block_tags_fixed_flag:
-                        if fix_invalid_block_format_tags or fix_invalid_inline_format_tags or fixFormatDict != baseFormatDict:
-                            currFixedCell.style = LESSER_MISMATCH_FILL_STYLE_NAME
-                    if fixOutputTags:
-                        fixedOutputValueList, error_messages = convertCellToOutputValueList(currFixedCell)
-                        messages.extend(error_messages)
-                        if fixedOutputValueList != baseOutputValueList:
-                            currFixedCell.style = MISMATCH_FILL_STYLE_NAME
-                    else:
-                        if baseOutputValueList != curOutputValueList:
-                            currFixedCell.style = MISMATCH_FILL_STYLE_NAME
-
-        except AttributeError as e:
-            messages.append(str(e))
-        except Exception as e:
-            if verbose:
-                tb.print_exc(e)
-            raise FatalError("FATAL ERROR comparing to baseColumn worksheet %s cell %s : %s" %
-                             (row[colIdx].parent.title, row[colIdx].coordinate, str(e)))
-
-    mismatchCell = wsOut.cell(row=getOutputCell(row[0], wsOut).row, column=1).offset(column=mismatchFlagIdx)
+    rowNumber = row[0].row
+    baseColumnDict, mismatchDict, fixDict = compareRowValues(
+        [cell.value for cell in row], columnDict, baseColumnIdx, ignoreOrder, skipFormatCheckFlag,
+        formatCheckCharacters, formatCheckCharactersAdd, verbose, row[0].parent.title, rowNumber, rules=rules)
+
+    if outputMismatchTypesFlag and mismatchDict and headerIndex is None:
+        headerIndex = HeaderIndex(wsOut)
+    for colIdx, (curOutputValueList, mismatchTypes) in mismatchDict.items():
+        curMismatchFillStyle = getMismatchFillStyle(mismatchTypes)
+        wsOut.cell(row=rowNumber, column=colIdx + 1).style = curMismatchFillStyle
+        if outputMismatchTypesFlag:
+            mismatchTypesColIdx = headerIndex.appendColumnIfNotExist("mismatch_%s" % (columnDict[colIdx],))
+            mismatchTypesCellOut = wsOut.cell(row=rowNumber, column=mismatchTypesColIdx + 1)
+            mismatchTypesCellOut.value = ",".join(str(mismatch) for mismatch in mismatchTypes)
+            mismatchTypesCellOut.style = curMismatchFillStyle
+
+    for colIdx, (fixedText, fixedStyle) in fixDict.items():
+        currFixedCell = wsOut.cell(row=rowNumber, column=fixedColumnDict[colIdx] + 1)
+        if fixedText is not None:
+            currFixedCell.value = fixedText
+        if fixedStyle is not None:
+            currFixedCell.style = fixedStyle
+
+    mismatchCell = wsOut.cell(row=rowNumber, column=mismatchFlagIdx + 1)
     if len(mismatchDict) > 0:
-        curMismatchFillStyle = LESSER_MISMATCH_FILL_STYLE_NAME
-        for key in mismatchDict:
-            if len(mismatchDict[key][1]) > 0 and "Text Formatting Mismatch" not in mismatchDict[key][1][0]:
-                curMismatchFillStyle = MISMATCH_FILL_STYLE_NAME
         mismatchCell.value = "Y"
-        mismatchCell.style = curMismatchFillStyle
+        mismatchCell.style = getRowMismatchFillStyle(mismatchDict)
     else:
         mismatchCell.value = "N"
 
-    return baseColumnDict, mismatchDict
+    return baseColumnDict, dict((colIdx, (curOutputValueList, [str(mismatch) for mismatch in mismatchTypes]))
+                                for colIdx, (curOutputValueList, mismatchTypes) in mismatchDict.items())
 
 
-def appendColumnIfNotExist(ws, columnHeader):
+class HeaderIndex(object):
+    """
+    Index of the header row of a worksheet, built once so that columns can be looked up and appended without
+    reading the header row again.
+
+    Input:
+    ws (xl.worksheet.worksheet.Worksheet [opt]): Worksheet whose first row is indexed, and to which appended
+    headers are written
+    headers (list [opt]): Header values to index instead of the first row of ws, for worksheets whose header row
+    cannot be read back
+    """
+    __slots__ = ('ws', 'headers', 'columnIdxDict')
+
+    def __init__(self, ws=None, headers=None):
+        self.ws = ws
+        if headers is None:
+            headers = []
+            if ws is not None:
+                headers = list(next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+        self.headers = headers
+        self.columnIdxDict = {}
+        for headerIdx, value in enumerate(headers):
+            self.columnIdxDict.setdefault(value, headerIdx)
+
+    def getColumnIdx(self, columnHeader, last=False):
+        """
+        Return the index of the first column (or last column, if last is passed) with columnHeader,
+        or None if there is no such column
+        """
+        if last and columnHeader in self.columnIdxDict:
+            return len(self.headers) - 1 - self.headers[::-1].index(columnHeader)
+        return self.columnIdxDict.get(columnHeader)
+
+    def appendColumnIfNotExist(self, columnHeader):
+        """
+        See appendColumnIfNotExist
+        """
+        columnIdx = self.columnIdxDict.get(columnHeader)
+        if columnIdx is None:
+            columnIdx = len(self.headers)
+            self.headers.append(columnHeader)
+            self.columnIdxDict[columnHeader] = columnIdx
+            if self.ws is not None:
+                self.ws.cell(row=1, column=columnIdx + 1).value = columnHeader
+        return columnIdx
+
+
+def appendColumnIfNotExist(ws, columnHeader, headerIndex=None):
     '''
     Check whether a column with the given header already exists in ws, and append it if not.
 
     Input:
     ws (xl.worksheet.worksheet.worksheet): Worksheet to append column to
     columnHeader (str): Header of new column
+    headerIndex (HeaderIndex [opt]): Index of the header row of ws. Built from ws if not passed.
 
     Output:
     If column with columnHeader does not exist, append it to ws. Return index of column with columnHeader.
     '''
-    maxHeaderIdx = 0
-    for headerIdx, cell in enumerate(list(ws.rows)[0]):
-        if cell.value == columnHeader:
-            return headerIdx
-        maxHeaderIdx = max(headerIdx, maxHeaderIdx)
-    newColIdx = maxHeaderIdx + 1
-    ws.cell(1, 1).offset(column=newColIdx).value = columnHeader
-    return newColIdx
+    if headerIndex is None:
+        headerIndex = HeaderIndex(ws)
+    return headerIndex.appendColumnIfNotExist(columnHeader)
 
 
-def checkConfigurationSheet(wb, ws, configurationSheetColumnName, wsOut, verbose=False):
+def checkConfigurationSheet(wb, ws, configurationSheetColumnName, wsOut, verbose=False, headerIndex=None):
     """
     Check that the workbook contains one sheet for every corresponding entry in the configurationSheetColumn of ws,
     and highlight all cells in wsOut that represent sheets that don't exist.
@@ -476,6 +974,7 @@ def checkConfigurationSheet(wb, ws, configurationSheetColumnName, wsOut, verbose
     configurationSheetColumnName (str): Name of column to compare sheet names against
     wsOut (xl.worksheet.worksheet.Worksheet): Worksheet to print highlighted cells to
     verbose (boolen [opt]): If passed, prints each missing sheet to the screen
+    headerIndex (HeaderIndex [opt]): Index of the header row of ws. Built from ws if not passed.
 
     Output:
     List of sheets that are missing from the Workbook. If configurationSheetColumnName does not exist in ws,
@@ -485,26 +984,26 @@ def checkConfigurationSheet(wb, ws, configurationSheetColumnName, wsOut, verbose
     missingSheetList = []
 
     # Check that the configuration column exists at all
-    colIdx = None
-    for headerIdx, cell in enumerate(list(ws.rows)[0]):
-        if cell.value == configurationSheetColumnName:
-            colIdx = headerIdx
+    if headerIndex is None:
+        headerIndex = HeaderIndex(ws)
+    colIdx = headerIndex.getColumnIdx(configurationSheetColumnName, last=True)
     if colIdx is None:
         messages.append("%s not found in %s. Skipping sheet check." % (configurationSheetColumnName, ws.title))
         return None
 
     # Iterate over configuration column, flagging red if corresponding sheet does not exist
-    for cell in list(ws.columns)[colIdx][1:]:
-        if cell.value not in (sheet.title for sheet in wb):
+    sheetTitles = set(wb.sheetnames)
+    for (cell,) in ws.iter_rows(min_row=2, min_col=colIdx + 1, max_col=colIdx + 1):
+        if cell.value not in sheetTitles:
             missingSheetList.append(cell.value)
-            getOutputCell(cell, wsOut).style = MISMATCH_FILL_STYLE_NAME
+            wsOut.cell(row=cell.row, column=colIdx + 1).style = MISMATCH_FILL_STYLE_NAME
             if verbose:
                 print("WARNING: This sheet is missing from the workbook: %s" % (cell.value,))
 
     return missingSheetList
 
 
-def appendFixColumns(ws, baseColumn, defaultColumnDict):
+def appendFixColumns(ws, baseColumn, defaultColumnDict, headerIndex=None):
     """
     For each column in defaultColumnDict, add a new column prepending 'fix_'
     to column name in defaultColumnName except for baseColumn
@@ -513,6 +1012,7 @@ def appendFixColumns(ws, baseColumn, defaultColumnDict):
     ws(worksheet): Worksheet to which we append columns to
     baseColumn(str): Name of baseColumn
     defaultColumnDict(dict): dictionary containing mappings to columns starting with 'default_'
+    headerIndex(HeaderIndex [opt]): Index of the header row of ws. Built from ws if not passed.
 
     Return:
     fixedColumnDict(dict): dictionary containing mappings from default column index to fixed column index
@@ -525,20 +1025,1140 @@ def appendFixColumns(ws, baseColumn, defaultColumnDict):
     if baseColumnIdx is None:
         baseColumnIdx = sorted(list(defaultColumnDict.keys()))[0]
     fixedColumnDict = {}
+    if headerIndex is None:
+        headerIndex = HeaderIndex(ws)
 
     for headerIdx, value in defaultColumnDict.items():
         if headerIdx == baseColumnIdx:
             continue
-        currFixedIdx = appendColumnIfNotExist(ws, "fix_" + value)
+        currFixedIdx = headerIndex.appendColumnIfNotExist("fix_" + value)
         fixedColumnDict[headerIdx] = currFixedIdx
     return fixedColumnDict
 
 
-def validate_workbook(file_obj, args=None):
+def reportRowMismatch(wsTitle, rowNumber, rowCheckResults, defaultColumnDict, outputMismatchTypesFlag=False,
+                      log=print):
+    """
+    Report which columns of a mismatched row do not match the base column.
+
+    Input:
+    rowCheckResults (tuple): Result of compareRowValues or checkRowForMismatch for the row
+    log (function [opt]): Function the warning is passed to. Defaults to print
+    """
+    baseColumnName = defaultColumnDict[list(rowCheckResults[0].keys())[0]]
+    if outputMismatchTypesFlag:
+        mismatchColumnNames = ",".join(
+            "%s (%s)" %
+            (defaultColumnDict[i],
+             ",".join(str(mismatch) for mismatch in rowCheckResults[1][i][1])) for i in rowCheckResults[1].keys())
+    else:
+        mismatchColumnNames = ",".join(defaultColumnDict[i] for i in rowCheckResults[1].keys())
+    log("WARNING %s row %s: the output values in %s do not match %s" %
+        (wsTitle, rowNumber, mismatchColumnNames, baseColumnName))
+
+
+def padRow(values, columnCount):
+    """
+    Input:
+    values (tuple): Values of a row
+    columnCount (int): Number of columns of the worksheet of the row
+
+    Output:
+    List of the values of the row, padded with None to columnCount values
+    """
+    values = list(values)
+    if len(values) < columnCount:
+        values.extend([None] * (columnCount - len(values)))
+    return values
+
+
+def compareRows(compareArgs, firstRowNumber, rows, memo=None):
+    """
+    Compare the values of consecutive rows of a worksheet, see compareRowValues. Only plain values are needed,
+    so that chunks of rows can be compared in other processes.
+
+    Input:
+    compareArgs (tuple): WorksheetChecker.compareArgs of the worksheet of the rows
+    firstRowNumber (int): 1-based row number of the first row
+    rows (list): Tuples of the values of each row
+    memo (ComparisonMemo [opt]): see compareRowValues
+
+    Output:
+    List of the results of compareRowValues for each row
+    """
+    (columnDict, baseColumnIdx, ignoreOrder, skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd,
+     sheetTitle, columnCount, rules) = compareArgs
+    return [compareRowValues(padRow(values, columnCount), columnDict, baseColumnIdx, ignoreOrder,
+                             skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd,
+                             sheetTitle=sheetTitle, rowNumber=firstRowNumber + rowOffset, memo=memo, rules=rules)
+            for rowOffset, values in enumerate(rows)]
+
+
+class WorksheetChecker(object):
+    """
+    Checks the rows of a worksheet given as plain values, and builds the annotated output row for each of them
+    as a list of values and a list of fill style names.
+
+    Input:
+    title (str): Title of the worksheet
+    header (list): Values of the header row of the worksheet. Appended columns are added to it.
+    sheetTitles (set): Titles of every sheet in the workbook
+    configurationSheetColumnName (str [opt]): If passed, the worksheet is treated as the configuration sheet and
+    the values of this column are checked against sheetTitles
+    declareMismatchColumns (bool [opt]): If True, the mismatch_* columns are added to the header for every compared
+    column up front, rather than when the first mismatch of the column is found. Needed when the header row is
+    written before the rows are checked.
+    log (function [opt]): Function warnings are passed to when verbose. Defaults to print
+    memo (ComparisonMemo [opt]): Memo of comparisons, see compareRowValues
+    reportWriter (reports.ReportWriter [opt]): If passed, mismatches are written to it rather than to output rows
+    mismatchStore (results.MismatchStore [opt]): If passed, the mismatches of every mismatched row are added to it
+    rules (rules.RuleSet [opt]): Rules run on every compared cell, see checkRowForMismatch
+    Remaining options are as in validate_workbook.
+    """
+
+    def __init__(self, title, header, sheetTitles, columns=None, baseColumn=None, ignoreOrder=False,
+                 outputMismatchTypesFlag=False, skipFormatCheckFlag=False, formatCheckCharacters=None,
+                 formatCheckCharactersAdd=None, configurationSheetColumnName=None, declareMismatchColumns=False,
+                 verbose=False, log=print, memo=None, reportWriter=None, mismatchStore=None, rules=None):
+        self.title = title
+        self.sheetTitles = sheetTitles
+        self.ignoreOrder = ignoreOrder
+        self.outputMismatchTypesFlag = outputMismatchTypesFlag
+        self.skipFormatCheckFlag = skipFormatCheckFlag
+        self.formatCheckCharacters = formatCheckCharacters
+        self.formatCheckCharactersAdd = formatCheckCharactersAdd
+        self.rules = rules if rules is not None else RuleSet(skipFormatCheckFlag=skipFormatCheckFlag)
+        self.verbose = verbose
+        self.log = log
+        self.memo = memo
+        self.reportWriter = reportWriter
+        self.mismatchStore = mismatchStore
+        self.columnCount = len(header)
+        self.headerIndex = HeaderIndex(headers=header)
+        self.mismatchCount = 0
+        self.rowCount = 0
+        self.missingSheetList = None
+        self.missingSheetWarnings = []
+
+        # Find all columns of format "default_[CODE]"
+        self.defaultColumnDict = {}
+        for headerIdx, value in enumerate(header):
+            if columns:
+                if value in columns:
+                    self.defaultColumnDict[headerIdx] = value
+            elif value and value[:8] == "default_":
+                self.defaultColumnDict[headerIdx] = value
+        if mismatchStore is not None:
+            self.mismatchStoreSheetIdx = mismatchStore.addSheet(title, self.defaultColumnDict)
+
+        self.configColIdx = None
+        if configurationSheetColumnName is not None:
+            self.configColIdx = self.headerIndex.getColumnIdx(configurationSheetColumnName, last=True)
+            if self.configColIdx is not None:
+                self.missingSheetList = []
+
+        # If defaultColumnDict is empty, skip processing
+        # Otherwise, create header cells for mismatchFlag and for the fixed text of every column but the base column
+        self.mismatchFlagIdx = None
+        self.baseColumnIdx = None
+        self.fixedColumnDict = {}
+        if len(self.defaultColumnDict) != 0:
+            self.mismatchFlagIdx = self.headerIndex.appendColumnIfNotExist("mismatchFlag")
+            self.fixedColumnDict = appendFixColumns(None, baseColumn, self.defaultColumnDict, self.headerIndex)
+            if baseColumn:
+                for colIdx in self.defaultColumnDict.keys():
+                    if self.defaultColumnDict[colIdx] == baseColumn:
+                        self.baseColumnIdx = colIdx
+            if outputMismatchTypesFlag and declareMismatchColumns:
+                for colIdx in self.fixedColumnDict:
+                    self.headerIndex.appendColumnIfNotExist("mismatch_%s" % (self.defaultColumnDict[colIdx],))
+        elif verbose:
+            log("WARNING %s: No columns found for comparison" % (title,))
+
+    @property
+    def header(self):
+        return self.headerIndex.headers
+
+    @property
+    def copyRows(self):
+        """
+        Rows are only copied to the output for worksheets with columns to compare
+        """
+        return len(self.defaultColumnDict) != 0
+
+    @property
+    def needsRows(self):
+        return self.copyRows or self.configColIdx is not None
+
+    @property
+    def compareArgs(self):
+        """
+        Arguments of compareRows for the rows of this worksheet
+        """
+        return (self.defaultColumnDict, self.baseColumnIdx, self.ignoreOrder, self.skipFormatCheckFlag,
+                self.formatCheckCharacters, self.formatCheckCharactersAdd, self.title, self.columnCount, self.rules)
+
+    def checkRow(self, rowNumber, values):
+        """
+        Check a row of the worksheet.
+
+        Input:
+        rowNumber (int): 1-based row number of the row
+        values (tuple): Values of the row
+
+        Output:
+        Tuple of the list of output values and the list of fill style names (None for no style) of the row,
+        None if the worksheet has a reportWriter
+        """
+        rowCheckResults = None
+        if self.copyRows:
+            rowCheckResults = compareRows(self.compareArgs, rowNumber, [values], self.memo)[0]
+        if self.reportWriter is not None:
+            return self.reportRowCheckResults(rowNumber, values, rowCheckResults)
+        return self.applyRowCheckResults(rowNumber, values, rowCheckResults)
+
+    def applyRowCheckResults(self, rowNumber, values, rowCheckResults):
+        """
+        Build the output row of a row of the worksheet from the results of comparing its values, which may have
+        been computed in another process by compareRows. Rows must be applied in order.
+
+        Input:
+        rowNumber (int): 1-based row number of the row
+        values (tuple): Values of the row
+        rowCheckResults (tuple): Result of compareRows for the row, None if the worksheet has no columns to compare
+
+        Output:
+        Tuple of the list of output values and the list of fill style names (None for no style) of the row
+        """
+        self.rowCount += 1
+        values = padRow(values, self.columnCount)
+        header = self.headerIndex.headers
+        outValues = values + [None] * (len(header) - len(values))
+        outStyles = [None] * len(outValues)
+
+        if self.copyRows:
+            mismatchDict = rowCheckResults[1]
+            for colIdx, (curOutputValueList, mismatchTypes) in mismatchDict.items():
+                outStyles[colIdx] = getMismatchFillStyle(mismatchTypes)
+                if self.outputMismatchTypesFlag:
+                    mismatchTypesColIdx = self.headerIndex.appendColumnIfNotExist(
+                        "mismatch_%s" % (self.defaultColumnDict[colIdx],))
+                    if mismatchTypesColIdx >= len(outValues):
+                        outValues.extend([None] * (mismatchTypesColIdx + 1 - len(outValues)))
+                        outStyles.extend([None] * (mismatchTypesColIdx + 1 - len(outStyles)))
+                    outValues[mismatchTypesColIdx] = ",".join(str(mismatch) for mismatch in mismatchTypes)
+                    outStyles[mismatchTypesColIdx] = outStyles[colIdx]
+            for colIdx, (fixedText, fixedStyle) in rowCheckResults[2].items():
+                if fixedText is not None:
+                    outValues[self.fixedColumnDict[colIdx]] = fixedText
+                if fixedStyle is not None:
+                    outStyles[self.fixedColumnDict[colIdx]] = fixedStyle
+            if len(mismatchDict) > 0:
+                outValues[self.mismatchFlagIdx] = "Y"
+                outStyles[self.mismatchFlagIdx] = getRowMismatchFillStyle(mismatchDict)
+                self.countMismatch(rowNumber, rowCheckResults)
+            else:
+                outValues[self.mismatchFlagIdx] = "N"
+
+        # If this is the configuration sheet, flag sheets missing from the workbook
+        if self.checkConfigurationValue(values):
+            outStyles[self.configColIdx] = MISMATCH_FILL_STYLE_NAME
+
+        return outValues, outStyles
+
+    def reportRowCheckResults(self, rowNumber, values, rowCheckResults):
+        """
+        Same as applyRowCheckResults, passing a record per mismatched cell to reportWriter (if any) rather than
+        building the output row
+
+        Output:
+        None
+        """
+        self.rowCount += 1
+        values = padRow(values, self.columnCount)
+        if self.copyRows:
+            mismatchDict = rowCheckResults[1]
+            for colIdx, (curOutputValueList, mismatchTypes) in mismatchDict.items():
+                if self.reportWriter is None:
+                    break
+                fixedText = rowCheckResults[2].get(colIdx, (None, None))[0]
+                self.reportWriter.writeMismatch(self.title, rowNumber, self.defaultColumnDict[colIdx], mismatchTypes,
+                                                fixedText)
+            if len(mismatchDict) > 0:
+                self.countMismatch(rowNumber, rowCheckResults)
+        if self.checkConfigurationValue(values) and self.reportWriter is not None:
+            self.reportWriter.writeMismatch(self.title, rowNumber, self.header[self.configColIdx],
+                                            ["Missing Sheet - %s" % (values[self.configColIdx],)], None)
+
+    def countMismatch(self, rowNumber, rowCheckResults):
+        self.mismatchCount += 1
+        if self.mismatchStore is not None:
+            self.mismatchStore.addRow(self.mismatchStoreSheetIdx, rowNumber, rowCheckResults[1])
+        if self.verbose:
+            reportRowMismatch(self.title, rowNumber, rowCheckResults, self.defaultColumnDict,
+                              self.outputMismatchTypesFlag, self.log)
+
+    def checkConfigurationValue(self, values):
+        """
+        If this is the configuration sheet, check that the sheet named in the row is in the workbook
+
+        Output:
+        True if the sheet is missing from the workbook
+        """
+        if self.configColIdx is not None and values[self.configColIdx] not in self.sheetTitles:
+            self.missingSheetList.append(values[self.configColIdx])
+            self.missingSheetWarnings.append("WARNING: This sheet is missing from the workbook: %s" %
+                                             (values[self.configColIdx],))
+            return True
+        return False
+
+    def getIssueCount(self):
+        """
+        Output:
+        Number of mismatched rows and missing sheets found so far
+        """
+        return self.mismatchCount + len(self.missingSheetList or [])
+
+    def getSummary(self):
+        """
+        Output:
+        WorksheetSummary of the rows checked so far
+        """
+        return WorksheetSummary(self.title, self.mismatchCount, self.missingSheetList, self.rowCount,
+                                self.rowCount * self.columnCount, self.mismatchFlagIdx)
+
+    def finish(self):
+        """
+        Report the sheets missing from the workbook, once every row has been checked
+        """
+        if self.verbose:
+            for warning in self.missingSheetWarnings:
+                self.log(warning)
+
+
+def writeOutputRow(wsOut, rowNumber, outValues, outStyles, copiedColumnCount, alignment):
+    """
+    Write an annotated row to an output worksheet.
+
+    Input:
+    wsOut (xl.worksheet.worksheet.Worksheet): Worksheet to write the row to
+    rowNumber (int): 1-based row number of the row
+    outValues (list): Values of the row
+    outStyles (list): Fill style names of the row, None for no style
+    copiedColumnCount (int): Number of leading columns copied from the input worksheet. These cells are written
+    even when empty, with alignment.
+    alignment (xl.styles.Alignment): Alignment of the copied cells
+    """
+    for colIdx, value in enumerate(outValues):
+        style = outStyles[colIdx]
+        if colIdx >= copiedColumnCount and value is None and style is None:
+            continue
+        cell = wsOut.cell(row=rowNumber, column=colIdx + 1, value=value)
+        if colIdx < copiedColumnCount:
+            cell.alignment = alignment
+        if style is not None:
+            cell.style = style
+
+
+def appendOutputRow(wsOut, rowNumber, outValues, outStyles, copiedColumnCount, alignment):
+    """
+    Same as writeOutputRow, for a write-only worksheet. Rows must be appended in order.
+    """
+    rowCells = []
+    for colIdx, value in enumerate(outValues):
+        style = outStyles[colIdx]
+        if colIdx >= copiedColumnCount and value is None and style is None:
+            rowCells.append(None)
+            continue
+        cell = xl.cell.WriteOnlyCell(wsOut, value)
+        if colIdx < copiedColumnCount:
+            cell.alignment = alignment
+        if style is not None:
+            cell.style = style
+        rowCells.append(cell)
+    wsOut.append(rowCells)
+
+
+def writeSpooledWorkbook(spooledWorkbook, alignment):
+    """
+    Write the rows of a SpooledWorkbook to a new write-only workbook, the header row of each worksheet first, and
+    drop them from the SpooledWorkbook as each worksheet is written
+
+    Output:
+    Write-only xl.Workbook, to be saved once
+    """
+    wbOut = xl.Workbook(write_only=True)
+    register_styles(wbOut)
+    for spooledWs in spooledWorkbook.worksheets:
+        wsOut = wbOut.create_sheet(title=spooledWs.title)
+        nextRowNumber = 1
+        if spooledWs.header is not None:
+            appendOutputRow(wsOut, *spooledWs.header, alignment=alignment)
+            nextRowNumber = 2
+        for rowNumber, outValues, outStyles, copiedColumnCount in spooledWs.rows:
+            for _ in range(nextRowNumber, rowNumber):
+                wsOut.append([])
+            appendOutputRow(wsOut, rowNumber, outValues, outStyles, copiedColumnCount, alignment)
+            nextRowNumber = rowNumber + 1
+        spooledWs.rows.close()
+    return wbOut
+
+
+def orderWorksheetsForBudget(wb, configurationSheet):
+    """
+    Order the worksheets so that those most likely to have issues are checked first when checking stops at
+    --max-mismatches: the configuration sheet, whose missing sheets are found without comparing values, then the
+    other worksheets by decreasing number of rows, as read from their dimensions without reading any row
+
+    Output:
+    List of the worksheets of wb
+    """
+    return sorted(wb, key=lambda ws: (ws.title != configurationSheet, -(ws.max_row or 0)))
+
+
+def discardWriteOnlyWorkbook(wbOut):
+    """
+    Close the worksheets of a write-only workbook that will not be saved, and remove their temporary files, so that
+    they are not left to be closed when the interpreter exits. Other workbooks, and write-only workbooks already
+    saved, are left as they are.
+    """
+    if wbOut is None or not wbOut.write_only:
+        return
+    for wsOut in wbOut.worksheets:
+        if not wsOut.closed:
+            wsOut.close()
+            wsOut._writer.cleanup()
+
+
+def isFlaggedRow(outStyles):
+    """
+    Output:
+    True if an output row has a mismatch or a missing sheet flagged, as every flag has a fill style
+    """
+    return any(style is not None for style in outStyles)
+
+
+class SparseRowWriter(object):
+    """
+    Writes only the header and the flagged rows of a worksheet to the output workbook, one after the other, after
+    a column with the row number of each row in the input worksheet. The output worksheet is only created once
+    the first flagged row is written, so that worksheets without any flag are left out of the output file.
+
+    Input:
+    wbOut (xl.Workbook): Output workbook
+    title (str): Title of the output worksheet
+    writeRow (function): writeOutputRow or appendOutputRow
+    alignment (xl.styles.Alignment): Alignment of the copied cells
+    """
+
+    def __init__(self, wbOut, title, writeRow, alignment):
+        self.wbOut = wbOut
+        self.title = title
+        self.writeRow = writeRow
+        self.alignment = alignment
+        self.wsOut = None
+        self.header = None
+        self.rowCount = 0
+
+    def __call__(self, rowNumber, outValues, outStyles, copiedColumnCount):
+        if rowNumber == 1:
+            # The header is written first with --stream, and last otherwise
+            self.header = ([SPARSE_ROW_NUMBER_COLUMN] + outValues, [None] + outStyles, copiedColumnCount + 1)
+            if self.wsOut is not None:
+                self.writeRow(self.wsOut, 1, *self.header, alignment=self.alignment)
+            return
+        if not isFlaggedRow(outStyles):
+            return
+        if self.wsOut is None:
+            self.wsOut = self.wbOut.create_sheet(title=self.title)
+            if self.header is not None:
+                self.writeRow(self.wsOut, 1, *self.header, alignment=self.alignment)
+        self.rowCount += 1
+        self.writeRow(self.wsOut, self.rowCount + 1, [rowNumber] + outValues, [None] + outStyles,
+                      copiedColumnCount + 1, alignment=self.alignment)
+
+
+class CheckedColumnFilter(object):
+    """
+    Column filter of an XmlWorkbook keeping only the columns the checker reads: the compared columns and, in the
+    configuration sheet, the column of sheet names. Picklable, so that it can be passed to worker processes.
+    """
+
+    def __init__(self, columns, configurationSheet, configurationSheetColumnName):
+        self.columns = columns
+        self.configurationSheet = configurationSheet
+        self.configurationSheetColumnName = configurationSheetColumnName
+
+    def __call__(self, title, header):
+        checkedColumns = set()
+        for headerIdx, value in enumerate(header):
+            if self.columns:
+                if value in self.columns:
+                    checkedColumns.add(headerIdx)
+            elif isinstance(value, str) and value[:8] == "default_":
+                checkedColumns.add(headerIdx)
+            if title == self.configurationSheet and value == self.configurationSheetColumnName:
+                checkedColumns.add(headerIdx)
+        return checkedColumns
+
+
+def iterRowsUntilCancelled(rows, cancelEvent):
+    """
+    Yield the rows, raising CheckCancelled before the next row once cancelEvent is set
+    """
+    for values in rows:
+        if cancelEvent.is_set():
+            raise CheckCancelled()
+        yield values
+
+
+def checkWorksheet(ws, sheetTitles, writeRow, writeHeaderFirst=False, checkerOptions=None, log=print,
+                   executor=None, chunkRows=None, maxPendingChunks=None, profile=None, cancelEvent=None,
+                   maxMismatches=None):
+    """
+    Check every row of a worksheet and pass each annotated row to writeRow.
+
+    Input:
+    ws (xl.worksheet.worksheet.Worksheet): Worksheet to check, can be read-only
+    sheetTitles (set): Titles of every sheet in the workbook
+    writeRow (function): Called with the row number, output values, fill style names and number of copied columns
+    of every output row, see writeOutputRow. None if checkerOptions has a reportWriter, in which case no output
+    rows are built.
+    writeHeaderFirst (bool [opt]): If True, the header row is passed to writeRow before any other row, and the
+    mismatch_* columns are declared up front. Otherwise it is passed last, once every appended column is known.
+    checkerOptions (dict [opt]): Keyword arguments for WorksheetChecker
+    log (function [opt]): Function warnings are passed to when verbose. Defaults to print
+    executor (concurrent.futures.Executor [opt]): If passed, the rows are compared in chunks of chunkRows rows
+    in this executor, and the results are applied in order
+    chunkRows (int [opt]): Number of rows per chunk
+    maxPendingChunks (int [opt]): Maximum number of chunks in flight at any time
+    profile (profiling.Profile [opt]): If passed, the time spent checking rows and writing them is added to its
+    check and copy phases
+    cancelEvent (threading.Event [opt]): If passed, CheckCancelled is raised before the next row once it is set
+    maxMismatches (int [opt]): If passed, no more rows are read once the worksheet has more than this number of
+    mismatched rows and missing sheets. Only used when writeRow is None.
+
+    Output:
+    The WorksheetChecker used, holding the count of mismatched rows and the list of missing sheets
+    """
+    rows = ws.iter_rows(values_only=True)
+    if cancelEvent is not None:
+        rows = iterRowsUntilCancelled(rows, cancelEvent)
+    header = list(next(rows, ()))
+    if ws.max_column and len(header) < ws.max_column:
+        header.extend([None] * (ws.max_column - len(header)))
+    checker = WorksheetChecker(ws.title, header, sheetTitles, declareMismatchColumns=writeHeaderFirst, log=log,
+                               **(checkerOptions or {}))
+    checkRow = checker.checkRow
+    applyRowCheckResults = checker.applyRowCheckResults
+    if writeRow is None:
+        applyRowCheckResults = checker.reportRowCheckResults
+    if profile is not None:
+        checkRow = profile.timed("check", checkRow)
+        applyRowCheckResults = profile.timed("check", applyRowCheckResults)
+        if writeRow is not None:
+            writeRow = profile.timed("copy", writeRow)
+    if writeHeaderFirst and writeRow is not None:
+        writeRow(1, list(checker.header), [None] * len(checker.header), checker.columnCount)
+
+    # Rows of sheets without columns to compare are not copied, so they only need to be read for the
+    # configuration check
+    if checker.needsRows:
+        copiedColumnCount = checker.columnCount if checker.copyRows else 0
+        if executor is not None and checker.copyRows:
+            checkedRows = (applyRowCheckResults(*checkedRow) for checkedRow in _iterRowCheckResultsInPool(
+                executor, checker.compareArgs, rows, chunkRows, maxPendingChunks, checker.memo))
+        else:
+            checkedRows = (checkRow(rowIdx + 2, values) for rowIdx, values in enumerate(rows))
+        if writeRow is None and maxMismatches is not None:
+            for _ in checkedRows:
+                if checker.getIssueCount() > maxMismatches:
+                    break
+        elif writeRow is None:
+            collections.deque(checkedRows, maxlen=0)
+        else:
+            for rowIdx, (outValues, outStyles) in enumerate(checkedRows):
+                writeRow(rowIdx + 2, outValues, outStyles, copiedColumnCount)
+    checker.finish()
+
+    if not writeHeaderFirst and writeRow is not None:
+        writeRow(1, list(checker.header), [None] * len(checker.header), checker.columnCount)
+    return checker
+
+
+def _iterRowCheckResultsInPool(executor, compareArgs, rows, chunkRows, maxPendingChunks, memo=None):
+    """
+    Compare chunks of chunkRows rows in executor, and yield the row number, values and result of compareRows of
+    every row, in order. The hits and misses of the memos of the worker processes are added to memo, and the cells
+    they compared to the rules of compareArgs.
+    """
+    pending = collections.deque()
+    rowNumber = 2
+    while True:
+        chunk = list(itertools.islice(rows, chunkRows))
+        if chunk:
+            pending.append((rowNumber, chunk, executor.submit(_compareRowsInWorker, compareArgs, rowNumber, chunk)))
+            rowNumber += len(chunk)
+        if not pending:
+            break
+        if not chunk or len(pending) >= maxPendingChunks:
+            firstRowNumber, pendingChunk, future = pending.popleft()
+            chunkResults, memoStats, prefilterStats = future.result()
+            if memo is not None:
+                memo.addStats(memoStats)
+            compareArgs[-1].addPrefilterStats(prefilterStats)
+            for rowOffset, (values, rowCheckResults) in enumerate(zip(pendingChunk, chunkResults)):
+                yield firstRowNumber + rowOffset, values, rowCheckResults
+
+
+# Workbook and options of the current worker process, see validate_workbook
+_workerState = {}
+
+
+def _initWorker(source, checkerOptions, configurationSheet, configurationSheetColumnName, writeHeaderFirst,
+                memoSize=0, reportFlag=False, flaggedRowsOnly=False, reader="openpyxl", columnFilter=None,
+                maxMismatches=None, keepMismatches=False, stopEvent=None):
+    _workerState['wb'] = openWorkbook(source if isinstance(source, str) else io.BytesIO(source), reader,
+                                      readOnly=True, columnFilter=columnFilter)
+    _workerState['memo'] = ComparisonMemo(memoSize) if memoSize != 0 else None
+    # Set by the main process once the results of the worksheets and chunks still being checked are not needed
+    _workerState['stopEvent'] = stopEvent
+    _workerState['options'] = (checkerOptions, configurationSheet, configurationSheetColumnName, writeHeaderFirst,
+                               reportFlag, flaggedRowsOnly, maxMismatches, keepMismatches)
+
+
+def _checkWorksheetInWorker(title):
+    """
+    Check a worksheet of the workbook loaded by _initWorker, returning the annotated rows (or report records), the
+    mismatches and the warnings rather than writing and printing them, so that they can be applied in workbook order
+    """
+    (checkerOptions, configurationSheet, configurationSheetColumnName, writeHeaderFirst,
+     reportFlag, flaggedRowsOnly, maxMismatches, keepMismatches) = _workerState['options']
+    wb = _workerState['wb']
+    memo = _workerState['memo']
+    memoStats = memo.getStats() if memo is not None else (0, 0)
+    rules = checkerOptions['rules']
+    prefilterStats = rules.getPrefilterStats()
+    rows = []
+    logLines = []
+    reportRecords = ReportRecordList() if reportFlag else None
+
+    def writeRow(*row):
+        # Only the header and flagged rows are written to a sparse or patched output file, so others are not sent
+        # back
+        if not flaggedRowsOnly or row[0] == 1 or isFlaggedRow(row[2]):
+            rows.append(row)
+
+    mismatchStore = MismatchStore() if keepMismatches else None
+    checker = checkWorksheet(
+        wb[title], set(wb.sheetnames), None if reportFlag or maxMismatches is not None else writeRow,
+        writeHeaderFirst,
+        dict(checkerOptions, memo=memo, reportWriter=reportRecords, mismatchStore=mismatchStore,
+             configurationSheetColumnName=configurationSheetColumnName if title == configurationSheet else None),
+        logLines.append, cancelEvent=_workerState['stopEvent'], maxMismatches=maxMismatches)
+    if memo is not None:
+        memoStats = tuple(count - countBefore for count, countBefore in zip(memo.getStats(), memoStats))
+    prefilterStats = tuple(count - countBefore for count, countBefore in zip(rules.getPrefilterStats(),
+                                                                             prefilterStats))
+    return (rows, logLines, memoStats, checker.getSummary(), reportRecords.records if reportFlag else [],
+            mismatchStore, prefilterStats)
+
+
+def _compareRowsInWorker(compareArgs, firstRowNumber, rows):
+    """
+    compareRows with the memo of the worker process. Also returns the hits and misses of the memo for the rows, and
+    the cells counted by the rules, see rules.RuleSet.getPrefilterStats.
+    """
+    stopEvent = _workerState.get('stopEvent')
+    if stopEvent is not None and stopEvent.is_set():
+        raise CheckCancelled()
+    # The rules of compareArgs are sent with every chunk, so that they only count the cells of the chunk
+    rules = compareArgs[-1]
+    memo = _workerState.get('memo')
+    if memo is None:
+        return compareRows(compareArgs, firstRowNumber, rows), (0, 0), rules.getPrefilterStats()
+    memoStats = memo.getStats()
+    results = compareRows(compareArgs, firstRowNumber, rows, memo)
+    return (results, tuple(count - countBefore for count, countBefore in zip(memo.getStats(), memoStats)),
+            rules.getPrefilterStats())
+
+
+def _comparePairsInWorker(compareOptions, pairGroups):
+    """
+    Compare the pairs of values of pairGroups, see buildPairIndex
+
+    Input:
+    compareOptions (tuple): ignoreOrder, skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd and
+    rules of the run
+    pairGroups (list): Tuples of a base value and of the list of the values compared to it
+
+    Output:
+    Tuple of the list of the comparisons of the values of each group with its base value (None for a group that
+    could not be compared, whose rows are compared when they are checked), and the cells counted by the rules, see
+    rules.RuleSet.getPrefilterStats
+    """
+    ignoreOrder, skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd, rules = compareOptions
+    groupComparisons = []
+    for baseValue, curValues in pairGroups:
+        values = [baseValue] + curValues
+        try:
+            baseColumnDict, mismatchDict, fixDict = compareRowValues(
+                values, dict.fromkeys(range(len(values))), 0, ignoreOrder, skipFormatCheckFlag,
+                formatCheckCharacters, formatCheckCharactersAdd, rules=rules)
+        except FatalError:
+            groupComparisons.append(None)
+            continue
+        groupComparisons.append([(baseColumnDict[0], mismatchDict.get(colIdx), fixDict.get(colIdx))
+                                 for colIdx in range(1, len(values))])
+    return groupComparisons, rules.getPrefilterStats()
+
+
+def buildPairIndex(wb, checkerOptions, executor, memo, pairsPerTask, cancelEvent=None):
+    """
+    Compare every unique pair of base and compared values of wb once, in executor, and add their comparisons to
+    memo before the rows are checked, so that with --dedup-pairs and several processes each pair is only compared
+    once in the whole run. Pairs with a value that is neither text nor empty are compared when their rows are
+    checked.
+
+    Input:
+    wb: Workbook read one row at a time
+    checkerOptions (dict): Options of the WorksheetChecker of every worksheet
+    executor (concurrent.futures.Executor): Pool the pairs are compared in
+    memo (ComparisonMemo): Memo keeping every comparison
+    pairsPerTask (int): Number of pairs compared in each task of executor
+    cancelEvent (threading.Event [opt]): If set, CheckCancelled is raised before the next row or task
+
+    Output:
+    Number of unique pairs compared
+    """
+    sheetTitles = set(wb.sheetnames)
+    options = dict(checkerOptions, verbose=False)
+    rules = options['rules']
+    # Base value -> compared values, both in the order they are first read in
+    pairGroups = collections.OrderedDict()
+    for ws in wb:
+        rows = ws.iter_rows(values_only=True)
+        if cancelEvent is not None:
+            rows = iterRowsUntilCancelled(rows, cancelEvent)
+        header = next(rows, None)
+        if header is None:
+            continue
+        checker = WorksheetChecker(ws.title, list(header), sheetTitles, **options)
+        if not checker.copyRows:
+            continue
+        baseColumnIdx = checker.baseColumnIdx
+        if baseColumnIdx is None:
+            baseColumnIdx = sorted(checker.defaultColumnDict)[0]
+        comparedColumns = [colIdx for colIdx in checker.defaultColumnDict if colIdx != baseColumnIdx]
+        for values in rows:
+            values = padRow(values, checker.columnCount)
+            baseValue = values[baseColumnIdx]
+            if baseValue is not None and not isinstance(baseValue, str):
+                continue
+            curValues = pairGroups.setdefault(baseValue, collections.OrderedDict())
+            for colIdx in comparedColumns:
+                curValue = values[colIdx]
+                if curValue is None or isinstance(curValue, str):
+                    curValues[curValue] = None
+
+    compareOptions = (options['ignoreOrder'], options['skipFormatCheckFlag'], options['formatCheckCharacters'],
+                      options['formatCheckCharactersAdd'], rules)
+    tasks = []
+    task = []
+    taskPairs = 0
+    for baseValue, curValues in pairGroups.items():
+        if curValues:
+            task.append((baseValue, list(curValues)))
+            taskPairs += len(curValues)
+        if taskPairs >= pairsPerTask:
+            tasks.append((task, executor.submit(_comparePairsInWorker, compareOptions, task)))
+            task = []
+            taskPairs = 0
+    if task:
+        tasks.append((task, executor.submit(_comparePairsInWorker, compareOptions, task)))
+
+    pairCount = 0
+    for task, future in tasks:
+        if cancelEvent is not None and cancelEvent.is_set():
+            executor.shutdown(cancel_futures=True)
+            raise CheckCancelled()
+        groupComparisons, prefilterStats = future.result()
+        rules.addPrefilterStats(prefilterStats)
+        for (baseValue, curValues), comparisons in zip(task, groupComparisons):
+            if comparisons is None:
+                continue
+            for curValue, comparison in zip(curValues, comparisons):
+                # Same key as in compareRowValues
+                memo.addPrecomputed((baseValue, curValue, options['ignoreOrder'], options['skipFormatCheckFlag'],
+                                     options['formatCheckCharacters'], options['formatCheckCharactersAdd'],
+                                     rules.names), comparison)
+                pairCount += 1
+    return pairCount
+
+
+def _iterWorksheetResultsInPool(executor, wb, jobs, chunkRows=None):
+    """
+    Check the worksheets of wb (a workbook or a list of its worksheets) in executor, a pool of jobs processes
+    initialized by _initWorker, and yield the title and result of each worksheet in that order. At most two
+    worksheets per process are in flight at any time.
+
+    Worksheets with more than chunkRows rows are not checked as a whole in a single process: the worksheet itself
+    is yielded instead of a result, so that its rows can be compared in chunks in the pool.
+    """
+    def submit(ws):
+        if chunkRows and (ws.max_row or 0) > chunkRows:
+            return ws
+        return executor.submit(_checkWorksheetInWorker, ws.title)
+
+    pending = collections.deque()
+    worksheetIter = iter(wb)
+    for ws in worksheetIter:
+        pending.append((ws.title, submit(ws)))
+        if len(pending) >= jobs * 2:
+            break
+    while pending:
+        yield pending.popleft()
+        for ws in worksheetIter:
+            pending.append((ws.title, submit(ws)))
+            break
+
+
+class WorkbookOutput(object):
+    """
+    Output the checked rows of a workbook are written to, made by selectWorkbookOutput: a new workbook (built in
+    memory, streamed with --stream or spooled within a memory budget, with every row or only the flagged ones with
+    --sparse-output), patches of the input file with the patch output engine, or nothing when mismatches are
+    reported as records or only counted.
+
+    Input:
+    kind (str): "workbook", "patch" or None for no output
+    stream, sparseOutputFlag: see parseArguments
+    memoryBudget (spill.MemoryBudget [opt]): If passed, the output rows are kept within this budget until the output
+    file is written
+    """
+
+    def __init__(self, kind, stream=False, sparseOutputFlag=False, memoryBudget=None):
+        self.kind = kind
+        self.stream = stream
+        self.sparseOutputFlag = sparseOutputFlag
+        self.memoryBudget = memoryBudget
+        self.alignment = xl.styles.Alignment(wrap_text=True)
+        self.worksheetPatches = []
+        self.wbOut = None
+        self.writeRow = appendOutputRow if stream else writeOutputRow
+        if kind == "workbook" and memoryBudget is not None and not stream:
+            # Rows are kept within the memory budget until the output workbook is written
+            self.wbOut = SpooledWorkbook(memoryBudget)
+            self.writeRow = spoolOutputRow
+        elif kind == "workbook":
+            self.wbOut = xl.Workbook(write_only=stream)
+            register_styles(self.wbOut)
+            if not stream:
+                self.wbOut.remove(self.wbOut.active)
+
+    @property
+    def copiesEveryCell(self):
+        """
+        Whether every cell of the input file is copied to the output, rather than only the compared columns (and the
+        sheet names of the configuration sheet) being read
+        """
+        return self.kind == "workbook"
+
+    @property
+    def flaggedRowsOnly(self):
+        """
+        Whether only the header and the flagged rows of the worksheets are written to the output
+        """
+        return self.kind == "patch" or (self.kind == "workbook" and self.sparseOutputFlag)
+
+    @property
+    def readOnlyInput(self):
+        """
+        Whether the input file can be read one row at a time. Only an output workbook built in memory with every row
+        of the input file is built from the input workbook loaded as a whole.
+        """
+        return not self.copiesEveryCell or self.stream or self.sparseOutputFlag or self.memoryBudget is not None
+
+    def addWorksheet(self, title):
+        """
+        Output:
+        Function the output rows of the worksheet titled title are passed to, see checkWorksheet. None if there is
+        no output.
+        """
+        if self.kind == "patch":
+            worksheetPatch = WorksheetPatch(title, self.memoryBudget)
+            self.worksheetPatches.append(worksheetPatch)
+            return worksheetPatch
+        if self.kind == "workbook" and self.sparseOutputFlag:
+            return SparseRowWriter(self.wbOut, title, self.writeRow, self.alignment)
+        if self.kind == "workbook":
+            return functools.partial(self.writeRow, self.wbOut.create_sheet(title=title), alignment=self.alignment)
+        return None
+
+    def finishWorksheet(self, writeRow, summary):
+        """
+        Input:
+        writeRow (function): Function returned by addWorksheet for the worksheet
+        summary (WorksheetSummary): Summary of the check of the worksheet
+        """
+        if isinstance(writeRow, WorksheetPatch):
+            writeRow.setRows(summary.rowCount, summary.mismatchFlagIdx)
+
+    def finish(self):
+        """
+        Build the output workbook from the spooled rows, once every worksheet has been checked
+        """
+        if isinstance(self.wbOut, SpooledWorkbook):
+            self.wbOut = writeSpooledWorkbook(self.wbOut, self.alignment)
+
+    def discard(self):
+        """
+        Release the output of a check that stopped before the end
+        """
+        if self.stream:
+            discardWriteOnlyWorkbook(self.wbOut)
+
+    def hasOutputFile(self):
+        return self.wbOut is not None or bool(self.worksheetPatches)
+
+    def save(self, outputFileName, source):
+        """
+        Input:
+        outputFileName (str): Path of the output file
+        source (str or bytes): Path or content of the input file, only used by the patch output engine
+        """
+        if self.wbOut is not None:
+            self.wbOut.save(outputFileName)
+        else:
+            savePatchedWorkbook(source if isinstance(source, str) else io.BytesIO(source), outputFileName,
+                                self.worksheetPatches,
+                                {MISMATCH_FILL_STYLE_NAME: RED, LESSER_MISMATCH_FILL_STYLE_NAME: YELLOW})
+
+
+def selectWorkbookOutput(args, reportWriter=None, maxMismatches=None, memoryBudget=None):
+    """
+    Input:
+    args (argparse.Namespace [opt]): Options, see parseArguments
+    reportWriter, maxMismatches, memoryBudget: see _checkWorkbook
+
+    Output:
+    WorkbookOutput of the check. There is none when mismatches are reported as records or only counted up to
+    --max-mismatches.
+    """
+    stream = getattr(args, 'stream', False)
+    sparseOutputFlag = getattr(args, 'sparseOutputFlag', False)
+    patchOutputFlag = getattr(args, 'outputEngine', "workbook") == "patch"
+    if patchOutputFlag and sparseOutputFlag:
+        raise FatalError("--sparse-output cannot be used with the patch output engine")
+    if reportWriter is not None or maxMismatches is not None:
+        kind = None
+    else:
+        kind = "patch" if patchOutputFlag else "workbook"
+    return WorkbookOutput(kind, stream, sparseOutputFlag, memoryBudget)
+
+
+def openInputWorkbook(file_obj, reader, output, jobs, columnFilter=None, profile=None):
+    """
+    Open the workbook to check, read one row at a time unless output needs it loaded as a whole, see
+    WorkbookOutput.readOnlyInput. With several jobs, the workbook is only read for the titles and sizes of its
+    worksheets, and always read-only.
+
+    Input:
+    file_obj (str or file): Path to or file object of the workbook
+    reader (str): One of xlsx_reader.READERS
+    output (WorkbookOutput): Output of the check
+    jobs (int): Number of processes the worksheets are checked in
+    columnFilter (CheckedColumnFilter [opt]): Columns to read with the xml reader
+    profile (profiling.Profile [opt]): If passed, the time spent loading the workbook is added to its load phase
+
+    Output:
+    XmlWorkbook or openpyxl workbook
+    """
+    loadStart = time.perf_counter()
+    wb = openWorkbook(file_obj, reader, readOnly=jobs > 1 or output.readOnlyInput, columnFilter=columnFilter)
+    if profile is not None:
+        profile.addTime("load", time.perf_counter() - loadStart)
+    return wb
+
+
+class WorksheetChecks(object):
+    """
+    Checks the worksheets of a workbook in this process or, with several jobs, in a pool of worker processes that
+    load the workbook themselves, see _iterWorksheetResultsInPool, and collects the summary, mismatches, records
+    and output rows of each worksheet in workbook order.
+
+    Input:
+    jobs, chunkRows, reader: see _checkWorkbook
+    source (str or bytes): Path or content of the workbook, loaded by worker processes. Only used with several jobs.
+    output (WorkbookOutput): Output of the check
+    checkerOptions (dict): Keyword arguments for WorksheetChecker
+    configurationSheet, configurationSheetColumnName: see parseArguments
+    memo (ComparisonMemo): Memo of this process, None if comparisons are not memoized
+    memoSize (int): Size of the memo of each worker process
+    reportWriter (reports.ReportWriter): Writer of the mismatch records, None if there is none
+    mismatches (results.MismatchStore): Store every mismatch is added to, None if they are not kept
+    columnFilter (CheckedColumnFilter): Columns read by worker processes with the xml reader, None for every column
+    maxMismatches (int): Number of mismatched rows and missing sheets after which checking stops, None for no limit
+    profile (profiling.Profile): Profile of the run, None if it is not timed
+    cancelEvent (threading.Event): Event cancelling the check, None if it cannot be cancelled
+    """
+
+    def __init__(self, jobs, chunkRows, source, output, checkerOptions, configurationSheet,
+                 configurationSheetColumnName, memo, memoSize, reportWriter, mismatches, reader, columnFilter,
+                 maxMismatches, profile, cancelEvent):
+        self.jobs = jobs
+        self.chunkRows = chunkRows
+        self.output = output
+        self.checkerOptions = checkerOptions
+        self.configurationSheet = configurationSheet
+        self.configurationSheetColumnName = configurationSheetColumnName
+        self.memo = memo
+        self.reportWriter = reportWriter
+        self.mismatches = mismatches
+        self.maxMismatches = maxMismatches
+        self.profile = profile
+        self.cancelEvent = cancelEvent
+        self.executor = None
+        # Stops the worker processes when checking stops before every worksheet is checked: at maxMismatches, on
+        # cancellation or on an error. Checks that cannot stop early do not pay for checking it on every row.
+        self.stopEvent = None
+        if jobs > 1:
+            if maxMismatches is not None or cancelEvent is not None:
+                self.stopEvent = multiprocessing.Event()
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs, initializer=_initWorker,
+                initargs=(source, checkerOptions, configurationSheet, configurationSheetColumnName, output.stream,
+                          memoSize, reportWriter is not None, output.flaggedRowsOnly, reader, columnFilter,
+                          maxMismatches, mismatches is not None, self.stopEvent))
+
+    def iterResults(self, worksheets):
+        """
+        Yield the title of each worksheet, in order, with its result to pass to getSummary
+        """
+        if self.executor is not None:
+            return _iterWorksheetResultsInPool(self.executor, worksheets, self.jobs, self.chunkRows)
+        return ((ws.title, ws) for ws in worksheets)
+
+    def getSummary(self, title, result, sheetTitles, writeRow, issueCount):
+        """
+        Finish checking a worksheet.
+
+        Input:
+        title (str): Title of the worksheet
+        result: Result of the worksheet yielded by iterResults: the result of a worker process, or the worksheet to
+        check in this process, comparing its rows in the worker processes if there are any
+        sheetTitles (set): Titles of every sheet in the workbook
+        writeRow (function): Function the output rows are passed to, see WorkbookOutput.addWorksheet
+        issueCount (int): Number of mismatched rows and missing sheets found in the previous worksheets
+
+        Output:
+        WorksheetSummary of the worksheet
+        """
+        if not isinstance(result, concurrent.futures.Future):
+            return checkWorksheet(
+                result, sheetTitles, writeRow, self.output.stream,
+                dict(self.checkerOptions, memo=self.memo, reportWriter=self.reportWriter,
+                     mismatchStore=self.mismatches,
+                     configurationSheetColumnName=self.configurationSheetColumnName
+                     if title == self.configurationSheet else None),
+                executor=self.executor, chunkRows=self.chunkRows, maxPendingChunks=self.jobs * 2,
+                profile=self.profile, cancelEvent=self.cancelEvent,
+                maxMismatches=self.maxMismatches - issueCount if self.maxMismatches is not None else None
+            ).getSummary()
+
+        (rows, logLines, memoStats, summary, reportRecords, worksheetMismatches,
+         prefilterStats) = result.result()
+        if self.mismatches is not None:
+            self.mismatches.extend(worksheetMismatches)
+        if self.memo is not None:
+            self.memo.addStats(memoStats)
+        self.checkerOptions['rules'].addPrefilterStats(prefilterStats)
+        for logLine in logLines:
+            print(logLine)
+        if self.reportWriter is not None:
+            self.reportWriter.writeRecords(reportRecords)
+        if writeRow is not None:
+            if self.profile is not None:
+                writeRow = self.profile.timed("copy", writeRow)
+            for row in rows:
+                writeRow(*row)
+        return summary
+
+    def shutdown(self, cancelFutures=False):
+        """
+        Stop the worker processes. With cancelFutures, the worksheets and chunks they have not finished checking are
+        dropped, and those being checked stop before their next row or chunk.
+        """
+        if self.executor is not None:
+            if cancelFutures and self.stopEvent is not None:
+                self.stopEvent.set()
+            self.executor.shutdown(cancel_futures=cancelFutures)
+
+
+def validate_workbook(file_obj, args=None, jobs=None, chunkRows=None, profile=None, reportWriter=None):
+    """
+    Check every worksheet of a Bulk Translation file.
+
+    Input:
+    file_obj (str or file): Path to or file object of the workbook
+    args, jobs, chunkRows, profile, reportWriter: see check_workbook
+
+    Output:
+    Tuple of the output workbook (None with a reportWriter) and a list of summary messages. Use check_workbook for
+    the whole WorkbookResult, with the mismatch of every cell.
+    """
+    result = check_workbook(file_obj, args, jobs, chunkRows, profile, reportWriter)
+    return result.wbOut, result.messages
+
+
+def check_workbook(file_obj, args=None, jobs=None, chunkRows=None, profile=None, reportWriter=None,
+                   keepMismatches=False):
+    """
+    Check every worksheet of a Bulk Translation file.
+
+    Input:
+    file_obj (str or file): Path to or file object of the workbook
+    args (argparse.Namespace [opt]): Options, see parseArguments. If args.cancelEvent (threading.Event) is set
+    during the check, CheckCancelled is raised before the next row or worksheet.
+    jobs (int [opt]): Number of processes worksheets are checked in. Overrides args.jobs.
+    0 uses one process per CPU. Defaults to 1.
+    chunkRows (int [opt]): When checking in several processes, the rows of worksheets with more than this number
+    of rows are checked in chunks of this number of rows, in all of the processes. Overrides args.chunkRows.
+    0 checks every worksheet in a single process. Defaults to 5000.
+    profile (profiling.Profile [opt]): If passed, the time spent in each phase, worksheet and check of the run is
+    recorded in it. Checks are only timed in the current process.
+    reportWriter (reports.ReportWriter [opt]): If passed, a record is written to it for each mismatched cell as the
+    rows are checked, and no output workbook is built or saved
+    keepMismatches (bool [opt]): If True, every mismatch is kept in the mismatches of the result, within the
+    memory budget of args.memoryBudgetMb if set. Iterating them yields a results.MismatchRecord per mismatched cell,
+    in the order the cells were checked, see results.MismatchStore.
+
+    Output:
+    WorkbookResult of the workbook, with no error
+    """
+    result = _checkWorkbook(file_obj, args, jobs, chunkRows, profile, reportWriter, keepMismatches)
+    if profile is not None:
+        profile.finish()
+    return result
+
+
+def _checkWorkbook(file_obj, args=None, jobs=None, chunkRows=None, profile=None, reportWriter=None,
+                   keepMismatches=False):
+    """
+    Same as check_workbook, without finishing profile
+    """
     messages = []
-    wb = xl.load_workbook(file_obj)
-    if args and args.verbose:
-        print("Workbook Loaded")
+    if jobs is None:
+        jobs = getattr(args, 'jobs', 1)
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if chunkRows is None:
+        chunkRows = getattr(args, 'chunkRows', DEFAULT_CHUNK_ROWS)
+    dedupPairsFlag = getattr(args, 'dedupPairsFlag', False)
+    memoSize = getattr(args, 'memoSize', DEFAULT_MEMO_SIZE)
+    if dedupPairsFlag:
+        memoSize = max(memoSize, DEFAULT_DEDUP_MEMO_SIZE)
+    memo = ComparisonMemo(memoSize) if memoSize != 0 else None
     verbose = args.verbose if args else False
     columns = args.columns if args else None
     baseColumn = args.baseColumn if args else None
@@ -551,95 +2171,118 @@ def validate_workbook(file_obj, args=None):
     configurationSheetColumnName = args.configurationSheetColumnName if args else 'sheet_name'
     createOutputFileFlag = args.createOutputFileFlag if args else False
     debugMode = args.debugMode if args else False
+    cancelEvent = getattr(args, 'cancelEvent', None)
+    maxMismatches = getattr(args, 'maxMismatches', None)
+    memoryBudgetMb = getattr(args, 'memoryBudgetMb', None)
+    memoryBudget = MemoryBudget(int(memoryBudgetMb * MB)) if memoryBudgetMb is not None else None
     outputFolder = args.outputFolder if args else 'commcareTranslationChecker_Output'
-
-    # Open new Workbook
-    wbOut = xl.Workbook()
-    register_styles(wbOut)
-    wbOut.remove(wbOut.active)
+    # Path of the workbook, named in the result and the output file name. file_obj may be a file object of args.file.
+    fileName = file_obj if isinstance(file_obj, str) else getattr(args, 'file', None)
+    reader = getattr(args, 'reader', "openpyxl")
+    skipRules = getattr(args, 'skipRules', None)
+    rules = RuleSet(skipRules.split(",") if skipRules else (), skipFormatCheckFlag,
+                    getattr(args, 'prefilterFlag', True))
+    if profile is not None:
+        rules.startTiming(profile.rules, profile.checkFunctions(globals()))
+    checkerOptions = dict(columns=columns, baseColumn=baseColumn, ignoreOrder=ignoreOrder,
+                          outputMismatchTypesFlag=outputMismatchTypesFlag, skipFormatCheckFlag=skipFormatCheckFlag,
+                          formatCheckCharacters=formatCheckCharacters,
+                          formatCheckCharactersAdd=formatCheckCharactersAdd, verbose=verbose, rules=rules)
+    output = selectWorkbookOutput(args, reportWriter, maxMismatches, memoryBudget)
+
+    source = None
+    if jobs > 1 or output.kind == "patch":
+        # Every worker process loads the workbook itself, and the patch output engine copies it
+        source = file_obj if isinstance(file_obj, str) else file_obj.read()
+        file_obj = source if isinstance(source, str) else io.BytesIO(source)
+    if dedupPairsFlag and jobs > 1 and maxMismatches is None:
+        # The unique pairs of the workbook are compared in worker processes first, then its rows are checked in this
+        # process, each pair being found in memo
+        indexStart = time.perf_counter()
+        indexWb = openWorkbook(source if isinstance(source, str) else io.BytesIO(source), reader, readOnly=True,
+                               columnFilter=CheckedColumnFilter(columns, configurationSheet,
+                                                                configurationSheetColumnName))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as indexExecutor:
+                buildPairIndex(indexWb, checkerOptions, indexExecutor, memo, chunkRows, cancelEvent)
+        finally:
+            indexWb.close()
+        if profile is not None:
+            profile.addTime("check", time.perf_counter() - indexStart)
+        jobs = 1
+    # Only the compared columns are needed when the rows are not copied to an output workbook
+    columnFilter = None
+    if not output.copiesEveryCell:
+        columnFilter = CheckedColumnFilter(columns, configurationSheet, configurationSheetColumnName)
+    wb = openInputWorkbook(file_obj, reader, output, jobs, columnFilter, profile)
+    if verbose:
+        print("Workbook Loaded")
+    sheetTitles = set(wb.sheetnames)
 
     # Summary lists
     wsMismatchDict = {}
     wbMissingSheets = []
-
-    # Iterate through WorkSheets
-    for ws in wb:
+    mismatches = MismatchStore(memoryBudget) if keepMismatches else None
+    totalRowCount = 0
+    issueCount = 0
+    worksheets = wb
+    if maxMismatches is not None:
+        worksheets = orderWorksheetsForBudget(wb, configurationSheet)
+
+    # Iterate through WorkSheets, in worker processes if there are several jobs
+    checks = WorksheetChecks(jobs, chunkRows, source, output, checkerOptions, configurationSheet,
+                             configurationSheetColumnName, memo, memoSize, reportWriter, mismatches, reader,
+                             columnFilter, maxMismatches, profile, cancelEvent)
+    for title, result in checks.iterResults(worksheets):
         try:
-            wbOut.create_sheet(title=ws.title)
-            wsOut = wbOut[ws.title]
-
-            # Dictionaries mapping column index to column name
-            defaultColumnDict = {}
-
-            maxHeaderIdx = 0
-            # Find all columns of format "default_[CODE]"
-            ws_rows = list(ws.rows)
-            for headerIdx, cell in enumerate(ws_rows[0]):
-                # First, copy cell into new workbook
-                createOutputCell(cell, wsOut)
-                if columns:
-                    if cell.value in columns:
-                        defaultColumnDict[headerIdx] = cell.value
-                elif cell.value and cell.value[:8] == "default_":
-                    defaultColumnDict[headerIdx] = cell.value
-                if headerIdx > maxHeaderIdx:
-                    maxHeaderIdx = headerIdx
-            # If defaultColumnDict is empty, skip processing
-            # Otherwise, create header cell in wsOut for mismatchFlag
-            if len(defaultColumnDict) != 0:
-                mismatchFlagIdx = appendColumnIfNotExist(wsOut, "mismatchFlag")
-
-                # For every default column except base column create fixed text column
-                fixedColumnDict = appendFixColumns(wsOut, baseColumn, defaultColumnDict)
-
-                for rowIdx, row in enumerate(ws_rows[1:]):
-                    # First, copy every cell into new workbook
-                    for cell in row:
-                        createOutputCell(cell, wsOut)
-
-                    # Fetch baseColumn information
-                    baseColumnIdx = None
-                    if baseColumn:
-                        for colIdx in defaultColumnDict.keys():
-                            if defaultColumnDict[colIdx] == baseColumn:
-                                baseColumnIdx = colIdx
-
-                    # Check row for mismatch and print results
-                    rowCheckResults = checkRowForMismatch(
-                        row, defaultColumnDict, fixedColumnDict, baseColumnIdx, ignoreOrder, wsOut, mismatchFlagIdx,
-                        outputMismatchTypesFlag, skipFormatCheckFlag, formatCheckCharacters, formatCheckCharactersAdd,
-                        verbose)
-                    if len(rowCheckResults[1]) > 0:
-                        if ws.title not in list(wsMismatchDict.keys()):
-                            wsMismatchDict[ws.title] = 1
-                        else:
-                            wsMismatchDict[ws.title] += 1
-                        if verbose:
-                            baseColumnName = defaultColumnDict[list(rowCheckResults[0].keys())[0]]
-                            if outputMismatchTypesFlag:
-                                mismatchColumnNames = ",".join(
-                                    "%s (%s)" %
-                                    (defaultColumnDict[i],
-                                     ",".join(rowCheckResults[1][i][1])) for i in rowCheckResults[1].keys())
-                            else:
-                                mismatchColumnNames = ",".join(defaultColumnDict[i] for i in rowCheckResults[1].keys())
-                            print("WARNING %s row %s: the output values in %s do not match %s" %
-                                  (ws.title, rowIdx + 2, mismatchColumnNames, baseColumnName))
-            elif verbose:
-                print("WARNING %s: No columns found for comparison" % (ws.title,))
-            # If ws is a configuration sheet, run the configuration check
-            if ws.title == configurationSheet:
-                wbMissingSheets = checkConfigurationSheet(wb, ws, configurationSheetColumnName, wsOut, verbose)
+            if cancelEvent is not None and cancelEvent.is_set():
+                raise CheckCancelled()
+            if profile is not None:
+                sheetStart = time.perf_counter()
+                sheetCheckCopyTime = profile.phases["check"] + profile.phases["copy"]
+            writeWsOutRow = output.addWorksheet(title)
+            summary = checks.getSummary(title, result, sheetTitles, writeWsOutRow, issueCount)
+            output.finishWorksheet(writeWsOutRow, summary)
+            totalRowCount += summary.rowCount
+            if summary.mismatchCount:
+                wsMismatchDict[title] = summary.mismatchCount
+            # If ws is a configuration sheet, keep the result of the configuration check
+            if title == configurationSheet:
+                wbMissingSheets = summary.missingSheetList
+            issueCount += summary.mismatchCount + len(summary.missingSheetList or [])
+            if profile is not None:
+                sheetTime = time.perf_counter() - sheetStart
+                sheetCheckCopyTime = profile.phases["check"] + profile.phases["copy"] - sheetCheckCopyTime
+                profile.addTime("read", sheetTime - sheetCheckCopyTime)
+                profile.addSheet(title, sheetTime, summary.rowCount, summary.cellCount)
+            if maxMismatches is not None and issueCount > maxMismatches:
+                break
+        except CheckCancelled:
+            checks.shutdown(cancelFutures=True)
+            wb.close()
+            output.discard()
+            raise
         except Exception as e:
             if debugMode:
                 tb.print_exc(e)
-            raise FatalError("FATAL ERROR in worksheet %s : %s" % (ws.title, str(e)))
+            checks.shutdown(cancelFutures=True)
+            raise FatalError("FATAL ERROR in worksheet %s : %s" % (title, str(e)))
+
+    checks.shutdown(cancelFutures=maxMismatches is not None)
+    wb.close()
+    output.finish()
+    if verbose and memo is not None:
+        print(memo.getSummary())
+    if verbose and rules.prefilter:
+        print(rules.getPrefilterSummary())
+    if profile is not None:
+        profile.addPrefilterStats(rules.getPrefilterStats())
 
     # Save workbook and print summary
     if len(wsMismatchDict) > 0 or (wbMissingSheets is not None and len(wbMissingSheets) > 0):
-        if args and createOutputFileFlag:
+        if args and createOutputFileFlag and output.hasOutputFile():
             tsString = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            fileBasename = os.path.splitext(os.path.basename(args.file))[0]
+            fileBasename = os.path.splitext(os.path.basename(fileName))[0]
             outputFolder = outputFolder
             outputFileName = os.path.join(outputFolder, "%s_%s_Output.xlsx" % (fileBasename, tsString))
             # Create the output directory if it does not exist
@@ -652,7 +2295,10 @@ def validate_workbook(file_obj, args=None):
                         messages.append("ERROR CREATING OUTPUT DIRECTORY : %s" % (str(e),))
                         if debugMode:
                             tb.print_exc(e)
-            wbOut.save(outputFileName)
+            saveStart = time.perf_counter()
+            output.save(outputFileName, source)
+            if profile is not None:
+                profile.addTime("save", time.perf_counter() - saveStart)
             messages.append("There were issues with the following worksheets, see %s for details:" % (outputFileName,))
         else:
             messages.append("There were issues with the following worksheets:")
@@ -662,23 +2308,293 @@ def validate_workbook(file_obj, args=None):
         for key in wsMismatchDict.keys():
             messages.append("%s : %s row%s mismatched" %
                             (key, wsMismatchDict[key], "" if wsMismatchDict[key] == 1 else "s"))
-    return wbOut, messages
+    if maxMismatches is not None and issueCount > maxMismatches:
+        messages.append("Stopped checking after more than %s mismatched rows and missing sheets, see --max-mismatches" %
+                        (maxMismatches,))
+    if dedupPairsFlag:
+        messages.append(memo.getRepetitionSummary())
+    if memoryBudget is not None:
+        messages.append(memoryBudget.getSummary())
+    return WorkbookResult(fileName, output.wbOut, messages, wsMismatchDict, wbMissingSheets, totalRowCount, None, mismatches)
+
+
+def expandWorkbookPaths(paths):
+    """
+    Input:
+    paths (list): Paths of workbooks, of directories or glob patterns
+
+    Output:
+    List of the paths of the workbooks. Directories are replaced by the .xlsx files they contain and glob patterns
+    by the files they match, both in sorted order. Excel lock files ("~$...") are skipped.
+    """
+    workbookPaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(path, "*.xlsx"))
+        elif glob.has_magic(path):
+            matches = glob.glob(path, recursive=True)
+        else:
+            workbookPaths.append(path)
+            continue
+        workbookPaths.extend(match for match in sorted(matches)
+                             if os.path.isfile(match) and not os.path.basename(match).startswith("~$"))
+    return workbookPaths
+
+
+def _validateWorkbookCatchingErrors(path, args, captureOutput=False, jobs=1, reportWriter=None,
+                                    keepMismatches=False):
+    """
+    Check the workbook at path with check_workbook, in a single process.
+
+    Input:
+    path (str): Path of the workbook
+    args (argparse.Namespace): Options, see parseArguments
+    captureOutput (bool [opt]): If True, the output printed while checking the workbook is returned rather than
+    printed, and the output workbook is not returned, so that the result can be sent back from a worker process
+    jobs (int [opt]): Number of processes the worksheets of the workbook are checked in, see check_workbook
+    reportWriter (reports.ReportWriter [opt]): Writer of the mismatch records of the workbook, see
+    check_workbook. With captureOutput, pass a ReportRecordList so that the records are returned.
+    keepMismatches (bool [opt]): see check_workbook
+
+    Output:
+    Tuple of the WorkbookResult of the workbook, holding the error message if the workbook could not be checked,
+    the captured output and the records kept by reportWriter if it is a ReportRecordList
+    """
+    fileArgs = argparse.Namespace(**dict(vars(args) if args else {}, file=path))
+    output = io.StringIO() if captureOutput else None
+    if reportWriter is not None:
+        reportWriter.file = path
+    try:
+        with contextlib.redirect_stdout(output) if captureOutput else contextlib.nullcontext():
+            result = check_workbook(path, fileArgs, jobs=jobs, reportWriter=reportWriter,
+                                    keepMismatches=keepMismatches)
+    except (xl.utils.exceptions.InvalidFileException, zipfile.BadZipFile, FatalError, OSError) as e:
+        if getattr(args, 'debugMode', False):
+            tb.print_exc()
+        result = WorkbookResult(path, None, [], {}, [], 0, str(e))
+    if captureOutput:
+        discardWriteOnlyWorkbook(result.wbOut)
+        result = result._replace(wbOut=None)
+    return (result, output.getvalue() if captureOutput else None,
+            reportWriter.records if isinstance(reportWriter, ReportRecordList) else None)
+
+
+def validate_workbooks(paths, args=None, jobs=None, reportWriter=None, keepMismatches=False):
+    """
+    Check many Bulk Translation files.
+
+    Input:
+    paths (list): Paths of workbooks, of directories or glob patterns, see expandWorkbookPaths
+    args (argparse.Namespace [opt]): Options, see parseArguments. If args.createOutputFileFlag is set, the output
+    file of each workbook is saved as it is checked.
+    jobs (int [opt]): Number of processes workbooks are checked in, each workbook being checked in a single
+    process. Overrides args.jobs. 0 uses one process per CPU. Defaults to 1.
+    reportWriter (reports.ReportWriter [opt]): If passed, the mismatch records of every workbook are written to it
+    in the order of paths, and no output workbooks are built, see check_workbook
+    keepMismatches (bool [opt]): If True, the mismatches of each workbook are kept in its result, see
+    check_workbook. When checking in several processes, they are sent back from the process that checked the
+    workbook, and kept in memory.
+
+    Output:
+    Iterator of the WorkbookResult of each workbook, in the order of paths. Workbooks that could not be checked
+    have an error rather than raising. Output workbooks are only included when checking in a single process.
+    At most two workbooks per process are in flight at any time, and the output printed (and records written)
+    while checking each workbook is printed in the order of paths.
+    """
+    paths = expandWorkbookPaths(paths)
+    if jobs is None:
+        jobs = getattr(args, 'jobs', 1)
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs <= 1 or len(paths) <= 1:
+        # A single workbook may still have its worksheets checked in several processes
+        for path in paths:
+            yield _validateWorkbookCatchingErrors(path, args, jobs=jobs, reportWriter=reportWriter,
+                                                  keepMismatches=keepMismatches)[0]
+        return
+
+    def submit(path):
+        return executor.submit(_validateWorkbookCatchingErrors, path, args, True, 1,
+                               ReportRecordList() if reportWriter is not None else None, keepMismatches)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = collections.deque()
+        pathIter = iter(paths)
+        for path in pathIter:
+            pending.append(submit(path))
+            if len(pending) >= jobs * 2:
+                break
+        while pending:
+            result, output, reportRecords = pending.popleft().result()
+            for path in pathIter:
+                pending.append(submit(path))
+                break
+            print(output, end="")
+            if reportWriter is not None:
+                reportWriter.file = result.file
+                reportWriter.writeRecords(reportRecords)
+            yield result
+
+
+def getWorkbookStatus(result):
+    """
+    Input:
+    result (WorkbookResult): Result of checking a workbook
+
+    Output:
+    Status of the workbook: "ERROR" if it could not be checked, "ISSUES" if any row is mismatched or any sheet is
+    missing, "OK" otherwise
+    """
+    if result.error is not None:
+        return "ERROR"
+    if len(result.wsMismatchDict) > 0 or len(result.missingSheets or []) > 0:
+        return "ISSUES"
+    return "OK"
+
+
+def exceedsMismatchBudget(result, maxMismatches):
+    """
+    Output:
+    True if the checked workbook has more than maxMismatches mismatched rows and missing sheets, see
+    --max-mismatches
+    """
+    return sum(result.wsMismatchDict.values()) + len(result.missingSheets or []) > maxMismatches
+
+
+@contextlib.contextmanager
+def openReportWriter(args):
+    """
+    Context manager opening the writer of the --report-format records of a run, None without --report-format.
+    When the records are printed, everything else printed in its block goes to stderr instead.
+    """
+    if not getattr(args, 'reportFormat', None):
+        yield None
+    elif args.reportFile == "-":
+        reportWriter = createReportWriter(args.reportFormat, sys.stdout)
+        with contextlib.redirect_stdout(sys.stderr):
+            yield reportWriter
+        reportWriter.flush()
+    else:
+        with open(args.reportFile, "w", newline="" if args.reportFormat == "csv" else None) as reportFile:
+            yield createReportWriter(args.reportFormat, reportFile)
+
+
+def mainBatch(paths, args, reportWriter=None):
+    """
+    Check many workbooks, print the messages of each and a combined summary.
+
+    Input:
+    paths (list): Paths of workbooks, of directories or glob patterns, see expandWorkbookPaths
+    args (argparse.Namespace): Options, see parseArguments
+    reportWriter (reports.ReportWriter [opt]): Writer of the mismatch records of every workbook, see
+    validate_workbooks
+
+    Output:
+    Exit status of the run: 0 if every workbook could be checked (and none has more than --max-mismatches
+    mismatched rows and missing sheets, if passed), 1 otherwise
+    """
+    start = time.perf_counter()
+    results = []
+    for result in validate_workbooks(paths, args, reportWriter=reportWriter):
+        print("== %s ==" % (result.file,))
+        if result.error is not None:
+            print("The process could not be completed. %s" % (result.error,))
+        for message in result.messages:
+            print(message)
+        discardWriteOnlyWorkbook(result.wbOut)
+        results.append(result._replace(wbOut=None))
+    elapsed = time.perf_counter() - start
+    if len(results) == 0:
+        print("No workbooks found in %s" % (", ".join(paths),))
+        return 1
+
+    print("Summary:")
+    for result in results:
+        status = getWorkbookStatus(result)
+        if status == "ERROR":
+            details = result.error
+        else:
+            mismatchCount = sum(result.wsMismatchDict.values())
+            details = "%s row%s mismatched in %s worksheet%s, %s missing sheet%s" % (
+                mismatchCount, "" if mismatchCount == 1 else "s",
+                len(result.wsMismatchDict), "" if len(result.wsMismatchDict) == 1 else "s",
+                len(result.missingSheets or []), "" if len(result.missingSheets or []) == 1 else "s")
+        print("%s : %s (%s)" % (result.file, status, details))
+    rowCount = sum(result.rowCount for result in results)
+    print("Checked %s workbook%s and %s rows in %.2fs (%.2f workbooks/s, %.0f rows/s)" %
+          (len(results), "" if len(results) == 1 else "s", rowCount, elapsed,
+           len(results) / elapsed, rowCount / elapsed))
+    if any(result.error is not None for result in results):
+        return 1
+    maxMismatches = getattr(args, 'maxMismatches', None)
+    if maxMismatches is not None and any(exceedsMismatchBudget(result, maxMismatches) for result in results):
+        return 1
+    return 0
 
 
 def main(argv):
-    args = parseArguments()
+    if argv[:1] == ["serve"]:
+        # Imported here as the server module imports this one
+        from .server import mainServe
+        exit(mainServe(argv[1:]))
+    args = parseArguments(argv)
+    with openReportWriter(args) as reportWriter:
+        if len(args.file) > 1 or os.path.isdir(args.file[0]) or glob.has_magic(args.file[0]):
+            status = mainBatch(args.file, args, reportWriter)
+        else:
+            status = mainSingle(args, reportWriter)
+    if status:
+        exit(status)
+
+
+def mainSingle(args, reportWriter=None):
+    """
+    Check the single workbook of args.file and print its messages, see main
+
+    Output:
+    Exit status of the run: -1 if the file is invalid, 1 if it has more than --max-mismatches mismatched rows and
+    missing sheets or could not be checked with --max-mismatches, None otherwise
+    """
     messages = []
+    status = None
+    maxMismatches = getattr(args, 'maxMismatches', None)
+    profile = None
+    statsProfile = None
+    if args.profile:
+        profile = Profile()
+    if args.profileStatsFile:
+        statsProfile = cProfile.Profile()
+        statsProfile.enable()
     try:
-        result_wb, messages = validate_workbook(args.file, args)
+        if reportWriter is not None:
+            reportWriter.file = args.file[0]
+        result = check_workbook(args.file[0], args, profile=profile, reportWriter=reportWriter)
+        discardWriteOnlyWorkbook(result.wbOut)
+        messages = result.messages
+        if maxMismatches is not None and exceedsMismatchBudget(result, maxMismatches):
+            status = 1
     except xl.utils.exceptions.InvalidFileException as e:
         print("Invalid File: %s" % (str(e),))
         if args.debugMode:
             tb.print_exc(e)
-        exit(-1)
+        return -1
     except FatalError as e:
-        print("The process could not be completed. %s" % e.message)
+        print("The process could not be completed. %s" % (str(e),))
+        if maxMismatches is not None:
+            status = 1
+    finally:
+        if statsProfile is not None:
+            statsProfile.disable()
+            statsProfile.dump_stats(args.profileStatsFile)
     for message in messages:
         print(message)
+    if profile is not None:
+        if args.profile == "-":
+            print(profile.toJson())
+        else:
+            with open(args.profile, "w") as profileFile:
+                profileFile.write(profile.toJson() + "\n")
+    return status
 
 
 def entryPoint():
@@ -1,3 +1,31 @@
 from __future__ import absolute_import
 
-from .CommcareTranslationChecker import validate_workbook
+import importlib
+
+# Module of each public name. Modules are only imported once one of their names is used, so that the checker can
+# be run with python -m CommcareTranslationChecker.CommcareTranslationChecker without being imported twice.
+_EXPORTS = {
+    'WorkbookResult': '.CommcareTranslationChecker',
+    'check_workbook': '.CommcareTranslationChecker',
+    'validate_workbook': '.CommcareTranslationChecker',
+    'validate_workbooks': '.CommcareTranslationChecker',
+    'CheckOptions': '.asynchronous',
+    'validate_workbook_async': '.asynchronous',
+    'Mismatch': '.results',
+    'MismatchRecord': '.results',
+    'MismatchStore': '.results',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
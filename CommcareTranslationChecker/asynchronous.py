@@ -0,0 +1,140 @@
+"""
+Asyncio API: check workbooks from an event loop without blocking it.
+
+    from CommcareTranslationChecker import CheckOptions, validate_workbook_async
+
+    semaphore = asyncio.Semaphore(4)
+    wbOut, messages = await validate_workbook_async(upload, CheckOptions(ignoreOrder=True), semaphore=semaphore)
+
+The workbook is read and checked in an executor: the default thread pool of the event loop, or the given
+concurrent.futures executor. A ProcessPoolExecutor keeps checks from competing with the event loop for the GIL.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import io
+import threading
+
+from .CommcareTranslationChecker import (DEFAULT_MEMO_SIZE, NON_LINGUISTIC_CHARACTERS, check_workbook,
+                                         getArgumentParser)
+
+_CHECK_OPTION_DEFAULTS = collections.OrderedDict([
+    ("columns", None),
+    ("baseColumn", None),
+    ("ignoreOrder", False),
+    ("verbose", False),
+    ("outputMismatchTypesFlag", False),
+    ("skipFormatCheckFlag", False),
+    ("formatCheckCharacters", NON_LINGUISTIC_CHARACTERS),
+    ("formatCheckCharactersAdd", None),
+    ("configurationSheet", "Modules_and_forms"),
+    ("configurationSheetColumnName", "sheet_name"),
+    ("stream", False),
+    ("memoSize", DEFAULT_MEMO_SIZE),
+    ("dedupPairsFlag", False),
+    ("sparseOutputFlag", False),
+    ("reader", "openpyxl"),
+    ("maxMismatches", None),
+    ("skipRules", None),
+])
+
+
+class CheckOptions(collections.namedtuple('CheckOptions', list(_CHECK_OPTION_DEFAULTS),
+                                          defaults=list(_CHECK_OPTION_DEFAULTS.values()))):
+    """
+    Options of a check, named after the destinations of the command line options, see parseArguments.
+    Output files are not saved: the output workbook is returned.
+
+    columns (list or str): Names of the columns to check, or a comma-separated string of them. Defaults to every
+    column starting with 'default_'.
+    baseColumn (str): Column the others are compared against. Defaults to the first checked column.
+    ignoreOrder (bool): Whether the order of output value tags is ignored
+    verbose (bool): Whether the rows with issues are printed
+    outputMismatchTypesFlag (bool): Whether mismatch_* columns are added to the output workbook
+    skipFormatCheckFlag (bool): Whether the format and output value checks are skipped
+    formatCheckCharacters (str): Characters counted by the format check
+    formatCheckCharactersAdd (str): Characters added to formatCheckCharacters
+    configurationSheet (str): Title of the sheet listing the expected sheets
+    configurationSheetColumnName (str): Column of the configuration sheet with the expected sheet names
+    stream (bool): Whether the workbook is read and the output written one row at a time
+    memoSize (int): Number of comparisons kept, see --memo-size
+    dedupPairsFlag (bool): Whether every unique pair of values is compared once, see --dedup-pairs
+    sparseOutputFlag (bool): Whether the output workbook only has the flagged rows, see --sparse-output
+    reader (str): One of READERS
+    maxMismatches (int): If set, checking stops once the workbook has more than this number of mismatched rows and
+    missing sheets, and no output workbook is built, see --max-mismatches
+    skipRules (list or str): Names of the rules not to run, or a comma-separated string of them, see --skip-rules
+    """
+    __slots__ = ()
+
+    def toArgs(self, fileName=None):
+        """
+        Output:
+        argparse.Namespace of the options, as parsed from the command line, for a single process check of fileName
+        """
+        args = getArgumentParser().parse_args([fileName or "upload.xlsx"])
+        args.file = fileName
+        for name, value in self._asdict().items():
+            if name in ("columns", "skipRules") and isinstance(value, (list, tuple)):
+                value = ",".join(value)
+            setattr(args, name, value)
+        return args
+
+
+def _validateInExecutor(source, args):
+    """
+    Check a workbook in an executor thread or process
+
+    Output:
+    Tuple of the output workbook and a list of summary messages, see validate_workbook
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    result = check_workbook(source, args)
+    return result.wbOut, result.messages
+
+
+async def validate_workbook_async(file_obj, options=None, semaphore=None, executor=None, fileName=None):
+    """
+    Check every worksheet of a Bulk Translation file in an executor, without blocking the event loop.
+
+    Input:
+    file_obj (str, bytes or file): Path to, content or file object of the workbook. File objects are read in the
+    executor first when it is a ProcessPoolExecutor.
+    options (CheckOptions [opt]): Options of the check. Defaults to CheckOptions().
+    semaphore (asyncio.Semaphore [opt]): If passed, the check waits for it, so that at most as many workbooks as
+    its value are checked at a time by the callers sharing it
+    executor (concurrent.futures.Executor [opt]): Executor the workbook is read and checked in. Defaults to the
+    default executor of the event loop.
+    fileName (str [opt]): Name of the workbook, used in messages. Defaults to file_obj when it is a path.
+
+    Output:
+    Tuple of the output workbook and a list of summary messages, see validate_workbook
+
+    Cancelling the task stops a check waiting for the semaphore or the executor. A check already running in a
+    thread stops before its next row; a check already running in another process runs to the end, and its result
+    is discarded.
+    """
+    args = (options or CheckOptions()).toArgs(fileName or (file_obj if isinstance(file_obj, str) else None))
+    if semaphore is None:
+        return await _runInExecutor(file_obj, args, executor)
+    async with semaphore:
+        return await _runInExecutor(file_obj, args, executor)
+
+
+async def _runInExecutor(file_obj, args, executor):
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        # Events and file objects cannot be sent to another process
+        if not isinstance(file_obj, (str, bytes)):
+            file_obj = await loop.run_in_executor(None, file_obj.read)
+        return await loop.run_in_executor(executor, _validateInExecutor, file_obj, args)
+    args.cancelEvent = threading.Event()
+    try:
+        return await loop.run_in_executor(executor, functools.partial(_validateInExecutor, file_obj, args))
+    except asyncio.CancelledError:
+        args.cancelEvent.set()
+        raise
@@ -1,2 +1,9 @@
 class FatalError(Exception):
     pass
+
+
+class CheckCancelled(Exception):
+    """
+    Raised when a check is stopped because its cancelEvent was set, see validate_workbook_async
+    """
+    pass
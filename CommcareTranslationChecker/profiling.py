@@ -0,0 +1,153 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import collections
+import json
+import time
+
+# Checks timed by Profile.checkFunctions, with the functions of the checker module each of them covers.
+# Inline tags are counted in a single scan of the text and block tags from its lines classified by block_structure,
+# so they are timed together.
+CHECK_FUNCTIONS = collections.OrderedDict([
+    ("output_values", ("tokenize_output_values", "convertValueToOutputValueList")),
+    ("character_counts", ("normalizeQuotes", "getNonLinguisticCharacterCount")),
+    ("format_tags", ("format_tag_counts", "block_structure", "get_invalid_format_tags_from_counts")),
+    ("block_tag_fixes", ("fix_block_structure", "fixed_format_tag_counts")),
+    ("output_value_fixes", ("fix_output_values",)),
+    ("signatures", ("cell_signature",)),
+])
+PHASES = ("load", "read", "check", "copy", "save")
+REPORT_VERSION = 3
+
+
+class CheckFunctions(object):
+    """
+    The functions of CHECK_FUNCTIONS, as called by the checker. A run calls them through the CheckFunctions of its
+    rules.RuleSet, so that it can time them for its own Profile without replacing the functions of the checker
+    module, see Profile.checkFunctions.
+
+    Input:
+    namespace (dict): Namespace of the functions, the globals of the checker module
+    timeCheck (function [opt]): Called with the name of a check and each of its functions, returns the function to
+    call instead
+    """
+
+    def __init__(self, namespace, timeCheck=None):
+        for check, functionNames in CHECK_FUNCTIONS.items():
+            for functionName in functionNames:
+                function = namespace[functionName]
+                setattr(self, functionName, timeCheck(check, function) if timeCheck is not None else function)
+
+
+class Profile(object):
+    """
+    Wall time spent in each phase of a run, in each worksheet, in each check and in each rule, see
+    validate_workbook. A Profile records a single run.
+    Nothing is timed unless a Profile is passed, so runs without one are unaffected.
+
+    Phases:
+    load: Loading the input workbook
+    read: Reading the rows of the worksheets, and waiting for worker processes when checking in several processes
+    check: Comparing the rows and building the output rows
+    copy: Writing the output rows to the output workbook
+    save: Saving the output workbook
+    """
+
+    def __init__(self):
+        self.phases = collections.OrderedDict((name, 0.0) for name in PHASES)
+        self.sheets = []
+        self.checks = collections.OrderedDict((name, [0, 0.0]) for name in CHECK_FUNCTIONS)
+        # Filled by rules.RuleSet.startTiming, in the order the rules are run
+        self.rules = collections.OrderedDict()
+        # Cells compared and cells skipped by the signature prefilter, see rules.RuleSet.getPrefilterStats
+        self.prefilter = [0, 0]
+        self.start = time.perf_counter()
+        self.end = None
+
+    def addTime(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def timed(self, phase, function):
+        """
+        Output:
+        Function calling function, adding the wall time of each call to phase
+        """
+        def timedFunction(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.addTime(phase, time.perf_counter() - start)
+        return timedFunction
+
+    def addPrefilterStats(self, stats):
+        self.prefilter[0] += stats[0]
+        self.prefilter[1] += stats[1]
+
+    def addSheet(self, title, seconds, rowCount, cellCount):
+        self.sheets.append(collections.OrderedDict([
+            ("title", title), ("seconds", seconds), ("rows", rowCount), ("cells", cellCount)]))
+
+    def checkFunctions(self, namespace):
+        """
+        Input:
+        namespace (dict): Namespace of the functions of CHECK_FUNCTIONS, the globals of the checker module
+
+        Output:
+        CheckFunctions adding the number of calls and the time spent in each check to this profile. Functions of a
+        check called by another function of the same check are covered by the time of the outer call.
+        """
+        def timeCheck(check, function):
+            counters = self.checks[check]
+
+            def timedCheck(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    counters[1] += time.perf_counter() - start
+                    counters[0] += 1
+            return timedCheck
+
+        return CheckFunctions(namespace, timeCheck)
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    def toDict(self):
+        """
+        Output:
+        The profile as a dictionary, see toJson
+        """
+        end = self.end if self.end is not None else time.perf_counter()
+        return collections.OrderedDict([
+            ("version", REPORT_VERSION),
+            ("seconds", end - self.start),
+            ("rows", sum(sheet["rows"] for sheet in self.sheets)),
+            ("cells", sum(sheet["cells"] for sheet in self.sheets)),
+            ("phases", self.phases),
+            ("sheets", self.sheets),
+            ("checks", collections.OrderedDict(
+                (name, collections.OrderedDict([("calls", calls), ("seconds", seconds)]))
+                for name, (calls, seconds) in self.checks.items())),
+            ("rules", collections.OrderedDict(
+                (name, collections.OrderedDict([("calls", calls), ("seconds", seconds)]))
+                for name, (calls, seconds) in self.rules.items())),
+            ("prefilter", collections.OrderedDict([("compared", self.prefilter[0]),
+                                                   ("skipped", self.prefilter[1])])),
+        ])
+
+    def toJson(self):
+        """
+        Output:
+        JSON report of the profile, with every time in seconds:
+        {"version": 3, "seconds": total, "rows": rows checked, "cells": cells checked,
+         "phases": {"load": ..., "read": ..., "check": ..., "copy": ..., "save": ...},
+         "sheets": [{"title": ..., "seconds": ..., "rows": ..., "cells": ...}, ...],
+         "checks": {"output_values": {"calls": ..., "seconds": ...}, ...},
+         "rules": {"output_values": {"calls": ..., "seconds": ...}, ...},
+         "prefilter": {"compared": cells compared rather than found in a memo, "skipped": cells of those skipped by
+                       their signatures}}
+        A check covers the calls the checker makes to its functions through the CheckFunctions of the run, a rule
+        the calls of its Rule.check.
+        """
+        return json.dumps(self.toDict(), indent=2)
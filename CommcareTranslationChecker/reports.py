@@ -0,0 +1,105 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import csv
+import json
+
+REPORT_FORMATS = ("jsonl", "csv")
+REPORT_FIELDS = ("file", "sheet", "row", "column", "mismatch_types", "fix")
+
+
+class ReportWriter(object):
+    """
+    Writes a record per mismatched cell to a text file as the rows are checked, see --report-format.
+
+    Input:
+    fileObj (file): Text file the records are written to
+    file (str [opt]): Workbook the records belong to. Set it before checking each workbook.
+    """
+
+    def __init__(self, fileObj, file=None):
+        self.fileObj = fileObj
+        self.file = file
+        self.recordCount = 0
+
+    def writeMismatch(self, sheet, row, column, mismatchTypes, fix):
+        """
+        Input:
+        sheet (str): Title of the worksheet
+        row (int): 1-based row number
+        column (str): Name of the mismatched column
+        mismatchTypes (list): Mismatch types of the cell, as results.Mismatch or messages
+        fix (str): Proposed fixed text of the cell, None if no fix could be applied
+        """
+        self.recordCount += 1
+        self.writeRecord((self.file, sheet, row, column, [str(mismatch) for mismatch in mismatchTypes], fix))
+
+    def writeRecords(self, records):
+        """
+        Write the records kept by a ReportRecordList, as records of this writer's file
+        """
+        for record in records:
+            self.recordCount += 1
+            self.writeRecord((self.file,) + tuple(record[1:]))
+
+    def writeRecord(self, record):
+        raise NotImplementedError
+
+    def flush(self):
+        self.fileObj.flush()
+
+
+class JsonLinesReportWriter(ReportWriter):
+    """
+    Writes each record as a JSON object on its own line
+    """
+
+    def writeRecord(self, record):
+        self.fileObj.write(json.dumps(dict(zip(REPORT_FIELDS, record)), sort_keys=True) + "\n")
+
+
+class CsvReportWriter(ReportWriter):
+    """
+    Writes each record as a CSV row after a header row, with the mismatch types joined by commas as in the
+    mismatch_ columns of the output file
+    """
+
+    def __init__(self, fileObj, file=None):
+        super(CsvReportWriter, self).__init__(fileObj, file)
+        self.writer = csv.writer(fileObj)
+        self.writer.writerow(REPORT_FIELDS)
+
+    def writeRecord(self, record):
+        self.writer.writerow(record[:4] + (",".join(record[4]), record[5]))
+
+
+class ReportRecordList(ReportWriter):
+    """
+    Keeps the records in a list rather than writing them, so that records made in a worker process can be written
+    in order by the main process with ReportWriter.writeRecords
+    """
+
+    def __init__(self):
+        super(ReportRecordList, self).__init__(None)
+        self.records = []
+
+    def writeRecord(self, record):
+        self.records.append(record)
+
+    def flush(self):
+        pass
+
+
+def createReportWriter(reportFormat, fileObj, file=None):
+    """
+    Input:
+    reportFormat (str): One of REPORT_FORMATS
+    fileObj (file): Text file the records are written to. CSV files should be opened with newline=""
+
+    Output:
+    ReportWriter for the format
+    """
+    if reportFormat == "jsonl":
+        return JsonLinesReportWriter(fileObj, file)
+    if reportFormat == "csv":
+        return CsvReportWriter(fileObj, file)
+    raise ValueError("Unknown report format %s, expected one of %s" % (reportFormat, ", ".join(REPORT_FORMATS)))
@@ -0,0 +1,217 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import array
+import collections
+
+from .exceptions import FatalError
+from .spill import SpillList
+
+# Kinds of mismatch of a cell, see Mismatch
+ILL_FORMATTED_TAGS = 1
+MISSING_VALUES = 2
+EXTRA_VALUES = 3
+OUT_OF_ORDER = 4
+FORMAT_CHARACTER_COUNTS = 5
+
+MISMATCH_KIND_NAMES = {
+    ILL_FORMATTED_TAGS: "Ill-Formatted Tags",
+    MISSING_VALUES: "Missing Values",
+    EXTRA_VALUES: "Extra Values",
+    OUT_OF_ORDER: "Out of Order",
+    FORMAT_CHARACTER_COUNTS: "Text Formatting Mismatch",
+}
+
+# Kinds of mismatch styled with LESSER_MISMATCH_FILL_STYLE rather than MISMATCH_FILL_STYLE
+LESSER_MISMATCH_KINDS = set((FORMAT_CHARACTER_COUNTS,))
+
+
+def addMismatchKind(name, lesser=False):
+    """
+    Add a kind of mismatch, for the mismatches found by custom rules, see rules.Rule. Mismatches of a cell are listed
+    in the order of their kinds, so added kinds come after the built-in ones.
+
+    Input:
+    name (str): Name of the kind, starting its messages
+    lesser (bool [opt]): If True, cells with only mismatches of this kind are styled with LESSER_MISMATCH_FILL_STYLE
+
+    Output:
+    Code of the kind
+    """
+    kind = max(MISMATCH_KIND_NAMES) + 1
+    if kind > 255:
+        raise FatalError("At most 255 kinds of mismatch can be added")
+    MISMATCH_KIND_NAMES[kind] = name
+    if lesser:
+        LESSER_MISMATCH_KINDS.add(kind)
+    return kind
+
+
+def formatMismatch(kind, details):
+    """
+    Input:
+    kind (int): Kind of mismatch, one of MISMATCH_KIND_NAMES
+    details (tuple): Details of the mismatch, see Mismatch
+
+    Output:
+    Message describing the mismatch, as written to the mismatch_ columns and reports
+    """
+    name = MISMATCH_KIND_NAMES[kind]
+    if kind == FORMAT_CHARACTER_COUNTS:
+        return "%s - %s" % (name, ",".join("%s : %s" % (character, str(diff) if diff < 0 else "+" + str(diff))
+                                            for character, diff in details))
+    if not details:
+        return name
+    return "%s - %s" % (name, ",".join(details))
+
+
+class Mismatch(collections.namedtuple('Mismatch', ['kind', 'details'])):
+    """
+    Mismatch of a cell against the base cell of its row. Its message is only built when it is converted to a string.
+
+    kind (int): Kind of mismatch, one of MISMATCH_KIND_NAMES
+    details (tuple): Output values for ILL_FORMATTED_TAGS, MISSING_VALUES and EXTRA_VALUES, tuples of a character
+    and the difference of its count from the base cell for FORMAT_CHARACTER_COUNTS, and nothing for OUT_OF_ORDER.
+    Details of added kinds are strings, joined by commas in the message.
+    """
+    __slots__ = ()
+
+    @property
+    def isLesser(self):
+        return self.kind in LESSER_MISMATCH_KINDS
+
+    def __str__(self):
+        return formatMismatch(self.kind, self.details)
+
+
+class MismatchRecord(collections.namedtuple('MismatchRecord', ['sheet', 'row', 'column', 'kind', 'details'])):
+    """
+    Mismatch of a cell of a workbook, see MismatchStore
+
+    sheet (str): Title of the worksheet
+    row (int): 1-based row number
+    column (str): Name of the mismatched column
+    kind, details: see Mismatch
+    """
+    __slots__ = ()
+
+    @property
+    def message(self):
+        return formatMismatch(self.kind, self.details)
+
+
+class MismatchStore(object):
+    """
+    Mismatches of the cells of a workbook, kept as parallel arrays of worksheet, row, column and kind codes, with a
+    reference to the details of each mismatch. Details shared by several cells are kept once. Iterating the store
+    yields a MismatchRecord per mismatch, in the order they were added.
+
+    Input:
+    budget (spill.MemoryBudget [opt]): If passed, mismatches are kept as records in a spill.SpillList within the
+    budget instead, and spilled to a temporary file beyond it. A store sent to another process is sent as arrays.
+    """
+
+    def __init__(self, budget=None):
+        self.sheetTitles = []
+        self.columnNames = []
+        self.sheets = array.array('H')
+        self.rows = array.array('L')
+        self.columns = array.array('H')
+        self.kinds = array.array('B')
+        self.details = []
+        self.internedDetails = {}
+        # (sheet index, row number, column index, kind, details) of each mismatch, when kept within a budget
+        self.records = SpillList(budget) if budget is not None else None
+
+    def __len__(self):
+        if self.records is not None:
+            return len(self.records)
+        return len(self.kinds)
+
+    def addSheet(self, title, columnNames):
+        """
+        Input:
+        title (str): Title of the worksheet
+        columnNames (dict): Names of the compared columns of the worksheet, by column index
+
+        Output:
+        Index of the worksheet in the store, passed to addRow
+        """
+        self.sheetTitles.append(title)
+        self.columnNames.append(columnNames)
+        return len(self.sheetTitles) - 1
+
+    def addRow(self, sheetIdx, rowNumber, mismatchDict):
+        """
+        Add the mismatches of a row
+
+        Input:
+        sheetIdx (int): Index of the worksheet, see addSheet
+        rowNumber (int): 1-based row number
+        mismatchDict (dict): Mismatched cells of the row, see checkRowForMismatch
+        """
+        for colIdx, (curOutputValueList, mismatchTypes) in mismatchDict.items():
+            for kind, details in mismatchTypes:
+                self.addCodes(sheetIdx, rowNumber, colIdx, kind, details)
+
+    def addCodes(self, sheetIdx, rowNumber, colIdx, kind, details):
+        """
+        Add a mismatch of the column colIdx of a row, see addRow
+        """
+        if self.records is not None:
+            self.records.append((sheetIdx, rowNumber, colIdx, kind, details))
+            return
+        self.sheets.append(sheetIdx)
+        self.rows.append(rowNumber)
+        self.columns.append(colIdx)
+        self.kinds.append(kind)
+        self.details.append(self.internedDetails.setdefault(details, details))
+
+    def extend(self, other):
+        """
+        Add the mismatches of another store, such as one filled in a worker process, after those of this store
+        """
+        sheetOffset = len(self.sheetTitles)
+        self.sheetTitles.extend(other.sheetTitles)
+        self.columnNames.extend(other.columnNames)
+        if self.records is not None or other.records is not None:
+            for sheetIdx, rowNumber, colIdx, kind, details in other._iterCodes():
+                self.addCodes(sheetIdx + sheetOffset, rowNumber, colIdx, kind, details)
+            return
+        self.sheets.extend(sheetIdx + sheetOffset for sheetIdx in other.sheets)
+        self.rows.extend(other.rows)
+        self.columns.extend(other.columns)
+        self.kinds.extend(other.kinds)
+        self.details.extend(self.internedDetails.setdefault(details, details) for details in other.details)
+
+    def _iterCodes(self):
+        """
+        Output:
+        Iterator of the (sheet index, row number, column index, kind, details) of each mismatch
+        """
+        if self.records is not None:
+            return iter(self.records)
+        return zip(self.sheets, self.rows, self.columns, self.kinds, self.details)
+
+    def __iter__(self):
+        for sheetIdx, rowNumber, colIdx, kind, details in self._iterCodes():
+            yield MismatchRecord(self.sheetTitles[sheetIdx], rowNumber, self.columnNames[sheetIdx][colIdx], kind,
+                                 details)
+
+    def countByKind(self):
+        """
+        Output:
+        Dictionary mapping each kind of mismatch found to its number of mismatches
+        """
+        if self.records is not None:
+            return dict(collections.Counter(codes[3] for codes in self.records))
+        return dict(collections.Counter(self.kinds))
+
+    def __getstate__(self):
+        # The interned details are rebuilt by extend, so that stores sent from worker processes stay small
+        if self.records is not None:
+            store = MismatchStore()
+            store.extend(self)
+            return store.__getstate__()
+        state = dict(self.__dict__)
+        state['internedDetails'] = {}
+        return state
@@ -0,0 +1,325 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import collections
+import time
+
+from .exceptions import FatalError
+from .results import (EXTRA_VALUES, FORMAT_CHARACTER_COUNTS, ILL_FORMATTED_TAGS, MISSING_VALUES, OUT_OF_ORDER,
+                      Mismatch)
+
+# Registered rules by name, in registration order, see registerRule
+RULES = collections.OrderedDict()
+
+# Rules skipped by --skip-format-check
+FORMAT_CHECK_RULES = ("character_counts", "format_tags")
+
+
+class Rule(object):
+    """
+    A check of a cell against the base cell of its row, run by a RuleSet on every comparison that is not found in
+    the memo. Subclasses set name and cost, and implement check.
+
+    name (str): Name the rule is enabled or disabled by, see --skip-rules
+    cost (int): Relative cost of the rule. Rules are run from the cheapest to the most expensive.
+    refinesMismatch (bool): If True, the rule does not decide whether the cell mismatches: it is only run once an
+    earlier rule found that the cell differs from the base cell, to describe or fix the mismatch
+    coveredBySignature (bool): If True, the rule never finds that a cell differs from a base cell with the same
+    signature, see utils.cell_signature, so that such cells need not be analysed. Signatures are only used when every
+    rule deciding whether cells mismatch is covered by them.
+    """
+    name = None
+    cost = 0
+    refinesMismatch = False
+    coveredBySignature = False
+
+    def check(self, comparison):
+        """
+        Add the mismatches found to comparison.mismatchTypes as results.Mismatch, and set comparison.differs if the
+        cell differs from the base cell.
+
+        Input:
+        comparison (CellComparison): Comparison of the cell against the base cell
+        """
+        raise NotImplementedError
+
+
+class CellComparison(object):
+    """
+    State of the comparison of a cell against the base cell of its row, passed from rule to rule.
+
+    base (CellAnalysis): Analysis of the base cell
+    cur (CellAnalysis): Analysis of the compared cell
+    ignoreOrder (bool): Whether the order of output values is ignored
+    rules (RuleSet): Rules run on the comparison
+    analysisOptions (tuple): Options the cells were analysed with, for analysing other values the same way
+    mismatchTypes (list): results.Mismatch found so far
+    differs (bool): Whether a rule found that the cell differs from the base cell
+    extraValueList (list): Output values of the cell missing from the base cell, removed by the fix
+    outOfOrder (bool): Whether the output values of the cell are out of order, swapped by the fix of two values
+    fixAnalysis (CellAnalysis): Analysis of the cell with its block tags fixed, None if they were not fixed
+    fixFormatMismatch (bool): Whether the text with fixed block tags still has text formatting mismatches
+    """
+    __slots__ = ('base', 'cur', 'ignoreOrder', 'rules', 'analysisOptions', 'mismatchTypes', 'differs',
+                 'extraValueList', 'outOfOrder', 'fixAnalysis', 'fixFormatMismatch')
+
+    def __init__(self, base, cur, ignoreOrder, rules, analysisOptions):
+        self.base = base
+        self.cur = cur
+        self.ignoreOrder = ignoreOrder
+        self.rules = rules
+        self.analysisOptions = analysisOptions
+        self.mismatchTypes = []
+        self.differs = False
+        self.extraValueList = []
+        self.outOfOrder = False
+        self.fixAnalysis = None
+        self.fixFormatMismatch = False
+
+
+def registerRule(rule):
+    """
+    Register a rule, so that it is run by the RuleSets made afterwards unless skipped. Rules are sent to worker
+    processes with the options of a run, so their classes must be importable there.
+
+    Input:
+    rule (Rule): Rule to register, with a name no other registered rule has
+
+    Output:
+    rule
+    """
+    if rule.name in RULES:
+        raise FatalError("A rule named %s is already registered" % (rule.name,))
+    RULES[rule.name] = rule
+    return rule
+
+
+class RuleSet(object):
+    """
+    Registered rules run on every compared cell: rules deciding whether the cell mismatches come first, followed by
+    the rules refining mismatches, each from the cheapest to the most expensive, see Rule.
+
+    Input:
+    skipRules (iterable [opt]): Names of registered rules not to run
+    skipFormatCheckFlag (bool [opt]): If True, the rules of FORMAT_CHECK_RULES are not run either
+    prefilter (bool [opt]): If False, cells are always analysed, even when their signatures prove they do not
+    mismatch, see Rule.coveredBySignature
+    """
+
+    def __init__(self, skipRules=(), skipFormatCheckFlag=False, prefilter=True):
+        skipRules = set(skipRules or ())
+        unknownRules = skipRules - set(RULES)
+        if unknownRules:
+            raise FatalError("Unknown rule%s %s, the rules are %s" % ("" if len(unknownRules) == 1 else "s",
+                                                                      ",".join(sorted(unknownRules)),
+                                                                      ",".join(RULES)))
+        if skipFormatCheckFlag:
+            skipRules.update(FORMAT_CHECK_RULES)
+        # sorted is stable, so rules of the same cost run in registration order
+        self.rules = sorted((rule for rule in RULES.values() if rule.name not in skipRules),
+                            key=lambda rule: (rule.refinesMismatch, rule.cost))
+        self.names = tuple(rule.name for rule in self.rules)
+        self.prefilter = prefilter and all(rule.coveredBySignature for rule in self.rules
+                                           if not rule.refinesMismatch)
+        # Numbers of cells compared rather than found in a memo, and of those proven not to mismatch by their signatures
+        self.prefilterCounts = [0, 0]
+        self.timings = None
+        # Functions of the checks, when they are timed, see startTiming
+        self.checks = None
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getstate__(self):
+        # Rules and checks are only timed in the process that started timing them, and cells counted in each process
+        # are added to the rules of the main process, see addPrefilterStats
+        state = dict(self.__dict__)
+        state['timings'] = None
+        state['checks'] = None
+        state['prefilterCounts'] = [0, 0]
+        return state
+
+    def getPrefilterStats(self):
+        """
+        Output:
+        Tuple of the numbers of cells compared rather than found in a memo, and of those proven not to mismatch by their signatures
+        """
+        return tuple(self.prefilterCounts)
+
+    def addPrefilterStats(self, stats):
+        """
+        Add the cells counted by the rules of another process, as returned by getPrefilterStats
+        """
+        self.prefilterCounts[0] += stats[0]
+        self.prefilterCounts[1] += stats[1]
+
+    def getPrefilterSummary(self):
+        """
+        Output:
+        Message reporting the share of compared cells proven not to mismatch without being analysed
+        """
+        compared, skipped = self.prefilterCounts
+        return "Signature prefilter: %s of %s compared cell%s skipped (%.1f%% skip rate)" % (
+            skipped, compared, "" if compared == 1 else "s", 100.0 * skipped / compared if compared else 0.0)
+
+    def startTiming(self, timings, checks=None):
+        """
+        Add the number of calls and the time spent in each rule to timings from now on
+
+        Input:
+        timings (collections.OrderedDict): Dictionary mapping rule names to a list of their number of calls and
+        seconds, updated in place
+        checks (profiling.CheckFunctions [opt]): Functions of the checks timing their calls, called by the cells
+        compared with these rules from now on, see profiling.Profile.checkFunctions
+        """
+        for name in self.names:
+            timings.setdefault(name, [0, 0.0])
+        self.timings = timings
+        self.checks = checks
+
+    def run(self, comparison):
+        """
+        Run the rules on comparison
+
+        Input:
+        comparison (CellComparison): Comparison of a cell against its base cell
+        """
+        if self.timings is not None:
+            return self._runTimed(comparison)
+        for rule in self.rules:
+            if rule.refinesMismatch and not comparison.differs:
+                break
+            rule.check(comparison)
+
+    def _runTimed(self, comparison):
+        for rule in self.rules:
+            if rule.refinesMismatch and not comparison.differs:
+                break
+            start = time.perf_counter()
+            try:
+                rule.check(comparison)
+            finally:
+                counters = self.timings[rule.name]
+                counters[1] += time.perf_counter() - start
+                counters[0] += 1
+
+
+class OutputValuesRule(Rule):
+    """
+    Output values of the base cell missing from the cell, output values of the cell missing from the base cell, and
+    output values out of order (unless ignoring their order). The cell differs if its output values differ.
+    """
+    name = "output_values"
+    cost = 1
+    coveredBySignature = True
+
+    def check(self, comparison):
+        baseOutputValueList = comparison.base.outputValueList
+        curOutputValueList = comparison.cur.outputValueList
+        if baseOutputValueList == curOutputValueList:
+            return
+        comparison.differs = True
+        mismatchTypes = comparison.mismatchTypes
+
+        # Determine whether any values missing from current list
+        missingValueList = []
+        for value in baseOutputValueList:
+            if value not in curOutputValueList:
+                missingValueList.append(value)
+        if missingValueList:
+            mismatchTypes.append(Mismatch(MISSING_VALUES, tuple(missingValueList)))
+
+        # Determine whether extra values have been added in current list
+        extraValueList = []
+        for value in curOutputValueList:
+            if value not in baseOutputValueList:
+                extraValueList.append(value)
+        if extraValueList:
+            mismatchTypes.append(Mismatch(EXTRA_VALUES, tuple(extraValueList)))
+        comparison.extraValueList = extraValueList
+
+        # Determine if, after considering missing/extra values, there are sort issues
+        if not comparison.ignoreOrder and len(baseOutputValueList) != 0:
+            baseListIndex = 0
+            for value in curOutputValueList:
+                if value not in extraValueList:
+                    while (len(baseOutputValueList) > baseListIndex and
+                                   baseOutputValueList[baseListIndex] in missingValueList):
+                        baseListIndex += 1
+                    if (len(baseOutputValueList) > baseListIndex and
+                                value != baseOutputValueList[baseListIndex]):
+                        mismatchTypes.append(Mismatch(OUT_OF_ORDER, ()))
+                        comparison.outOfOrder = True
+                        break
+                    baseListIndex += 1
+
+
+class CharacterCountsRule(Rule):
+    """
+    Non-linguistic characters whose counts differ from those of the base cell. The cell differs if any count does.
+    """
+    name = "character_counts"
+    cost = 2
+    coveredBySignature = True
+
+    def check(self, comparison):
+        baseFormatDict = comparison.base.formatDict
+        curFormatDict = comparison.cur.formatDict
+        if baseFormatDict == curFormatDict:
+            return
+        comparison.differs = True
+        formatDiffList = []
+        for key in baseFormatDict.keys():
+            keyDiff = curFormatDict[key] - baseFormatDict[key]
+            if keyDiff != 0:
+                formatDiffList.append((key, keyDiff))
+        comparison.mismatchTypes.append(Mismatch(FORMAT_CHARACTER_COUNTS, tuple(formatDiffList)))
+
+
+class IllFormattedTagsRule(Rule):
+    """
+    Output values of a differing cell that look ill-formatted, see convertValueToOutputValueList
+    """
+    name = "ill_formatted_tags"
+    cost = 1
+    refinesMismatch = True
+
+    def check(self, comparison):
+        illFormattedValueList = []
+        for value in comparison.cur.outputValueList:
+            if value.startswith("ILL-FORMATTED TAG : "):
+                illFormattedValueList.append(value[20:])
+        if illFormattedValueList:
+            comparison.mismatchTypes.append(Mismatch(ILL_FORMATTED_TAGS, tuple(illFormattedValueList)))
+
+
+class FormatTagsRule(Rule):
+    """
+    Inline (bold, italic, bold italic and strikethrough) and block (headings and lists) markdown tags of a differing
+    cell whose counts differ from those of the base cell, counted in a single scan of each value. Lines whose block
+    tags differ are fixed to the block tags of the base cell; tag count differences are reported through the style
+    of the fixed text rather than as mismatches of their own. The lines of each value are classified once, and only
+    the fixed lines are scanned again, see CellAnalysis.fixBlockTags.
+    """
+    name = "format_tags"
+    cost = 3
+    refinesMismatch = True
+
+    def check(self, comparison):
+        baseAnalysis = comparison.base
+        curAnalysis = comparison.cur
+        invalid_inline_format_tags, invalid_block_format_tags = baseAnalysis.getInvalidFormatTags(curAnalysis)
+
+        # Fix block tag mismatches, and calculate mismatches, non linguistic character count on fixed text
+        if invalid_block_format_tags:
+            fixAnalysis = curAnalysis.fixBlockTags(baseAnalysis, comparison.analysisOptions)
+            if fixAnalysis is not None:
+                fix_invalid_inline_format_tags, fix_invalid_block_format_tags = \
+                    baseAnalysis.getInvalidFormatTags(fixAnalysis)
+                comparison.fixAnalysis = fixAnalysis
+                comparison.fixFormatMismatch = bool(
+                    fix_invalid_block_format_tags or fix_invalid_inline_format_tags or
+                    ("character_counts" in comparison.rules and fixAnalysis.formatDict != baseAnalysis.formatDict))
+
+
+for builtinRule in (OutputValuesRule(), CharacterCountsRule(), IllFormattedTagsRule(), FormatTagsRule()):
+    registerRule(builtinRule)
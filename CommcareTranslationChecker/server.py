@@ -0,0 +1,305 @@
+"""
+Local validation service: checks workbooks uploaded over HTTP in a pool of warm worker processes.
+
+$ CommcareTranslationChecker serve --port 8765 --workers 4
+
+POST /validate with the xlsx file as the request body checks it. Options are passed as query parameters named after
+the command line options, for example /validate?ignore-order&columns=default_en,default_fr, see QUERY_OPTIONS.
+Pass output to also get the output file, base64-encoded. The response is JSON:
+{"file": ..., "status": "OK" | "ISSUES", "messages": [...], "mismatched_rows": {"<sheet>": count, ...},
+ "missing_sheets": [...], "rows": ..., "seconds": ..., "output_xlsx": base64 or null}
+
+GET /metrics returns the number of requests, of requests in flight and queued, and latency percentiles.
+GET /health returns {"status": "ok"}.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import openpyxl as xl
+
+from .CommcareTranslationChecker import (check_workbook, discardWriteOnlyWorkbook, getArgumentParser,
+                                         getWorkbookStatus)
+from .exceptions import FatalError
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_MAX_UPLOAD_MB = 50
+# Number of latencies kept for the percentiles of /metrics
+LATENCY_WINDOW = 1000
+# Command line options that can be passed as query parameters. Files, reports, profiles, processes and memory are
+# managed by the service rather than by its clients.
+QUERY_OPTIONS = ("columns", "base-column", "ignore-order", "configuration-sheet", "configuration-sheet-column",
+                 "output-mismatch-types", "skip-format-check", "skip-rules", "no-prefilter", "format-check-characters",
+                 "format-check-characters-add", "stream", "memo-size", "dedup-pairs", "sparse-output", "output-engine",
+                 "reader", "max-mismatches", "fail-fast")
+
+
+def getOptions(fileName, query):
+    """
+    Input:
+    fileName (str): Name of the uploaded file
+    query (list): (name, value) pairs of the query string, named after the command line options of QUERY_OPTIONS
+    without "--", and output to get the output file
+
+    Output:
+    argparse.Namespace of the options, see parseArguments. Raises ValueError for options the service does not
+    support.
+    """
+    argv = [fileName]
+    for name, value in query:
+        if name == "output":
+            continue
+        if name not in QUERY_OPTIONS:
+            raise ValueError("Unsupported option: %s" % (name,))
+        argv.append("--" + name)
+        if value:
+            argv.append(value)
+    parser = getArgumentParser()
+    try:
+        with contextlib.redirect_stderr(io.StringIO()):
+            args = parser.parse_args(argv)
+    except SystemExit:
+        raise ValueError("Invalid options: %s" % (" ".join(argv[1:]),))
+    if args.outputEngine == "patch" and any(name == "output" for name, _ in query):
+        raise ValueError("The patch output engine only patches saved files, so output cannot be returned with it")
+    # Uploads are checked in a single worker process, and never saved
+    args.file = fileName
+    args.jobs = 1
+    args.createOutputFileFlag = False
+    args.reportFormat = None
+    return args
+
+
+def _warmWorker():
+    """
+    Check a small workbook once in each worker process, so that the first upload it checks does not pay for
+    imports, compiled expressions and caches
+    """
+    wb = xl.Workbook()
+    wb.active.append(["label", "default_en", "default_fr"])
+    wb.active.append(["label", '**Name** <output value="/data/name"/>', '**Nom** <output value="/data/name"/>'])
+    source = io.BytesIO()
+    wb.save(source)
+    source.seek(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        check_workbook(source, getOptions("warm.xlsx", []))
+
+
+def _validateUpload(data, args, outputFlag):
+    """
+    Check an uploaded workbook in a worker process
+
+    Output:
+    Result of the upload as a dictionary, see the module documentation
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = check_workbook(io.BytesIO(data), args)
+    output = None
+    if outputFlag and result.wbOut is not None:
+        outputFile = io.BytesIO()
+        result.wbOut.save(outputFile)
+        output = base64.b64encode(outputFile.getvalue()).decode("ascii")
+    discardWriteOnlyWorkbook(result.wbOut)
+    return collections.OrderedDict([
+        ("file", args.file),
+        ("status", getWorkbookStatus(result)),
+        ("messages", result.messages),
+        ("mismatched_rows", result.wsMismatchDict),
+        ("missing_sheets", result.missingSheets or []),
+        ("rows", result.rowCount),
+        ("seconds", time.perf_counter() - start),
+        ("output_xlsx", output),
+    ])
+
+
+class ValidationService(object):
+    """
+    Checks uploads in a pool of warm worker processes. At most workers uploads are checked at a time, and at most
+    maxQueue more wait for a worker; further uploads are rejected.
+
+    Input:
+    workers (int): Number of worker processes. 0 uses one process per CPU.
+    maxQueue (int): Number of uploads that can wait for a worker
+    """
+
+    def __init__(self, workers=1, maxQueue=DEFAULT_MAX_QUEUE):
+        self.workers = workers or os.cpu_count() or 1
+        self.maxQueue = maxQueue
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_warmWorker)
+        # Start and warm every worker up front rather than on the first uploads
+        for future in [self.executor.submit(time.sleep, 0) for _ in range(self.workers)]:
+            future.result()
+        self.lock = threading.Lock()
+        self.admitted = 0
+        self.counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def validate(self, data, args, outputFlag=False):
+        """
+        Output:
+        Tuple of the HTTP status and the JSON-serializable body of the response
+        """
+        with self.lock:
+            if self.admitted >= self.workers + self.maxQueue:
+                self.counts[503] += 1
+                return 503, {"error": "Too many uploads are being checked, try again later"}
+            self.admitted += 1
+        start = time.perf_counter()
+        try:
+            try:
+                body = self.executor.submit(_validateUpload, data, args, outputFlag).result()
+                status = 200
+            except (xl.utils.exceptions.InvalidFileException, zipfile.BadZipFile, FatalError, OSError) as e:
+                body = {"error": str(e)}
+                status = 422
+            except Exception as e:
+                body = {"error": "The upload could not be checked. %s" % (str(e),)}
+                status = 500
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.counts[status] += 1
+                self.latencies.append(latency)
+            body["latency_seconds"] = latency
+            return status, body
+        finally:
+            with self.lock:
+                self.admitted -= 1
+
+    def getMetrics(self):
+        """
+        Output:
+        Dictionary of the numbers of requests by status, of uploads in flight and queued, and latency percentiles
+        in seconds over the last LATENCY_WINDOW uploads
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            admitted = self.admitted
+            counts = dict((str(status), count) for status, count in self.counts.items())
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return collections.OrderedDict([
+            ("workers", self.workers),
+            ("max_queue", self.maxQueue),
+            ("in_flight", min(admitted, self.workers)),
+            ("queued", max(0, admitted - self.workers)),
+            ("requests", counts),
+            ("latency_seconds", collections.OrderedDict([
+                ("count", len(latencies)), ("p50", percentile(0.5)), ("p90", percentile(0.9)),
+                ("p99", percentile(0.99)), ("max", latencies[-1] if latencies else None)])),
+        ])
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class ValidationRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of the validation service, see the module documentation
+    """
+    server_version = "CommcareTranslationChecker"
+
+    def sendJson(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self.sendJson(200, {"status": "ok"})
+        elif path == "/metrics":
+            self.sendJson(200, self.server.service.getMetrics())
+        else:
+            self.sendJson(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/validate":
+            self.sendJson(404, {"error": "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self.sendJson(400, {"error": "The request body must be an xlsx file"})
+            return
+        if length > self.server.maxUploadBytes:
+            self.sendJson(413, {"error": "Uploads are limited to %s bytes" % (self.server.maxUploadBytes,)})
+            return
+        data = self.rfile.read(length)
+        query = parse_qsl(url.query, keep_blank_values=True)
+        try:
+            args = getOptions(self.headers.get("X-File-Name") or "upload.xlsx", query)
+        except ValueError as e:
+            self.sendJson(400, {"error": str(e)})
+            return
+        self.sendJson(*self.server.service.validate(data, args, any(name == "output" for name, _ in query)))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def createServer(host="127.0.0.1", port=DEFAULT_PORT, workers=1, maxQueue=DEFAULT_MAX_QUEUE,
+                 maxUploadMb=DEFAULT_MAX_UPLOAD_MB, verbose=False):
+    """
+    Output:
+    ThreadingHTTPServer of the validation service, listening on host and port. Port 0 picks a free port, see
+    server_address. Call serve_forever() to handle requests, and shutdown() then server_close() and
+    service.close() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), ValidationRequestHandler)
+    server.daemon_threads = True
+    server.service = ValidationService(workers, maxQueue)
+    server.maxUploadBytes = int(maxUploadMb * 1024 * 1024)
+    server.verbose = verbose
+    return server
+
+
+def mainServe(argv):
+    parser = argparse.ArgumentParser(prog="CommcareTranslationChecker serve",
+                                     description="Check workbooks uploaded over HTTP, see " + __name__)
+    parser.add_argument("--host", help="Address to listen on. Defaults to 127.0.0.1.", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="Port to listen on. Defaults to %s." % (DEFAULT_PORT,))
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of worker processes, and of uploads checked at a time. 0 (the default) uses "
+                             "one process per CPU.")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE, dest="maxQueue",
+                        help="Number of uploads that can wait for a worker before uploads are rejected with 503. "
+                             "Defaults to %s." % (DEFAULT_MAX_QUEUE,))
+    parser.add_argument("--max-upload-mb", type=float, default=DEFAULT_MAX_UPLOAD_MB, dest="maxUploadMb",
+                        help="Largest upload accepted, in MB. Defaults to %s." % (DEFAULT_MAX_UPLOAD_MB,))
+    parser.add_argument("-v", "--verbose", action="store_true", default=False, help="Log every request")
+    args = parser.parse_args(argv)
+
+    server = createServer(args.host, args.port, args.workers, args.maxQueue, args.maxUploadMb, args.verbose)
+    print("Checking uploads on http://%s:%s/validate with %s workers" % (
+        server.server_address[0], server.server_address[1], server.service.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+    return 0
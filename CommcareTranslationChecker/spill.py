@@ -0,0 +1,197 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import pickle
+import sys
+import tempfile
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak RSS is not reported
+    resource = None
+
+MB = 1024 * 1024
+# One record in this many appended to a SpillList has its size measured, see SpillList.append
+SIZE_SAMPLE_INTERVAL = 16
+
+
+def getRecordSize(record):
+    """
+    Output:
+    Approximate number of bytes of memory a record holds: the sizes of the record, of its items and of the items of
+    its list and tuple items. Objects shared with other records, such as style names, are counted in each.
+    """
+    size = sys.getsizeof(record)
+    for item in record:
+        size += sys.getsizeof(item)
+        if type(item) is list or type(item) is tuple:
+            size += sum(map(sys.getsizeof, item))
+    return size
+
+
+def getPeakRss():
+    """
+    Output:
+    Tuple of the peak resident set size in bytes of this process and of the largest of its finished child
+    processes, or None if it cannot be measured on this platform
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == "darwin" else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit)
+
+
+class MemoryBudget(object):
+    """
+    Number of bytes of results the SpillLists of a run keep in memory, as estimated by SpillList.append. Once it is exceeded, the
+    SpillList keeping the most bytes writes them to a temporary file, until the budget is met again.
+
+    Input:
+    limitBytes (int): Bytes of results kept in memory
+    """
+
+    def __init__(self, limitBytes):
+        self.limitBytes = limitBytes
+        self.usedBytes = 0
+        self.spilledBytes = 0
+        self.spillLists = []
+
+    def add(self, byteCount):
+        self.usedBytes += byteCount
+        while self.usedBytes > self.limitBytes:
+            largest = max(self.spillLists, key=lambda spillList: spillList.bufferedBytes)
+            if largest.bufferedBytes == 0:
+                break
+            largest.spill()
+
+    def getSummary(self):
+        """
+        Output:
+        Message with the bytes of results spilled to disk and the peak RSS of the run, which the budget does not
+        bound
+        """
+        summary = "Memory budget of %.1f MB for output rows and mismatches: %.1f MB spilled to disk" % (
+            self.limitBytes / MB, self.spilledBytes / MB)
+        peakRss = getPeakRss()
+        if peakRss is None:
+            return summary
+        if peakRss[1]:
+            return "%s. Peak RSS, including memory outside the budget: %.1f MB (worker processes %.1f MB)" % (
+                summary, peakRss[0] / MB, peakRss[1] / MB)
+        return "%s. Peak RSS, including memory outside the budget: %.1f MB" % (summary, peakRss[0] / MB)
+
+
+class SpillList(object):
+    """
+    List of picklable records, kept in memory as they are within a MemoryBudget, and pickled to a temporary file
+    beyond it. Records are iterated in the order they were appended, whether they were spilled or not. Records
+    must not be changed once appended.
+
+    Input:
+    budget (MemoryBudget): Budget shared by the SpillLists of the run
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.buffer = []
+        self.bufferedBytes = 0
+        self.spillFile = None
+        self.spilledCount = 0
+        # Records measured with getRecordSize, and their bytes
+        self.sampledCount = 0
+        self.sampledBytes = 0
+        budget.spillLists.append(self)
+
+    def __len__(self):
+        return self.spilledCount + len(self.buffer)
+
+    def append(self, record):
+        # Measuring every record would cost more than pickling it, so records are counted for the mean size of the
+        # records measured so far
+        if len(self) % SIZE_SAMPLE_INTERVAL == 0:
+            self.sampledCount += 1
+            self.sampledBytes += getRecordSize(record)
+        size = self.sampledBytes // self.sampledCount
+        self.buffer.append(record)
+        self.bufferedBytes += size
+        self.budget.add(size)
+
+    def spill(self):
+        """
+        Write the records kept in memory to the temporary file
+        """
+        if self.spillFile is None:
+            self.spillFile = tempfile.TemporaryFile(prefix="CommcareTranslationChecker.")
+        self.spillFile.seek(0, 2)
+        data = b"".join([pickle.dumps(record, pickle.HIGHEST_PROTOCOL) for record in self.buffer])
+        self.spillFile.write(data)
+        self.spilledCount += len(self.buffer)
+        self.budget.usedBytes -= self.bufferedBytes
+        self.budget.spilledBytes += len(data)
+        self.buffer = []
+        self.bufferedBytes = 0
+
+    def __iter__(self):
+        if self.spillFile is not None:
+            self.spillFile.seek(0)
+            for _ in range(self.spilledCount):
+                yield pickle.load(self.spillFile)
+        for record in list(self.buffer):
+            yield record
+
+    def close(self):
+        """
+        Drop the records, and remove the temporary file
+        """
+        if self.spillFile is not None:
+            self.spillFile.close()
+            self.spillFile = None
+        self.budget.usedBytes -= self.bufferedBytes
+        self.budget.spillLists.remove(self)
+        self.buffer = []
+        self.bufferedBytes = 0
+        self.spilledCount = 0
+
+
+class SpooledWorksheet(object):
+    """
+    Output rows of a worksheet kept in a SpillList until the output workbook is written, see SpooledWorkbook
+    """
+
+    def __init__(self, title, budget):
+        self.title = title
+        self.header = None
+        self.rows = SpillList(budget)
+
+    def append(self, rowNumber, outValues, outStyles, copiedColumnCount):
+        # The header is kept apart, as it is written last unless streaming
+        if rowNumber == 1:
+            self.header = (rowNumber, outValues, outStyles, copiedColumnCount)
+        else:
+            self.rows.append((rowNumber, outValues, outStyles, copiedColumnCount))
+
+
+class SpooledWorkbook(object):
+    """
+    Stands in for an output workbook whose rows are kept within a MemoryBudget: worksheets are created with
+    create_sheet and their rows written with spoolOutputRow, in order apart from the header row. Rows are only
+    written to a workbook once every row is known, see writeSpooledWorkbook.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.worksheets = []
+
+    def create_sheet(self, title):
+        ws = SpooledWorksheet(title, self.budget)
+        self.worksheets.append(ws)
+        return ws
+
+
+def spoolOutputRow(wsOut, rowNumber, outValues, outStyles, copiedColumnCount, alignment=None):
+    """
+    Same as writeOutputRow, for a SpooledWorksheet
+    """
+    wsOut.append(rowNumber, outValues, outStyles, copiedColumnCount)
@@ -1,4 +1,6 @@
 import re
+from collections import namedtuple
+from functools import lru_cache
 
 INLINE_FORMATTING_TAGS = [
     r'(\*\*[\S]+)',  # opening format tag for bold
@@ -21,12 +23,45 @@ BLOCK_FORMATTING_TAGS = [
     r'(^[0-9]+. [\S]+)' # Format tag for ordered lists
 ]
 
+# Markers of INLINE_FORMATTING_TAGS, in the same order. A tag occurs at most once per whitespace-separated token,
+# opening tags when the marker is followed by a character of the token, closing tags when it is preceded by one
+INLINE_FORMATTING_MARKERS = ['**', '**', '*', '*', '***', '***', '~~', '~~']
+# Matches every whitespace-separated token that contains an inline formatting marker
+INLINE_FORMATTING_TOKEN_REGEX = re.compile(r'\S*[*~]\S*')
+# Matches a line starting with any of BLOCK_FORMATTING_TAGS. Group 1 holds the heading level,
+# group 2 is set for unordered lists, neither is set for ordered lists
+BLOCK_FORMATTING_LINE_REGEX = re.compile(r'(?:(#{1,6})|(\*)|[0-9]+.) \S')
+DIGIT_REGEX = re.compile('[0-9]')
+MULTIPLE_SPACES_REGEX = re.compile(' +')
+
+OUTPUT_VALUE_OPEN_TAG = '<output value="'
+OUTPUT_VALUE_CLOSE_TAG = '"/>'
+
+# Bits of signature_mask, each set when a text contains what a tag of its kind starts with
+SIGNATURE_OUTPUT_VALUES = 1
+SIGNATURE_INLINE_TAGS = 2
+SIGNATURE_BLOCK_TAGS = 4
+
+# Kinds of line of a BlockStructure: the index of the tag of BLOCK_FORMATTING_TAGS the line starts with plus one,
+# that is the heading level for headings, or BLOCK_PLAIN for lines without a block tag
+BLOCK_PLAIN = 0
+BLOCK_UNORDERED_LIST = 7
+BLOCK_ORDERED_LIST = 8
+
+# An <output value.../> tag found by tokenize_output_values. start and end delimit the whole tag in the text.
+# Ill-formatted tags either contain another opening tag or are not closed, in which case they run until the
+# end of the text
+OutputValueToken = namedtuple('OutputValueToken', ['value', 'start', 'end', 'ill_formatted', 'closed'])
+
 
 def regex_match_count(expr, text):
     """
     Check for regular expression match in every line of the text
     and return the count of matches
     """
+    if expr in BLOCK_FORMATTING_TAGS:
+        # The lines starting with a block tag are known once the lines are classified
+        return block_structure(text).counts()[BLOCK_FORMATTING_TAGS.index(expr)]
     count = 0
     text_lines = text.splitlines()
     for line in text_lines:
@@ -35,6 +70,142 @@ def regex_match_count(expr, text):
     return count
 
 
+def signature_mask(text):
+    """
+    Cheap signature of the tags a text may contain, found with a few scans of the text that stop at the first match.
+    A text whose mask lacks a bit has no tag of that kind, while a bit set only means that the text has to be
+    analysed to find out.
+
+    :return: int, combination of SIGNATURE_OUTPUT_VALUES, SIGNATURE_INLINE_TAGS and SIGNATURE_BLOCK_TAGS
+    """
+    mask = 0
+    if not text:
+        return mask
+    if OUTPUT_VALUE_OPEN_TAG in text:
+        mask |= SIGNATURE_OUTPUT_VALUES
+    hasStar = '*' in text
+    if hasStar or '~' in text:
+        mask |= SIGNATURE_INLINE_TAGS
+    # Block tags are headings, unordered lists starting with '*' and ordered lists starting with a digit
+    if hasStar or '#' in text or DIGIT_REGEX.search(text):
+        mask |= SIGNATURE_BLOCK_TAGS
+    return mask
+
+
+def inline_tag_counts(text):
+    """
+    Count the occurrences of every tag in INLINE_FORMATTING_TAGS in a single pass over the text, each count being
+    equal to len(re.findall(tag, text)). Tags never span lines, so the counts of a text are the sums of the counts
+    of its lines.
+
+    :return: list of counts, in the order of INLINE_FORMATTING_TAGS
+    """
+    counts = [0] * len(INLINE_FORMATTING_TAGS)
+    # Texts without any tag, most of them, are not scanned any further
+    if not signature_mask(text) & SIGNATURE_INLINE_TAGS:
+        return counts
+    for match in INLINE_FORMATTING_TOKEN_REGEX.finditer(text):
+        token = match.group()
+        opening, closing = token[:-1], token[1:]
+        for index, marker in enumerate(INLINE_FORMATTING_MARKERS):
+            if marker in (closing if index % 2 else opening):
+                counts[index] += 1
+    return counts
+
+
+def format_tag_counts(text, structure=None):
+    """
+    Count the occurrences of every tag in INLINE_FORMATTING_TAGS and BLOCK_FORMATTING_TAGS in a single pass
+    over the text. Each inline count equals len(re.findall(tag, text)) and each block count equals
+    regex_match_count(tag, text).
+
+    Input:
+    text(str): The text to scan
+    structure(BlockStructure [opt]): block_structure(text), if already computed
+
+    :return: tuple of counts, in the order of INLINE_FORMATTING_TAGS followed by BLOCK_FORMATTING_TAGS
+    """
+    if not text:
+        return (0,) * (len(INLINE_FORMATTING_TAGS) + len(BLOCK_FORMATTING_TAGS))
+    if structure is None:
+        structure = block_structure(text)
+    return tuple(inline_tag_counts(text) + structure.counts())
+
+
+def classify_block_line(line, match=None):
+    """
+    Input:
+    line(str): The line to classify
+    match(re.Match [opt]): BLOCK_FORMATTING_LINE_REGEX.match(line), if already matched
+
+    :return: tuple of the kind of the line, see BlockStructure, and the block tag it starts with up to and
+    including the first space (None for BLOCK_PLAIN)
+    """
+    if match is None:
+        match = BLOCK_FORMATTING_LINE_REGEX.match(line)
+    if match is None:
+        return BLOCK_PLAIN, None
+    if match.group(1):
+        kind = len(match.group(1))
+    elif match.group(2):
+        kind = BLOCK_UNORDERED_LIST
+    else:
+        kind = BLOCK_ORDERED_LIST
+    return kind, line[:line.index(' ') + 1]
+
+
+class BlockStructure(object):
+    """
+    Lines of a text, each classified once by the block formatting tag it starts with, so that the block tags of
+    the text are counted, compared and fixed without matching its lines again, see block_structure and
+    fix_block_structure.
+
+    lines (list): Lines of the text, as returned by splitlines
+    kinds (bytearray): Kind of each line: a heading level from 1 to 6, BLOCK_UNORDERED_LIST, BLOCK_ORDERED_LIST or
+    BLOCK_PLAIN
+    prefixes (list): Block tag of each line up to and including the first space, None for plain lines
+    """
+    __slots__ = ('lines', 'kinds', 'prefixes')
+
+    def __init__(self, lines, kinds, prefixes):
+        self.lines = lines
+        self.kinds = kinds
+        self.prefixes = prefixes
+
+    def counts(self):
+        """
+        :return: list of the number of lines starting with each of BLOCK_FORMATTING_TAGS, in the same order
+        """
+        if self.kinds.count(BLOCK_PLAIN) == len(self.kinds):
+            return [0] * len(BLOCK_FORMATTING_TAGS)
+        return [self.kinds.count(kind) for kind in range(1, len(BLOCK_FORMATTING_TAGS) + 1)]
+
+
+def block_structure(text):
+    """
+    Split text into lines and classify each of them by the block tag it starts with. The lines of texts without
+    any character a block tag starts with are not matched at all.
+
+    :return: BlockStructure of text
+    """
+    lines = text.splitlines()
+    kinds = bytearray(len(lines))
+    prefixes = [None] * len(lines)
+    if signature_mask(text) & SIGNATURE_BLOCK_TAGS:
+        matchLine = BLOCK_FORMATTING_LINE_REGEX.match
+        for index, line in enumerate(lines):
+            match = matchLine(line)
+            if match:
+                kinds[index], prefixes[index] = classify_block_line(line, match)
+    return BlockStructure(lines, kinds, prefixes)
+
+
+SINGLE_QUOTES_ORD_VALUES = [700, 1370, 8216, 8217, 8219, 10075, 10076, 65287]
+DOUBLE_QUOTES_ORD_VALUES = [750, 8220, 8221, 8223, 10077, 10078, 65282]
+QUOTES_TRANSLATION_TABLE = dict([(ordValue, "'") for ordValue in SINGLE_QUOTES_ORD_VALUES] +
+                                [(ordValue, '"') for ordValue in DOUBLE_QUOTES_ORD_VALUES])
+
+
 def normalizeQuotes(text):
     """
     Unicode contains multiple forms of quotes. This method replaces every single quote
@@ -42,20 +213,83 @@ def normalizeQuotes(text):
     Converts ‘, ’, ‛, ❛, ❜ to '
     Converts “, ”, ‟, ❝, ❞, ＂ to "
     """
-    single_quotes_ord_values = [700, 1370, 8216, 8217, 8219, 10075, 10076, 65287]
-    double_quotes_ord_values = [750, 8220, 8221, 8223, 10077, 10078, 65282]
-
-    normalized_str = []
     if not text:
         return ""
-    for char in text:
-        if ord(char) in single_quotes_ord_values:
-            normalized_str.append(chr(39))
-        elif ord(char) in double_quotes_ord_values:
-            normalized_str.append(chr(34))
-        else:
-            normalized_str.append(char)
-    return ''.join(normalized_str)
+    return str.translate(text, QUOTES_TRANSLATION_TABLE)
+
+
+class CharacterCounter(object):
+    """
+    Counts the occurrences of each of a fixed sequence of characters in a single pass over a text,
+    however many characters are tracked
+    """
+    __slots__ = ('characters', '_zeroCounts', '_isTracked', '_unsignedRegex', '_signatureQuotesTable')
+
+    def __init__(self, characters):
+        self.characters = characters
+        self._zeroCounts = dict.fromkeys(characters, 0)
+        self._isTracked = frozenset(characters).__contains__
+        # Signatures keep the tracked characters and the quotes normalized to one of them, see signature
+        self._signatureQuotesTable = dict((ordValue, quote if self._isTracked(quote) else None)
+                                          for ordValue, quote in QUOTES_TRANSLATION_TABLE.items())
+        self._unsignedRegex = re.compile('[^%s]+' % re.escape(characters + "".join(
+            chr(ordValue) for ordValue in QUOTES_TRANSLATION_TABLE)))
+
+    def count(self, text):
+        """
+        :return: dictionary mapping every tracked character, in order, to its count in text
+        """
+        counts = self._zeroCounts.copy()
+        for char in filter(self._isTracked, text):
+            counts[char] += 1
+        return counts
+
+    def signature(self, text):
+        """
+        :return: the tracked characters of normalizeQuotes(text), sorted, so that two texts have the same signature
+        exactly when count gives the same counts for both once their quotes are normalized. Quotes are only
+        normalized once the other characters are dropped, which is much faster on long texts.
+        """
+        return "".join(sorted(str.translate(self._unsignedRegex.sub("", text), self._signatureQuotesTable)))
+
+
+@lru_cache(maxsize=None)
+def get_character_counter(characterList, additionalCharactersToCatch=None):
+    """
+    Return the CharacterCounter for characterList extended with the characters of additionalCharactersToCatch
+    that it doesn't contain. Counters are built once and reused for the same arguments.
+    """
+    if additionalCharactersToCatch:
+        characterList += "".join([x for x in additionalCharactersToCatch if x not in characterList])
+    return CharacterCounter(characterList)
+
+
+def cell_signature(value, counter=None):
+    """
+    Cheap signature of a cell value, without its output values or format tags being analysed. Two values with the
+    same signature have no output values, and the same counts of the characters tracked by counter.
+
+    Input:
+    value(str): Cell value
+    counter(CharacterCounter [opt]): Counter of the compared characters, None if character counts are not compared
+
+    :return: str, None if the value has output values or is not text, in which case it has to be analysed
+    """
+    if value is None:
+        value = ""
+    elif not isinstance(value, str) or OUTPUT_VALUE_OPEN_TAG in value:
+        return None
+    if counter is None:
+        return ""
+    return counter.signature(value)
+
+
+def block_tag_prefixes(lines):
+    """
+    For each line, return the block formatting tag the line starts with, up to and including the first space,
+    or None if the line doesn't start with one of BLOCK_FORMATTING_TAGS
+    """
+    return [classify_block_line(line)[1] for line in lines]
 
 
 def fix_block_tags_mismatch(baseText, outputText):
@@ -72,53 +306,57 @@ def fix_block_tags_mismatch(baseText, outputText):
 
     :return: None or Fixed output text
     """
-    baseTextLines = baseText.splitlines()
-    outputTextLines = outputText.splitlines()
+    return fix_block_tag_lines(block_structure(baseText).prefixes, outputText.splitlines())
+
+
+def fix_block_tag_lines(baseTagPrefixes, outputTextLines):
+    """
+    Same as fix_block_tags_mismatch, for a base text whose lines have already been run through block_tag_prefixes
+
+    Input:
+    baseTagPrefixes(list): block tag prefixes of each line of the base column text
+    outputTextLines(list): lines of the comparing column text
+
+    :return: None or Fixed output text
+    """
+    fixedLines = _fix_block_tag_lines(baseTagPrefixes, outputTextLines)
+    if fixedLines is None:
+        return None
+    return '\n'.join(fixedLines[0])
+
+
+def _fix_block_tag_lines(baseTagPrefixes, outputTextLines):
+    """
+    :return: None or tuple of the fixed lines and of the indexes of the lines changed by the fix
+    """
     fixed_output_text = []
+    fixedLineIndexes = []
 
     # If line count in base text and output text doesn't match,
     # then we cannot compare base text and output text line by line
     # so we return None which implies we are unable to fix
     # A Warning will still be displayed to the user for this cell
-    if len(baseTextLines) != len(outputTextLines):
+    if len(baseTagPrefixes) != len(outputTextLines):
         return None
 
     try:
         # Compare each line of baseText with outputText,
         # if mismatch occurs, fix it
-        for index in range(len(baseTextLines)):
-            baseTextLine = baseTextLines[index]
-            outputTextLine = outputTextLines[index]
-            regex_match_found = False
-
-            for tag in BLOCK_FORMATTING_TAGS:
-                base_tag_char_list = []
-                # Find a match for a block tag, if match found in baseText line,
-                # for each character in the block tag in baseTextLine, compare with characters in
-                # outputTextLine, if all characters in block tag are matched, then we add the line to output
-                # otherwise remove the text till mismatch position and prepend with block tag
-                if len(re.findall(tag, baseTextLine)) > 0:
-                    regex_match_found = True
-
-                    for char in baseTextLine:
-                        base_tag_char_list.append(char)
-                        if char == ' ':
-                            break
-
-                    for position in range(len(base_tag_char_list)):
-                        if outputTextLine[position] != base_tag_char_list[position]:
-                            break
-
-                    if position == len(base_tag_char_list):
-                        fixed_output_text.append(outputTextLine)
-                        break
-                    else:
-                        fixed_output_text.append(re.sub(' +', ' ', ''.join(base_tag_char_list) + outputTextLine[position:]))
-                        break
-
-            if regex_match_found is False:
+        for base_tag_prefix, outputTextLine in zip(baseTagPrefixes, outputTextLines):
+            if base_tag_prefix is None:
                 fixed_output_text.append(outputTextLine)
-        return '\n'.join(fixed_output_text)
+                continue
+
+            # For each character in the block tag of the base text line, compare with characters in
+            # outputTextLine, remove the text till mismatch position and prepend with block tag
+            for position in range(len(base_tag_prefix)):
+                if outputTextLine[position] != base_tag_prefix[position]:
+                    break
+            fixedLine = MULTIPLE_SPACES_REGEX.sub(' ', base_tag_prefix + outputTextLine[position:])
+            if fixedLine != outputTextLine:
+                fixedLineIndexes.append(len(fixed_output_text))
+            fixed_output_text.append(fixedLine)
+        return fixed_output_text, fixedLineIndexes
     except Exception as e:
         # If any exception occurs while trying to fix block tag mismatch, we return None
         # as we are unable to fix mismatches
@@ -126,6 +364,144 @@ def fix_block_tags_mismatch(baseText, outputText):
         return None
 
 
+# Output text with fixed block tags, see fix_block_structure. fixedLines are the indexes of the lines changed by the
+# fix, the only lines of structure classified again.
+BlockFix = namedtuple('BlockFix', ['text', 'structure', 'fixedLines'])
+
+
+def fix_block_structure(baseStructure, outputStructure):
+    """
+    Same as fix_block_tags_mismatch, for the block structures of the base and output texts. The structure of the
+    fixed text is that of the output text with its fixed lines classified again, rather than the fixed text being
+    split and matched line by line.
+
+    Input:
+    baseStructure(BlockStructure): block_structure of the base column text
+    outputStructure(BlockStructure): block_structure of the comparing column text
+
+    :return: None or BlockFix
+    """
+    fixed = _fix_block_tag_lines(baseStructure.prefixes, outputStructure.lines)
+    if fixed is None:
+        return None
+    lines, fixedLineIndexes = fixed
+    text = '\n'.join(lines)
+    kinds = bytearray(outputStructure.kinds)
+    prefixes = list(outputStructure.prefixes)
+    for index in fixedLineIndexes:
+        kinds[index], prefixes[index] = classify_block_line(lines[index])
+    # Fixed lines are never empty, but an empty last line is dropped by splitlines once the lines are joined
+    if lines and not lines[-1]:
+        lines = lines[:-1]
+        del kinds[-1]
+        del prefixes[-1]
+    return BlockFix(text, BlockStructure(lines, kinds, prefixes), fixedLineIndexes)
+
+
+def fixed_format_tag_counts(counts, structure, blockFix):
+    """
+    Same as format_tag_counts(blockFix.text), from the counts of the output text: only the fixed lines are scanned
+
+    Input:
+    counts(tuple): format_tag_counts of the comparing column text
+    structure(BlockStructure): block_structure of the comparing column text
+    blockFix(BlockFix): fix_block_structure of the comparing column text
+
+    :return: tuple of counts, in the order of INLINE_FORMATTING_TAGS followed by BLOCK_FORMATTING_TAGS
+    """
+    inlineCounts = list(counts[:len(INLINE_FORMATTING_TAGS)])
+    for index in blockFix.fixedLines:
+        for tagIdx, (countBefore, count) in enumerate(zip(inline_tag_counts(structure.lines[index]),
+                                                          inline_tag_counts(blockFix.structure.lines[index]))):
+            inlineCounts[tagIdx] += count - countBefore
+    return tuple(inlineCounts + blockFix.structure.counts())
+
+
+def tokenize_output_values(text):
+    """
+    Find every <output value.../> tag in text, in a single pass over the text.
+    Scanning resumes right after each opening tag, so a tag containing another opening tag is ill-formatted
+    and shares its closing tag with the tag it contains.
+
+    Input:
+    text(str): The text to tokenize
+
+    :return: list of OutputValueToken, in the order in which they appear in text
+    """
+    tokens = []
+    openLength = len(OUTPUT_VALUE_OPEN_TAG)
+    nextOpen = text.find(OUTPUT_VALUE_OPEN_TAG)
+    nextClose = None
+    while nextOpen != -1:
+        start = nextOpen
+        valueStart = start + openLength
+        nextOpen = text.find(OUTPUT_VALUE_OPEN_TAG, valueStart)
+        # The closing tag found for a previous tag is reused until it has been passed,
+        # so that no part of the text is searched twice
+        if nextClose is None or -1 < nextClose < valueStart:
+            nextClose = text.find(OUTPUT_VALUE_CLOSE_TAG, valueStart)
+        if nextClose != -1:
+            ill_formatted = nextOpen != -1 and nextOpen + openLength <= nextClose
+            tokens.append(OutputValueToken(text[valueStart:nextClose], start,
+                                           nextClose + len(OUTPUT_VALUE_CLOSE_TAG), ill_formatted, True))
+        else:
+            tokens.append(OutputValueToken(text[valueStart:], start, len(text), True, False))
+    return tokens
+
+
+def fix_output_values(text, tokens, extraValueList=(), swapValueList=None):
+    """
+    Remove output tags and swap output tags in a single pass over the text, using the spans of its tokens.
+    Equivalent to removeExtraOutputValues followed by swapOutputValues.
+
+    Input:
+    text(str): The text to fix
+    tokens(list): tokenize_output_values(text)
+    extraValueList(list): list of output tag values to be removed
+    swapValueList(list [opt]): two output values whose tags are to be swapped
+
+    :return: str: The fixed text
+    """
+    if not extraValueList and swapValueList is not None and len(tokens) == 2:
+        # The two tags of a cell swapped by the checker: slice them from their spans, as swapOutputValues did before
+        # tokens, without building the replacements
+        firstToken, secondToken = tokens
+        values = (firstToken.value, secondToken.value)
+        if not firstToken.ill_formatted and not secondToken.ill_formatted and len(swapValueList) == 2 and \
+                swapValueList[0] != swapValueList[1] and swapValueList[0] in values and swapValueList[1] in values:
+            return (text[:firstToken.start] + text[secondToken.start:secondToken.end] +
+                    text[firstToken.end:secondToken.start] + text[firstToken.start:firstToken.end] +
+                    text[secondToken.end:])
+    replacements = {}
+    if extraValueList:
+        extraValues = set(extraValueList)
+        for token in tokens:
+            if not token.ill_formatted and token.value in extraValues:
+                replacements[token.start] = (token, '')
+    if swapValueList is not None and len(swapValueList) == 2:
+        swapTokens = [next((token for token in tokens if token.value == value and not token.ill_formatted and
+                            token.start not in replacements), None)
+                      for value in swapValueList]
+        if None not in swapTokens:
+            firstToken, secondToken = swapTokens
+            replacements[firstToken.start] = (firstToken, text[secondToken.start:secondToken.end])
+            replacements[secondToken.start] = (secondToken, text[firstToken.start:firstToken.end])
+    if not replacements:
+        return text
+
+    pieces = []
+    position = 0
+    for start in sorted(replacements):
+        token, replacement = replacements[start]
+        if start < position:
+            continue
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = token.end
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+
 def removeExtraOutputValues(extraValueList, text):
     """
     Removes Output tags with values in extraValueList
@@ -135,11 +511,7 @@ def removeExtraOutputValues(extraValueList, text):
 
     :return: outputText(str): The text with extra output values removed
     """
-    outputText = text
-    for extraValue in extraValueList:
-        extraTagToRemove = f'<output value="{extraValue}"/>'
-        outputText = outputText.replace(extraTagToRemove, '')
-    return outputText
+    return fix_output_values(text, tokenize_output_values(text), extraValueList)
 
 
 def swapOutputValues(outputValueList, text):
@@ -153,12 +525,6 @@ def swapOutputValues(outputValueList, text):
                 otherwise return text which is passed as parameter
     """
     if len(outputValueList) == 2:
-        tag1 = f'<output value="{outputValueList[0]}"/>'
-        tag2 = f'<output value="{outputValueList[1]}"/>'
-        tag1Start = text.find(tag1)
-        tag1End = tag1Start + len(tag1)
-        tag2Start = text.find(tag2)
-        tag2End = tag2Start + len(tag2)
-        return text[:tag1Start] + tag2 + text[tag1End:tag2Start] + tag1 + text[tag2End:]
+        return fix_output_values(text, tokenize_output_values(text), swapValueList=outputValueList)
     else:
         return text
@@ -0,0 +1,483 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import copy
+import itertools
+import re
+import struct
+import xml.etree.ElementTree as ET
+import zipfile
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+from .exceptions import FatalError
+from .spill import SpillList
+from .xlsx_reader import DOCUMENT_RELATIONSHIPS_NS, OFFICE_DOCUMENT_TYPE, STYLES_TYPE, getRelationshipTargets
+
+# Columns the checker writes to, whose values are replaced in flagged rows. Other cells only have their style set.
+ANNOTATION_COLUMN_PREFIXES = ("mismatchFlag", "fix_", "mismatch_")
+
+ATTRIBUTE_RE = re.compile(r'([\w:]+)="([^"]*)"')
+CELL_REFERENCE_RE = re.compile(r'([A-Z]+)(\d+)$')
+
+# Flag of zip members whose sizes and CRC follow their data rather than being in their local header
+DATA_DESCRIPTOR_FLAG = 0x08
+COPY_CHUNK_SIZE = 1 << 20
+
+
+def parseAttributes(tag):
+    """
+    Input:
+    tag (str): Opening tag of an XML element
+
+    Output:
+    Dictionary of the attributes of the tag, with their values still escaped
+    """
+    return dict(ATTRIBUTE_RE.findall(tag[:tag.index(">") + 1]))
+
+
+def setAttribute(tag, name, value):
+    """
+    Output:
+    Opening tag with the attribute name set to value, replacing any previous value
+    """
+    tag = re.sub(r'\s%s="[^"]*"' % (re.escape(name),), "", tag, count=1)
+    end = len(tag) - 2 if tag.endswith("/>") else len(tag) - 1
+    return '%s %s="%s"%s' % (tag[:end], name, value, tag[end:])
+
+
+def elementPattern(prefix, name):
+    """
+    Output:
+    Regular expression matching an element of a SpreadsheetML part, either empty or with its content
+    """
+    name = re.escape(prefix + name)
+    return re.compile(r'<%s\b[^>]*?(?:/>|>.*?</%s>)' % (name, name), re.S)
+
+
+def getPrefix(xml, rootName):
+    """
+    Output:
+    Namespace prefix of the SpreadsheetML elements of a part ("x:" for <x:worksheet>), usually ""
+    """
+    match = re.search(r'<(\w+:)?%s\b' % (rootName,), xml)
+    if match is None:
+        raise FatalError("No %s element found" % (rootName,))
+    return match.group(1) or ""
+
+
+class WorksheetPatch(object):
+    """
+    Keeps the cells to change in a worksheet of the input file: the header, and the styles and annotation values
+    of the flagged rows. Called like writeOutputRow, without worksheet, for every output row. Rows that are not
+    flagged only need their mismatchFlag set to N, so they are not kept, see setRows.
+
+    Input:
+    title (str): Title of the worksheet
+    budget (spill.MemoryBudget [opt]): If passed, the flagged rows are kept in a SpillList within this budget
+    """
+
+    def __init__(self, title, budget=None):
+        self.title = title
+        self.header = None
+        self.copiedColumnCount = 0
+        self.rows = SpillList(budget) if budget is not None else []
+        self.rowCount = 0
+        self.mismatchFlagIdx = None
+
+    def __call__(self, rowNumber, outValues, outStyles, copiedColumnCount):
+        if rowNumber == 1:
+            # The header is written first with --stream, and last otherwise
+            self.header = list(outValues)
+            self.copiedColumnCount = copiedColumnCount
+        elif any(style is not None for style in outStyles):
+            self.rows.append((rowNumber, list(outValues), list(outStyles)))
+
+    def setRows(self, rowCount, mismatchFlagIdx):
+        """
+        Input:
+        rowCount (int): Number of rows of the worksheet after the header
+        mismatchFlagIdx (int): 0-based index of the mismatchFlag column, None if the worksheet has no compared
+        columns. Rows that are not flagged have N written to it.
+        """
+        self.rowCount = rowCount
+        self.mismatchFlagIdx = mismatchFlagIdx
+
+    def iterRowPatches(self):
+        """
+        Yield the row number and the cells to change of every row with cells to change, in order, each as a
+        dictionary of (value, style name) by 0-based column index. A value of None keeps the value of the cell.
+        """
+        header = self.header or []
+        headerPatches = dict((colIdx, (value, None)) for colIdx, value in enumerate(header)
+                             if colIdx >= self.copiedColumnCount and value is not None)
+        if headerPatches:
+            yield 1, headerPatches
+        annotationColumns = set(colIdx for colIdx, value in enumerate(header)
+                                if isinstance(value, str) and value.startswith(ANNOTATION_COLUMN_PREFIXES))
+        defaultPatches = {self.mismatchFlagIdx: ("N", None)} if self.mismatchFlagIdx is not None else None
+        nextRowNumber = 2
+        for rowNumber, outValues, outStyles in self.rows:
+            if defaultPatches is not None:
+                for defaultRowNumber in range(nextRowNumber, rowNumber):
+                    yield defaultRowNumber, defaultPatches
+            rowPatches = {}
+            for colIdx, value in enumerate(outValues):
+                if colIdx not in annotationColumns:
+                    value = None
+                if value is not None or outStyles[colIdx] is not None:
+                    rowPatches[colIdx] = (value, outStyles[colIdx])
+            yield rowNumber, rowPatches
+            nextRowNumber = rowNumber + 1
+        if defaultPatches is not None:
+            for defaultRowNumber in range(nextRowNumber, self.rowCount + 2):
+                yield defaultRowNumber, defaultPatches
+
+
+class StylesPatch(object):
+    """
+    Adds the named fill styles used by the checker to the styles.xml part of a workbook, and the cell formats of
+    cells filled with them. The formats keep the font, borders, number format and alignment of the cells.
+
+    Input:
+    xml (str): Content of styles.xml
+    fillColors (dict): ARGB fill color of each named style, by name
+    """
+
+    def __init__(self, xml, fillColors):
+        self.xml = xml
+        self.fillColors = fillColors
+        self.prefix = getPrefix(xml, "styleSheet")
+        self.namedStyleFormats = {}
+        self.cellFormats = {}
+        self.cellFormatList = None
+        for cellStyle in elementPattern(self.prefix, "cellStyle").findall(self.getSection("cellStyles") or ""):
+            attributes = parseAttributes(cellStyle)
+            if attributes.get("name") in fillColors:
+                self.namedStyleFormats[attributes["name"]] = int(attributes.get("xfId", 0))
+
+    def getSection(self, name):
+        match = elementPattern(self.prefix, name).search(self.xml)
+        return match.group(0) if match else None
+
+    def appendToSection(self, name, childName, elementXml, after=None, default=None):
+        """
+        Append an element to a section of styles.xml, creating the section after the section named after if it
+        does not exist, with default as its first element.
+
+        Output:
+        Index of the appended element in the section
+        """
+        section = self.getSection(name)
+        if section is None:
+            if after is None or self.getSection(after) is None:
+                raise FatalError("styles.xml has no %s, use the workbook output engine" % (name,))
+            section = "<%s%s/>" % (self.prefix, name)
+            afterSection = self.getSection(after)
+            self.xml = self.xml.replace(afterSection, afterSection + section, 1)
+            if default is not None:
+                self.appendToSection(name, childName, default)
+                section = self.getSection(name)
+        children = elementPattern(self.prefix, childName).findall(section)
+        openTag = section[:section.index(">") + 1]
+        newOpenTag = setAttribute(openTag.replace("/>", ">") if openTag.endswith("/>") else openTag,
+                                  "count", len(children) + 1)
+        if openTag.endswith("/>"):
+            newSection = "%s%s</%s%s>" % (newOpenTag, elementXml, self.prefix, name)
+        else:
+            closeTag = "</%s%s>" % (self.prefix, name)
+            newSection = newOpenTag + section[len(openTag):-len(closeTag)] + elementXml + closeTag
+        self.xml = self.xml.replace(section, newSection, 1)
+        return len(children)
+
+    def getNamedStyleFormat(self, styleName):
+        """
+        Output:
+        Index in cellStyleXfs of the format of the named style, which is added if the workbook does not have it
+        """
+        if styleName not in self.namedStyleFormats:
+            p = self.prefix
+            fillId = self.appendToSection(
+                "fills", "fill", '<%sfill><%spatternFill patternType="solid"><%sfgColor rgb="%s"/></%spatternFill>'
+                                 '</%sfill>' % (p, p, p, self.fillColors[styleName], p, p))
+            xfId = self.appendToSection(
+                "cellStyleXfs", "xf", '<%sxf numFmtId="0" fontId="0" fillId="%s" borderId="0" applyFill="1" '
+                                      'applyAlignment="1"><%salignment wrapText="1"/></%sxf>' % (p, fillId, p, p),
+                after="borders", default='<%sxf numFmtId="0" fontId="0" fillId="0" borderId="0"/>' % (p,))
+            self.appendToSection("cellStyles", "cellStyle",
+                                 '<%scellStyle name="%s" xfId="%s"/>' % (p, escape(styleName), xfId),
+                                 after="cellXfs", default='<%scellStyle name="Normal" xfId="0" builtinId="0"/>' % (p,))
+            self.namedStyleFormats[styleName] = xfId
+        return self.namedStyleFormats[styleName]
+
+    def getCellFormat(self, cellFormat, styleName):
+        """
+        Input:
+        cellFormat (int): Index in cellXfs of the current format of a cell
+        styleName (str): Named style to fill the cell with
+
+        Output:
+        Index in cellXfs of the format of the cell filled with the named style
+        """
+        key = (cellFormat, styleName)
+        if key not in self.cellFormats:
+            xfId = self.getNamedStyleFormat(styleName)
+            fillId = parseAttributes(elementPattern(self.prefix, "xf").findall(self.getSection("cellStyleXfs"))[xfId])
+            fillId = fillId.get("fillId", "0")
+            if self.cellFormatList is None:
+                self.cellFormatList = elementPattern(self.prefix, "xf").findall(self.getSection("cellXfs") or "")
+            if cellFormat < len(self.cellFormatList):
+                formatXml = self.cellFormatList[cellFormat]
+            else:
+                formatXml = '<%sxf numFmtId="0" fontId="0" fillId="0" borderId="0"/>' % (self.prefix,)
+            openTag = formatXml[:formatXml.index(">") + 1]
+            newOpenTag = setAttribute(setAttribute(setAttribute(openTag, "fillId", fillId), "xfId", xfId),
+                                      "applyFill", "1")
+            self.cellFormats[key] = self.appendToSection("cellXfs", "xf", newOpenTag + formatXml[len(openTag):])
+        return self.cellFormats[key]
+
+
+def formatCell(reference, value, cellFormat):
+    """
+    Output:
+    XML of a cell with value, as an inline string if it is text
+    """
+    style = ' s="%s"' % (cellFormat,) if cellFormat else ""
+    if value is None:
+        return '<c r="%s"%s/>' % (reference, style)
+    if isinstance(value, str):
+        return '<c r="%s"%s t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % (
+            reference, style, escape(value))
+    return '<c r="%s"%s><v>%s</v></c>' % (reference, style, value)
+
+
+def getLastColumnIdx(content, prefix):
+    """
+    Input:
+    content (str): XML of the cells of a row
+    prefix (str): Namespace prefix of the worksheet elements
+
+    Output:
+    0-based column index of the last cell of the row, -1 if it has no cells, None if it cannot be told without
+    parsing every cell
+    """
+    position = content.rfind("<%sc " % (prefix,))
+    if position == -1:
+        return -1 if not content.strip() else None
+    reference = parseAttributes(content[position:]).get("r")
+    if reference is None:
+        return None
+    return column_index_from_string(CELL_REFERENCE_RE.match(reference).group(1)) - 1
+
+
+def patchRow(rowXml, rowNumber, rowPatches, styles, prefix):
+    """
+    Input:
+    rowXml (str): XML of a row of a worksheet, None to create it
+    rowNumber (int): 1-based row number of the row
+    rowPatches (dict): Cells to change, see WorksheetPatch.iterRowPatches
+    styles (StylesPatch): Styles of the workbook
+    prefix (str): Namespace prefix of the worksheet elements
+
+    Output:
+    XML of the patched row
+    """
+    if rowXml is None:
+        rowXml = '<%srow r="%s"/>' % (prefix, rowNumber)
+    openTag = rowXml[:rowXml.index(">") + 1]
+    content = ""
+    if not openTag.endswith("/>"):
+        content = rowXml[len(openTag):-len("</%srow>" % (prefix,))]
+    lastColIdx = getLastColumnIdx(content, prefix)
+    cells = {}
+    if lastColIdx is not None and rowPatches and min(rowPatches) > lastColIdx:
+        # The cells to change are all after the last cell of the row, as the columns appended by the checker are,
+        # so the other cells are kept as they are without being parsed
+        keptContent = content
+    else:
+        keptContent = ""
+        colIdx = -1
+        for cellXml in elementPattern(prefix, "c").findall(content):
+            reference = parseAttributes(cellXml).get("r")
+            colIdx = column_index_from_string(CELL_REFERENCE_RE.match(reference).group(1)) - 1 if reference \
+                else colIdx + 1
+            cells[colIdx] = cellXml
+
+    for colIdx, (value, styleName) in rowPatches.items():
+        cellXml = cells.get(colIdx)
+        cellFormat = int(parseAttributes(cellXml).get("s", 0)) if cellXml else 0
+        if styleName is not None:
+            cellFormat = styles.getCellFormat(cellFormat, styleName)
+        reference = "%s%s" % (get_column_letter(colIdx + 1), rowNumber)
+        if cellXml is None or value is not None:
+            cellXml = formatCell(reference, value, cellFormat)
+            if prefix:
+                cellXml = re.sub(r'<(/?)(?=[a-z])', r'<\1' + prefix, cellXml)
+        else:
+            cellTag = cellXml[:cellXml.index(">") + 1]
+            cellXml = setAttribute(setAttribute(cellTag, "r", reference), "s", cellFormat) + cellXml[len(cellTag):]
+        cells[colIdx] = cellXml
+
+    # Spans are an optional hint, dropped rather than recomputed
+    openTag = re.sub(r'\sspans="[^"]*"', "", openTag).replace("/>", ">")
+    return "%s%s%s</%srow>" % (openTag, keptContent, "".join(cells[colIdx] for colIdx in sorted(cells)), prefix)
+
+
+def iterRowElements(content, prefix):
+    """
+    Yield the start and end of every row element of the content of a sheetData element, in order
+    """
+    openRow = "<%srow" % (prefix,)
+    closeRow = "</%srow>" % (prefix,)
+    start = content.find(openRow)
+    while start != -1:
+        end = content.index(">", start) + 1
+        if content[end - 2] != "/":
+            end = content.index(closeRow, end) + len(closeRow)
+        yield start, end
+        start = content.find(openRow, end)
+
+
+def patchWorksheet(xml, rowPatches, styles):
+    """
+    Input:
+    xml (str): Content of a worksheet part
+    rowPatches (iterable): Row number and cells to change of every row to change, in order, see
+    WorksheetPatch.iterRowPatches
+    styles (StylesPatch): Styles of the workbook
+
+    Output:
+    Content of the patched worksheet part. Only the rows with cells to change are rewritten, and the rows after
+    the last of them are copied without being read.
+    """
+    prefix = getPrefix(xml, "worksheet")
+    sheetData = re.search(r'<%ssheetData\b[^>]*?(/?)>' % (re.escape(prefix),), xml)
+    if sheetData is None:
+        raise FatalError("No sheetData element found")
+    openTag = sheetData.group(0)
+    closeTag = "</%ssheetData>" % (prefix,)
+    contentStart = sheetData.end()
+    contentEnd = contentStart if sheetData.group(1) else xml.index(closeTag, contentStart)
+    content = xml[contentStart:contentEnd]
+
+    parts = []
+    position = 0
+    rowNumber = 0
+    maxColumn = 0
+    rowPatches = iter(rowPatches)
+    nextPatch = next(rowPatches, None)
+    for start, end in iterRowElements(content, prefix):
+        if nextPatch is None:
+            break
+        rowXml = content[start:end]
+        rowNumber = int(parseAttributes(rowXml).get("r", rowNumber + 1))
+        if nextPatch[0] > rowNumber:
+            continue
+        parts.append(content[position:start])
+        position = start
+        # Rows to change that have no element yet are created in order
+        while nextPatch is not None and nextPatch[0] <= rowNumber:
+            patchRowNumber, cellPatches = nextPatch
+            if cellPatches:
+                maxColumn = max(maxColumn, max(cellPatches) + 1)
+            if patchRowNumber == rowNumber:
+                parts.append(patchRow(rowXml, rowNumber, cellPatches, styles, prefix))
+                position = end
+            else:
+                parts.append(patchRow(None, patchRowNumber, cellPatches, styles, prefix))
+            nextPatch = next(rowPatches, None)
+    parts.append(content[position:])
+    while nextPatch is not None:
+        patchRowNumber, cellPatches = nextPatch
+        if cellPatches:
+            maxColumn = max(maxColumn, max(cellPatches) + 1)
+        parts.append(patchRow(None, patchRowNumber, cellPatches, styles, prefix))
+        nextPatch = next(rowPatches, None)
+
+    newSheetData = "%s%s%s" % (openTag.replace("/>", ">"), "".join(parts), closeTag)
+    xml = xml[:sheetData.start()] + newSheetData + xml[contentEnd + (0 if sheetData.group(1) else len(closeTag)):]
+
+    # Widen the dimension of the worksheet to the appended columns
+    dimension = re.search(r'<%sdimension\b[^>]*\bref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"' % (re.escape(prefix),), xml)
+    if dimension is not None and dimension.group(3) is not None:
+        if maxColumn > column_index_from_string(dimension.group(3)):
+            xml = "%s%s%s" % (xml[:dimension.start(3)], get_column_letter(maxColumn), xml[dimension.end(3):])
+    return xml
+
+
+def copyZipMember(zipIn, info, zipOut):
+    """
+    Copy a member of a zip file to another as it is stored, without decompressing and compressing it again.
+    Members too large for a zip file without ZIP64 extensions are written again instead.
+
+    Input:
+    zipIn (zipfile.ZipFile): Zip file the member is read from
+    info (zipfile.ZipInfo): Member to copy
+    zipOut (zipfile.ZipFile): Zip file opened for writing the member is added to
+    """
+    offset = zipOut.fp.tell()
+    if max(info.file_size, info.compress_size, info.header_offset, offset) >= zipfile.ZIP64_LIMIT:
+        zipOut.writestr(info, zipIn.read(info))
+        return
+    zipIn.fp.seek(info.header_offset)
+    localHeader = zipIn.fp.read(zipfile.sizeFileHeader)
+    if localHeader[:4] != zipfile.stringFileHeader:
+        raise FatalError("Bad local header of %s in the input file" % (info.filename,))
+    nameLength, extraLength = struct.unpack("<HH", localHeader[26:30])
+    zipIn.fp.seek(info.header_offset + zipfile.sizeFileHeader + nameLength + extraLength)
+    outInfo = copy.copy(info)
+    # The sizes and CRC are known, so they are written in the local header rather than after the data
+    outInfo.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    outInfo.header_offset = offset
+    zipOut.fp.write(outInfo.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        data = zipIn.fp.read(min(remaining, COPY_CHUNK_SIZE))
+        if not data:
+            raise FatalError("Truncated member %s in the input file" % (info.filename,))
+        zipOut.fp.write(data)
+        remaining -= len(data)
+    zipOut.filelist.append(outInfo)
+    zipOut.NameToInfo[outInfo.filename] = outInfo
+    zipOut.start_dir = zipOut.fp.tell()
+
+
+def savePatchedWorkbook(source, outputFile, worksheetPatches, fillColors):
+    """
+    Save a copy of an xlsx file, with the flags of the checker applied to the cells of the worksheets it checked.
+    Every other part of the file is copied as it is stored, so the formatting, column widths and formulas of the
+    input file are kept.
+
+    Input:
+    source (str or file): Path or file object of the input xlsx file
+    outputFile (str or file): Path or file object to save the patched file to
+    worksheetPatches (list): WorksheetPatch of each checked worksheet
+    fillColors (dict): ARGB fill color of each named style, by name
+    """
+    with zipfile.ZipFile(source) as zipIn:
+        rootTargets = getRelationshipTargets(zipIn, "")
+        workbookPart = next(target for type, target in rootTargets.values() if type == OFFICE_DOCUMENT_TYPE)
+        workbookTargets = getRelationshipTargets(zipIn, workbookPart)
+        workbookRoot = ET.fromstring(zipIn.read(workbookPart))
+        sheetParts = {}
+        for sheet in workbookRoot.iter("{http://schemas.openxmlformats.org/spreadsheetml/2006/main}sheet"):
+            sheetParts[sheet.get("name")] = workbookTargets[sheet.get("{%s}id" % (DOCUMENT_RELATIONSHIPS_NS,))][1]
+        stylesPart = next(target for type, target in workbookTargets.values() if type == STYLES_TYPE)
+
+        styles = StylesPatch(zipIn.read(stylesPart).decode("utf-8"), fillColors)
+        patchedParts = {}
+        for worksheetPatch in worksheetPatches:
+            rowPatches = worksheetPatch.iterRowPatches()
+            firstPatch = next(rowPatches, None)
+            if firstPatch is not None:
+                partName = sheetParts[worksheetPatch.title]
+                patchedParts[partName] = patchWorksheet(zipIn.read(partName).decode("utf-8"),
+                                                        itertools.chain([firstPatch], rowPatches), styles)
+        patchedParts[stylesPart] = styles.xml
+
+        with zipfile.ZipFile(outputFile, "w", zipfile.ZIP_DEFLATED) as zipOut:
+            for info in zipIn.infolist():
+                if info.filename in patchedParts:
+                    zipOut.writestr(info, patchedParts[info.filename].encode("utf-8"))
+                else:
+                    copyZipMember(zipIn, info, zipOut)
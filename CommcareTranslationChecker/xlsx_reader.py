@@ -0,0 +1,302 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import posixpath
+import xml.etree.ElementTree as ET
+import zipfile
+
+import openpyxl as xl
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.formula.translate import Translator
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel, from_ISO8601
+
+READERS = ("openpyxl", "xml")
+
+SHEET_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELATIONSHIPS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+DOCUMENT_RELATIONSHIPS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+OFFICE_DOCUMENT_TYPE = DOCUMENT_RELATIONSHIPS_NS + "/officeDocument"
+WORKSHEET_TYPE = DOCUMENT_RELATIONSHIPS_NS + "/worksheet"
+SHARED_STRINGS_TYPE = DOCUMENT_RELATIONSHIPS_NS + "/sharedStrings"
+STYLES_TYPE = DOCUMENT_RELATIONSHIPS_NS + "/styles"
+
+ROW_TAG = "{%s}row" % (SHEET_MAIN_NS,)
+CELL_TAG = "{%s}c" % (SHEET_MAIN_NS,)
+VALUE_TAG = "{%s}v" % (SHEET_MAIN_NS,)
+FORMULA_TAG = "{%s}f" % (SHEET_MAIN_NS,)
+INLINE_STRING_TAG = "{%s}is" % (SHEET_MAIN_NS,)
+TEXT_TAG = "{%s}t" % (SHEET_MAIN_NS,)
+RUN_TAG = "{%s}r" % (SHEET_MAIN_NS,)
+STRING_ITEM_TAG = "{%s}si" % (SHEET_MAIN_NS,)
+SHEET_DATA_TAG = "{%s}sheetData" % (SHEET_MAIN_NS,)
+DIMENSION_TAG = "{%s}dimension" % (SHEET_MAIN_NS,)
+
+
+def getText(element):
+    """
+    Output:
+    Plain text of a shared or inline string, without its phonetic runs, as read by openpyxl
+    """
+    text = element.findtext(TEXT_TAG) or ""
+    for run in element.iter(RUN_TAG):
+        text += run.findtext(TEXT_TAG) or ""
+    return text
+
+
+def castNumber(value):
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def getRelationshipTargets(zipFile, partName):
+    """
+    Output:
+    Dictionary of the (type, part name) of the relationships of a part, by relationship id. Empty if the part has
+    no relationships part.
+    """
+    relsName = posixpath.join(posixpath.dirname(partName), "_rels", posixpath.basename(partName) + ".rels")
+    targets = {}
+    if relsName not in zipFile.namelist():
+        return targets
+    for relationship in ET.fromstring(zipFile.read(relsName)).iter("{%s}Relationship" % (RELATIONSHIPS_NS,)):
+        target = relationship.get("Target")
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(partName), target))
+        targets[relationship.get("Id")] = (relationship.get("Type"), target)
+    return targets
+
+
+class XmlWorkbook(object):
+    """
+    Read-only workbook reading the worksheet XML of an xlsx file with an event-based parser, rather than building
+    openpyxl cells. Worksheets only offer what the checker needs: title, max_row, max_column and
+    iter_rows(values_only=True), with values read as openpyxl does.
+
+    Input:
+    source (str or file): Path or file object of the xlsx file
+    columnFilter (function [opt]): Called with the title and the header row of each worksheet, returns the set of
+    the indexes of the columns to read, or None to read every column. Values of other columns are read as None
+    without being parsed.
+    """
+
+    def __init__(self, source, columnFilter=None):
+        self.zipFile = zipfile.ZipFile(source)
+        self.columnFilter = columnFilter
+        try:
+            rootTargets = getRelationshipTargets(self.zipFile, "")
+            workbookPart = next(target for type, target in rootTargets.values() if type == OFFICE_DOCUMENT_TYPE)
+            workbookTargets = getRelationshipTargets(self.zipFile, workbookPart)
+            workbookRoot = ET.fromstring(self.zipFile.read(workbookPart))
+            properties = workbookRoot.find("{%s}workbookPr" % (SHEET_MAIN_NS,))
+            self.epoch = WINDOWS_EPOCH
+            if properties is not None and properties.get("date1904") in ("1", "true"):
+                self.epoch = MAC_EPOCH
+
+            self.sheetnames = []
+            self.worksheets = []
+            for sheet in workbookRoot.iter("{%s}sheet" % (SHEET_MAIN_NS,)):
+                self.sheetnames.append(sheet.get("name"))
+                relationshipType, partName = workbookTargets[sheet.get("{%s}id" % (DOCUMENT_RELATIONSHIPS_NS,))]
+                if relationshipType == WORKSHEET_TYPE:
+                    self.worksheets.append(XmlWorksheet(self, sheet.get("name"), partName))
+
+            partNames = dict((type, target) for type, target in workbookTargets.values())
+            self.sharedStrings = []
+            if SHARED_STRINGS_TYPE in partNames:
+                self.sharedStrings = self.readSharedStrings(partNames[SHARED_STRINGS_TYPE])
+            self.dateFormats = set()
+            self.timedeltaFormats = set()
+            if STYLES_TYPE in partNames:
+                self.readDateFormats(partNames[STYLES_TYPE])
+        except Exception:
+            self.zipFile.close()
+            raise
+
+    def readSharedStrings(self, partName):
+        sharedStrings = []
+        with self.zipFile.open(partName) as source:
+            for _, element in ET.iterparse(source):
+                if element.tag == STRING_ITEM_TAG:
+                    sharedStrings.append(getText(element).replace("x005F_", ""))
+                    element.clear()
+        return sharedStrings
+
+    def readDateFormats(self, partName):
+        """
+        Find the cell formats whose numbers are dates or durations, as openpyxl does
+        """
+        root = ET.fromstring(self.zipFile.read(partName))
+        customFormats = dict((int(numFmt.get("numFmtId")), numFmt.get("formatCode"))
+                             for numFmt in root.iter("{%s}numFmt" % (SHEET_MAIN_NS,)))
+        cellFormats = root.find("{%s}cellXfs" % (SHEET_MAIN_NS,))
+        for formatIdx, cellFormat in enumerate(cellFormats if cellFormats is not None else []):
+            numFmtId = int(cellFormat.get("numFmtId", 0))
+            numberFormat = customFormats.get(numFmtId) or BUILTIN_FORMATS.get(numFmtId, "General")
+            if is_date_format(numberFormat):
+                self.dateFormats.add(formatIdx)
+            if is_timedelta_format(numberFormat):
+                self.timedeltaFormats.add(formatIdx)
+
+    def __iter__(self):
+        return iter(self.worksheets)
+
+    def __getitem__(self, title):
+        for ws in self.worksheets:
+            if ws.title == title:
+                return ws
+        raise KeyError("Worksheet %s does not exist." % (title,))
+
+    def close(self):
+        self.zipFile.close()
+
+
+class XmlWorksheet(object):
+    """
+    Worksheet of an XmlWorkbook, see XmlWorkbook
+    """
+
+    def __init__(self, parent, title, partName):
+        self.parent = parent
+        self.title = title
+        self.partName = partName
+        self._dimensions = None
+        self.sharedFormulae = {}
+
+    def readDimensions(self):
+        """
+        Output:
+        Tuple of the number of rows and columns of the worksheet according to its dimension element, each None
+        if it is not given
+        """
+        if self._dimensions is None:
+            self._dimensions = (None, None)
+            with self.parent.zipFile.open(self.partName) as source:
+                for _, element in ET.iterparse(source, events=("start",)):
+                    if element.tag == DIMENSION_TAG:
+                        ref = element.get("ref", "")
+                        if ":" in ref:
+                            _, _, maxColumn, maxRow = range_boundaries(ref)
+                            self._dimensions = (maxRow, maxColumn)
+                        break
+                    if element.tag == SHEET_DATA_TAG:
+                        break
+        return self._dimensions
+
+    @property
+    def max_row(self):
+        return self.readDimensions()[0]
+
+    @property
+    def max_column(self):
+        return self.readDimensions()[1]
+
+    def parseCell(self, element, reference):
+        """
+        Output:
+        Value of a cell element, as openpyxl reads it without data_only
+        """
+        dataType = element.get("t", "n")
+        formula = element.find(FORMULA_TAG)
+        if formula is not None:
+            value = "=" + (formula.text or "")
+            if formula.get("t") == "shared" and reference:
+                # Cells sharing the formula of another cell only have its index
+                sharedIdx = formula.get("si")
+                if formula.text is not None:
+                    self.sharedFormulae[sharedIdx] = Translator(value, reference)
+                elif sharedIdx in self.sharedFormulae:
+                    value = self.sharedFormulae[sharedIdx].translate_formula(reference)
+            return value
+        if dataType == "inlineStr":
+            inlineString = element.find(INLINE_STRING_TAG)
+            return getText(inlineString) if inlineString is not None else None
+        value = element.findtext(VALUE_TAG) or None
+        if value is None:
+            return None
+        if dataType == "n":
+            value = castNumber(value)
+            styleIdx = int(element.get("s", 0))
+            if styleIdx in self.parent.dateFormats:
+                try:
+                    value = from_excel(value, self.parent.epoch,
+                                       timedelta=styleIdx in self.parent.timedeltaFormats)
+                except (OverflowError, ValueError):
+                    value = "#VALUE!"
+        elif dataType == "s":
+            value = self.parent.sharedStrings[int(value)]
+        elif dataType == "b":
+            value = bool(int(value))
+        elif dataType == "d":
+            value = from_ISO8601(value)
+        return value
+
+    def iter_rows(self, values_only=True):
+        """
+        Yield the values of every row as a tuple, as a read-only openpyxl worksheet does: rows missing from the
+        file are yielded empty, and rows are padded or cut to max_column when it is known. The header row is always
+        read in full, and the other rows only in the columns kept by the column filter of the workbook.
+        """
+        if not values_only:
+            raise ValueError("Only values can be read from an XmlWorksheet")
+        maxColumn = self.max_column
+        emptyRow = (None,) * maxColumn if maxColumn else ()
+        keptColumns = None
+        rowCounter = 1
+        with self.parent.zipFile.open(self.partName) as source:
+            sheetData = None
+            for event, element in ET.iterparse(source, events=("start", "end")):
+                if event == "start":
+                    if element.tag == SHEET_DATA_TAG:
+                        sheetData = element
+                    continue
+                if element.tag != ROW_TAG:
+                    continue
+                rowNumber = int(element.get("r", rowCounter))
+                for _ in range(rowCounter, rowNumber):
+                    rowCounter += 1
+                    yield emptyRow
+                values = {}
+                colIdx = 0
+                for cell in element.iter(CELL_TAG):
+                    reference = cell.get("r")
+                    colIdx = coordinate_to_tuple(reference)[1] if reference else colIdx + 1
+                    if keptColumns is None or colIdx - 1 in keptColumns:
+                        values[colIdx] = self.parseCell(cell, reference)
+                if sheetData is not None:
+                    sheetData.clear()
+                rowWidth = maxColumn or max(values or [0])
+                row = [None] * rowWidth
+                for colIdx, value in values.items():
+                    if colIdx <= rowWidth:
+                        row[colIdx - 1] = value
+                if rowCounter == 1 and self.parent.columnFilter is not None:
+                    keptColumns = self.parent.columnFilter(self.title, row)
+                rowCounter += 1
+                yield tuple(row)
+
+
+def openWorkbook(source, reader="openpyxl", readOnly=False, columnFilter=None):
+    """
+    Open a workbook to check.
+
+    Input:
+    source (str or file): Path or file object of the xlsx file
+    reader (str [opt]): One of READERS. "xml" reads the file with an XmlWorkbook, falling back to openpyxl if the
+    file cannot be read that way.
+    readOnly (bool [opt]): Whether openpyxl opens the workbook read-only
+    columnFilter (function [opt]): Columns to read, see XmlWorkbook. Not used by openpyxl.
+
+    Output:
+    XmlWorkbook or openpyxl workbook
+    """
+    if reader == "xml":
+        try:
+            return XmlWorkbook(source, columnFilter)
+        except (KeyError, ValueError, StopIteration, ET.ParseError, zipfile.BadZipFile):
+            if isinstance(source, io.IOBase):
+                source.seek(0)
+    return xl.load_workbook(source, read_only=readOnly)
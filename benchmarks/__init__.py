@@ -0,0 +1,4 @@
+"""
+Benchmarks for CommcareTranslationChecker. Each module can be run with `python -m benchmarks.<module>`
+from the root of the repository. The tests generate their workbook with workbook_generator.
+"""
@@ -0,0 +1,91 @@
+"""
+Measure how responsive the event loop stays while validate_workbook_async checks several workbooks at once, in the
+default thread pool and in a process pool. A task sleeping 10 ms in a loop records how late it wakes up; the lag
+percentiles show how long the loop was blocked.
+
+$ python -m benchmarks.async_loop --sheets 10 --rows 2000 --uploads 8 --concurrency 4
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+from CommcareTranslationChecker import CheckOptions, validate_workbook_async
+
+from .workbook_generator import add_generator_arguments, generate_workbook, generator_options
+
+TICK_SECONDS = 0.01
+
+
+async def measure_lag(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+
+async def check_uploads(path, uploads, concurrency, executor):
+    """
+    Check the workbook at path uploads times, at most concurrency at a time
+
+    Output:
+    Tuple of the total time in seconds and the sorted lags of the event loop in seconds
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    lags = []
+    lagTask = asyncio.create_task(measure_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*[validate_workbook_async(data, CheckOptions(), semaphore=semaphore, executor=executor)
+                           for _ in range(uploads)])
+    totalTime = time.perf_counter() - start
+    stop.set()
+    await lagTask
+    return totalTime, sorted(lags)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_generator_arguments(parser)
+    parser.add_argument("--file", help="Check this workbook rather than a generated one", default=None)
+    parser.add_argument("--uploads", help="Number of workbooks checked", type=int, default=8)
+    parser.add_argument("--concurrency", help="Number of workbooks checked at a time", type=int, default=4)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    folder = tempfile.mkdtemp()
+    try:
+        path = args.file
+        if not path:
+            path = os.path.join(folder, "synthetic.xlsx")
+            generate_workbook(path, **generator_options(args))
+        print("%s: %.1f MB, %s uploads, %s at a time" % (os.path.basename(path), os.path.getsize(path) / 1e6,
+                                                         args.uploads, args.concurrency))
+        print("%-10s %10s %14s %14s %14s" % ("executor", "total (s)", "lag p50 (ms)", "lag p99 (ms)",
+                                             "lag max (ms)"))
+        for name in ("thread", "process"):
+            executor = None
+            if name == "process":
+                executor = concurrent.futures.ProcessPoolExecutor(args.concurrency)
+            try:
+                totalTime, lags = asyncio.run(check_uploads(path, args.uploads, args.concurrency, executor))
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            print("%-10s %10.2f %14.1f %14.1f %14.1f" % (
+                name, totalTime, lags[len(lags) // 2] * 1000, lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000,
+                lags[-1] * 1000))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
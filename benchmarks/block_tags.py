@@ -0,0 +1,130 @@
+"""
+Compare the block structure engine against the previous implementation of the format_tags check, on long
+multi-line markdown labels whose translations drop or garble some of their block tags. For each pair, the format
+tags of both labels are counted and, when their block tags differ, the translation is fixed and the tags of the
+fixed text counted again: previously by splitting and matching every line of each text once more for each of these
+steps, now from the lines of each text classified once.
+
+$ python -m benchmarks.block_tags --labels 2000 --lines 40
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import random
+
+from CommcareTranslationChecker.utils import (BLOCK_FORMATTING_LINE_REGEX, BLOCK_FORMATTING_TAGS,
+                                              INLINE_FORMATTING_TAGS, block_structure, fix_block_structure,
+                                              fix_block_tag_lines, fixed_format_tag_counts, format_tag_counts,
+                                              inline_tag_counts)
+
+from .common import best_time
+
+BLOCK_TAGS = ["# ", "## ", "### ", "* ", "1. ", "2. ", "10. "]
+WORDS = ["visit", "the", "household", "**record**", "*every*", "member", "~~old~~", "answer", "***now***", "form",
+         "3", "#5"]
+
+
+def legacy_format_tag_counts(text):
+    """
+    format_tag_counts as it was before block_structure, splitting the text and matching every line
+    """
+    counts = inline_tag_counts(text) + [0] * len(BLOCK_FORMATTING_TAGS)
+    if not text:
+        return tuple(counts)
+    for line in text.splitlines():
+        match = BLOCK_FORMATTING_LINE_REGEX.match(line)
+        if match:
+            if match.group(1):
+                counts[len(INLINE_FORMATTING_TAGS) + len(match.group(1)) - 1] += 1
+            elif match.group(2):
+                counts[len(INLINE_FORMATTING_TAGS) + 6] += 1
+            else:
+                counts[len(INLINE_FORMATTING_TAGS) + 7] += 1
+    return tuple(counts)
+
+
+def legacy_check(base, output):
+    """
+    The format_tags check as it was before block_structure
+
+    Output:
+    Tuple of the fixed text (None if it was not fixed) and its format tag counts
+    """
+    baseCounts = legacy_format_tag_counts(base)
+    outputCounts = legacy_format_tag_counts(output)
+    if baseCounts[len(INLINE_FORMATTING_TAGS):] == outputCounts[len(INLINE_FORMATTING_TAGS):]:
+        return None, None
+    baseTagPrefixes = [line[:line.index(' ') + 1] if BLOCK_FORMATTING_LINE_REGEX.match(line) else None
+                       for line in base.splitlines()]
+    fixedText = fix_block_tag_lines(baseTagPrefixes, output.splitlines())
+    if fixedText is None or fixedText == output:
+        return None, None
+    return fixedText, legacy_format_tag_counts(fixedText)
+
+
+def check(base, output):
+    """
+    The format_tags check with the block structure engine, see legacy_check
+    """
+    baseStructure = block_structure(base)
+    outputStructure = block_structure(output)
+    baseCounts = format_tag_counts(base, baseStructure)
+    outputCounts = format_tag_counts(output, outputStructure)
+    if baseCounts[len(INLINE_FORMATTING_TAGS):] == outputCounts[len(INLINE_FORMATTING_TAGS):]:
+        return None, None
+    blockFix = fix_block_structure(baseStructure, outputStructure)
+    if blockFix is None or blockFix.text == output:
+        return None, None
+    return blockFix.text, fixed_format_tag_counts(outputCounts, outputStructure, blockFix)
+
+
+def generate_labels(labels, lines, mismatchRate, seed):
+    """
+    Output:
+    List of pairs of a markdown label of the given number of lines, and of its translation, in which each line
+    loses or garbles its block tag with probability mismatchRate
+    """
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(labels):
+        baseLines = []
+        outputLines = []
+        for _ in range(lines):
+            tag = rng.choice(BLOCK_TAGS) if rng.random() < 0.6 else ""
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+            baseLines.append(tag + words)
+            if tag and rng.random() < mismatchRate:
+                tag = rng.choice(["", tag.strip(), "#" + tag, tag[:-1] + "  "])
+            outputLines.append(tag + words)
+        pairs.append(("\n".join(baseLines), "\n".join(outputLines)))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--labels", help="Number of labels", type=int, default=2000)
+    parser.add_argument("--lines", help="Number of lines of each label", type=int, default=40)
+    parser.add_argument("--mismatch-rate", help="Fraction of block tags dropped or garbled in the translations",
+                        type=float, default=0.05, dest="mismatchRate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pairs = generate_labels(args.labels, args.lines, args.mismatchRate, args.seed)
+    fixedCount = 0
+    for base, output in pairs:
+        result = check(base, output)
+        if legacy_check(base, output) != result:
+            raise AssertionError("Results differ for %r and %r" % (base, output))
+        fixedCount += result[0] is not None
+
+    legacy = best_time(lambda: [legacy_check(*pair) for pair in pairs], args.repeat)[0]
+    current = best_time(lambda: [check(*pair) for pair in pairs], args.repeat)[0]
+    print("%s label pairs of %s lines, %s fixed" % (len(pairs), args.lines, fixedCount))
+    print("line by line rescans : %.3fs" % legacy)
+    print("block structure      : %.3fs" % current)
+    print("speedup              : %.1fx" % (legacy / current if current else float("inf")))
+
+
+if __name__ == "__main__":
+    main()
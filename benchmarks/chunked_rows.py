@@ -0,0 +1,63 @@
+"""
+Measure how checking a single tall worksheet scales with the number of processes it is checked in, when its rows
+are compared in chunks across the process pool.
+
+$ python -m benchmarks.chunked_rows --rows 50000 --jobs 1 2 4
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import os
+import shutil
+import tempfile
+
+import openpyxl as xl
+
+from CommcareTranslationChecker.CommcareTranslationChecker import validate_workbook
+
+from .common import best_time
+
+
+def make_workbook(path, rowCount):
+    """
+    Save a workbook with a single worksheet of rowCount rows to path. One row in ten has a mismatch.
+    """
+    wb = xl.Workbook(write_only=True)
+    ws = wb.create_sheet("module1_form1")
+    ws.append(["case_property", "list_or_detail", "default_en", "default_es", "default_fr"])
+    for idx in range(rowCount):
+        label = '**Question %s** for <output value="/data/name_%s"/> on <output value="/data/date_%s"/>' % (
+            idx, idx, idx)
+        translation = label
+        if idx % 10 == 0:
+            translation = label.replace('<output value="/data/date_%s"/>' % idx, '')
+        ws.append(["property_%s" % idx, "detail", label, translation, label.replace("**", "*")])
+    wb.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", help="Number of rows of the worksheet", type=int, default=50000)
+    parser.add_argument("--jobs", help="Numbers of processes to check the worksheet in", type=int, nargs="+",
+                        default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument("--chunk-rows", type=int, default=5000, dest="chunkRows")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, "tall.xlsx")
+        make_workbook(path, args.rows)
+        print("%6s %10s %8s" % ("jobs", "time (s)", "speedup"))
+        baseTime = None
+        for jobs in args.jobs:
+            jobsTime = best_time(lambda: validate_workbook(path, jobs=jobs, chunkRows=args.chunkRows), args.repeat)[0]
+            if baseTime is None:
+                baseTime = jobsTime
+            print("%6s %10.2f %7.1fx" % (jobs, jobsTime, baseTime / jobsTime))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
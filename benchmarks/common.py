@@ -0,0 +1,27 @@
+"""
+Helpers shared by the benchmarks
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import time
+
+
+def best_time(function, repeat, number=1):
+    """
+    Call function number times in each of repeat rounds
+
+    Output:
+    Tuple of the best time of a call in seconds, the time of the fastest round divided by number, and the result of
+    the last call of that round
+    """
+    bestTime = None
+    bestResult = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            result = function()
+        elapsed = (time.perf_counter() - start) / number
+        if bestTime is None or elapsed < bestTime:
+            bestTime = elapsed
+            bestResult = result
+    return bestTime, bestResult
@@ -0,0 +1,88 @@
+"""
+Compare the single-pass format_tag_counts scanner against the previous per-tag re.findall implementation
+of get_invalid_format_tags, on the cells of a bulk translation file repeated --scale times.
+
+$ python -m benchmarks.format_tags --scale 200
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import re
+
+import openpyxl as xl
+
+from CommcareTranslationChecker.CommcareTranslationChecker import get_invalid_format_tags
+from CommcareTranslationChecker.utils import (BLOCK_FORMATTING_TAGS, INLINE_FORMATTING_TAGS,
+                                              regex_match_count)
+
+from .common import best_time
+
+DEFAULT_FILE = "examples/TranslationCheckerTest_BulkAppTranslation.xlsx"
+
+
+def legacy_get_invalid_format_tags(base_column_value, output_column_value):
+    """
+    get_invalid_format_tags as it was before format_tag_counts, running one regular expression per tag
+    """
+    invalid_inline_format_tags = []
+    invalid_block_format_tags = []
+    if not base_column_value or not output_column_value:
+        return invalid_inline_format_tags, invalid_block_format_tags
+    for tag in INLINE_FORMATTING_TAGS:
+        if len(re.findall(tag, base_column_value)) != len(re.findall(tag, output_column_value)):
+            invalid_inline_format_tags.append(tag)
+    for tag in BLOCK_FORMATTING_TAGS:
+        if regex_match_count(tag, base_column_value) != regex_match_count(tag, output_column_value):
+            invalid_block_format_tags.append(tag)
+    return invalid_inline_format_tags, invalid_block_format_tags
+
+
+def load_cell_pairs(file_name):
+    """
+    Return a list of (base value, compared value) pairs for every default_ column of every sheet in the file,
+    using the leftmost default_ column as base column
+    """
+    pairs = []
+    wb = xl.load_workbook(file_name, read_only=True)
+    for ws in wb:
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = [idx for idx, value in enumerate(header) if value and str(value).startswith("default_")]
+        if not columns:
+            continue
+        for row in rows:
+            for colIdx in columns:
+                if colIdx < len(row):
+                    pairs.append((row[columns[0]], row[colIdx]))
+    wb.close()
+    return pairs
+
+
+def run(pairs, function):
+    for base, output in pairs:
+        function(base, output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, default=DEFAULT_FILE)
+    parser.add_argument("--scale", help="Number of times the cells of the file are repeated",
+                        type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pairs = load_cell_pairs(args.file) * args.scale
+    for base, output in pairs:
+        if legacy_get_invalid_format_tags(base, output) != get_invalid_format_tags(base, output):
+            raise AssertionError("Results differ for %r and %r" % (base, output))
+
+    legacy = best_time(lambda: run(pairs, legacy_get_invalid_format_tags), args.repeat)[0]
+    current = best_time(lambda: run(pairs, get_invalid_format_tags), args.repeat)[0]
+    print("%s cell pairs" % len(pairs))
+    print("per-tag re.findall : %.3fs" % legacy)
+    print("format_tag_counts  : %.3fs" % current)
+    print("speedup            : %.1fx" % (legacy / current if current else float("inf")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compare the single-pass output value tokenizer against the previous implementation of
+convertCellToOutputValueList, removeExtraOutputValues and swapOutputValues, on cells with many
+<output value.../> tags. The checker only swaps the tags of cells with two of them, timed as "swap 2 tags" on a
+cell of the same number of sentences; "swap" swaps two of the many tags of the cell.
+
+$ python -m benchmarks.output_values --tags 100 200 500
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+
+from CommcareTranslationChecker.CommcareTranslationChecker import convertValueToOutputValueList
+from CommcareTranslationChecker.utils import (fix_output_values, removeExtraOutputValues,
+                                              swapOutputValues, tokenize_output_values)
+
+from .common import best_time
+
+
+def legacy_convert(value):
+    """
+    convertCellToOutputValueList as it was before tokenize_output_values, slicing the rest of the value
+    on every tag
+    """
+    openTag = "<output value=\""
+    closeTag = "\"/>"
+    outputList = []
+    currentIndex = 0
+    while value[currentIndex:].find(openTag) != -1:
+        currentIndex += value[currentIndex:].find(openTag) + len(openTag)
+        closeTagIndex = value[currentIndex:].find(closeTag)
+        if closeTagIndex != -1:
+            outputValue = value[currentIndex:closeTagIndex + currentIndex]
+            if outputValue.find(openTag) == -1:
+                outputList.append(outputValue)
+            else:
+                outputList.append("ILL-FORMATTED TAG : " + outputValue)
+        else:
+            outputList.append("ILL-FORMATTED TAG : " + value[currentIndex:])
+    return outputList
+
+
+def legacy_remove(extraValueList, text):
+    for extraValue in extraValueList:
+        text = text.replace('<output value="%s"/>' % extraValue, '')
+    return text
+
+
+def legacy_swap(outputValueList, text):
+    tag1 = '<output value="%s"/>' % outputValueList[0]
+    tag2 = '<output value="%s"/>' % outputValueList[1]
+    tag1Start = text.find(tag1)
+    tag1End = tag1Start + len(tag1)
+    tag2Start = text.find(tag2)
+    tag2End = tag2Start + len(tag2)
+    return text[:tag1Start] + tag2 + text[tag1End:tag2Start] + tag1 + text[tag2End:]
+
+
+def make_cell(tagCount):
+    """
+    Build a label with tagCount output values separated by some words, ending with an unclosed tag
+    """
+    parts = []
+    for idx in range(tagCount):
+        parts.append('The value of question %s is <output value="/data/group/question_%s"/>.' % (idx, idx))
+    parts.append('<output value="/data/unclosed')
+    return " ".join(parts)
+
+
+def make_swap_cell(sentenceCount):
+    """
+    Build a label of sentenceCount sentences with two output values, out of order, the only cells whose tags the
+    checker swaps
+    """
+    parts = ['The value of question %s is unknown.' % (idx,) for idx in range(sentenceCount)]
+    parts[0] = 'The value of question 1 is <output value="/data/group/question_1"/>.'
+    parts[-1] = 'The value of question 0 is <output value="/data/group/question_0"/>.'
+    return " ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tags", help="Numbers of output value tags per cell", type=int, nargs="+",
+                        default=[10, 100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    print("%6s  %-13s %12s %12s %8s" % ("tags", "operation", "legacy (ms)", "current (ms)", "speedup"))
+    for tagCount in args.tags:
+        cell = make_cell(tagCount)
+        values = convertValueToOutputValueList(cell)[0]
+        if values != legacy_convert(cell):
+            raise AssertionError("Output values differ for %s tags" % tagCount)
+        extraValueList = values[:-1:3]
+        swapValueList = values[:2]
+
+        if removeExtraOutputValues(extraValueList, cell) != legacy_remove(extraValueList, cell):
+            raise AssertionError("Removed output values differ for %s tags" % tagCount)
+        if swapOutputValues(swapValueList, cell) != legacy_swap(swapValueList, cell):
+            raise AssertionError("Swapped output values differ for %s tags" % tagCount)
+        swapCell = make_swap_cell(max(tagCount, 2))
+        swapCellValueList = convertValueToOutputValueList(swapCell)[0]
+        if swapOutputValues(swapCellValueList, swapCell) != legacy_swap(swapCellValueList, swapCell):
+            raise AssertionError("Swapped output values differ for a cell of two tags")
+
+        # The checker tokenizes each cell once, fixes reuse the tokens of the cell
+        tokens = tokenize_output_values(cell)
+        swapCellTokens = tokenize_output_values(swapCell)
+        timings = [
+            ("tokenize", lambda: legacy_convert(cell), lambda: convertValueToOutputValueList(cell)),
+            ("remove", lambda: legacy_remove(extraValueList, cell),
+             lambda: fix_output_values(cell, tokens, extraValueList)),
+            ("swap", lambda: legacy_swap(swapValueList, cell),
+             lambda: fix_output_values(cell, tokens, swapValueList=swapValueList)),
+            # Same length of text, with two tags
+            ("swap 2 tags", lambda: legacy_swap(swapCellValueList, swapCell),
+             lambda: fix_output_values(swapCell, swapCellTokens, swapValueList=swapCellValueList)),
+            ("remove+swap", lambda: legacy_swap(swapValueList, legacy_remove(extraValueList, cell)),
+             lambda: fix_output_values(cell, tokens, extraValueList, swapValueList)),
+        ]
+        for name, legacy, current in timings:
+            legacyTime = best_time(legacy, args.repeat, args.number)[0]
+            currentTime = best_time(current, args.repeat, args.number)[0]
+            print("%6s  %-13s %12.3f %12.3f %7.1fx" %
+                  (tagCount, name, legacyTime * 1000, currentTime * 1000, legacyTime / currentTime))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Time validate_workbook phase by phase (load, check, copy, save) on a synthetic bulk translation workbook, along
+with the functions on its hot path, and write the results as JSON so that they can be compared across releases.
+
+$ python -m benchmarks.phases --sheets 20 --rows 2000 --output phases.json
+
+The JSON report has the following stable layout, with every time in seconds:
+{
+  "schema": 1,
+  "environment": {"python": ..., "openpyxl": ..., "CommcareTranslationChecker": ...},
+  "parameters": {...arguments of the workbook generator and of the run...},
+  "workbook": {"sheets": ..., "rows": ..., "cells": ...},
+  "phases": {"load": ..., "check": ..., "copy": ..., "save": ..., "validate_workbook": ...},
+  (validate_workbook is the end-to-end run, saving the output file)
+  "functions": {"<function>": {"calls": ..., "seconds": ..., "microseconds_per_call": ...}, ...}
+}
+Phases and functions take the best of --repeat runs.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+import openpyxl as xl
+
+from CommcareTranslationChecker.CommcareTranslationChecker import (
+    DEFAULT_MEMO_SIZE, NON_LINGUISTIC_CHARACTERS, ComparisonMemo, WorksheetChecker, checkRowForMismatch,
+    compareRows, compareRowValues, convertCellToOutputValueList, register_styles, validate_workbook,
+    writeOutputRow)
+from CommcareTranslationChecker.utils import (block_tag_prefixes, fix_block_tags_mismatch, fix_output_values,
+                                              format_tag_counts, get_character_counter, normalizeQuotes,
+                                              tokenize_output_values)
+
+from .common import best_time
+from .workbook_generator import add_generator_arguments, generate_workbook, generator_options
+
+SCHEMA_VERSION = 1
+
+
+def get_version(distribution):
+    try:
+        from importlib.metadata import version
+        return version(distribution)
+    except Exception:
+        return None
+
+
+def time_phases(path, folder, repeat, memoSize):
+    """
+    Time the phases of checking the workbook at path as validate_workbook does without --stream: load the workbook,
+    compare the rows of every sheet (check), build the output workbook (copy) and save it
+    """
+    phases = {}
+    phases["load"], wb = best_time(lambda: xl.load_workbook(path), repeat)
+    sheetTitles = set(wb.sheetnames)
+    sheets = []
+    for ws in wb:
+        rows = list(ws.iter_rows(values_only=True))
+        header = list(rows[0]) if rows else []
+        configurationSheetColumnName = "sheet_name" if ws.title == "Modules_and_forms" else None
+        sheets.append((ws.title, header, rows[1:], configurationSheetColumnName))
+
+    def check():
+        memo = ComparisonMemo(memoSize) if memoSize else None
+        results = []
+        for title, header, rows, configurationSheetColumnName in sheets:
+            checker = WorksheetChecker(title, list(header), sheetTitles, memo=memo,
+                                       configurationSheetColumnName=configurationSheetColumnName,
+                                       formatCheckCharacters=NON_LINGUISTIC_CHARACTERS)
+            rowCheckResults = compareRows(checker.compareArgs, 2, rows, memo) if checker.copyRows else None
+            results.append((checker, rowCheckResults))
+        return results
+
+    def copy():
+        # Checkers are rebuilt so that every repeat starts from the header of the input sheet
+        wbOut = xl.Workbook()
+        register_styles(wbOut)
+        wbOut.remove(wbOut.active)
+        alignment = xl.styles.Alignment(wrap_text=True)
+        for (title, header, rows, configurationSheetColumnName), (_, rowCheckResults) in zip(sheets, checkResults):
+            checker = WorksheetChecker(title, list(header), sheetTitles,
+                                       configurationSheetColumnName=configurationSheetColumnName,
+                                       formatCheckCharacters=NON_LINGUISTIC_CHARACTERS)
+            wsOut = wbOut.create_sheet(title)
+            copiedColumnCount = checker.columnCount if checker.copyRows else 0
+            if checker.needsRows:
+                for rowIdx, values in enumerate(rows):
+                    outValues, outStyles = checker.applyRowCheckResults(
+                        rowIdx + 2, values, rowCheckResults[rowIdx] if rowCheckResults else None)
+                    writeOutputRow(wsOut, rowIdx + 2, outValues, outStyles, copiedColumnCount, alignment)
+            writeOutputRow(wsOut, 1, checker.header, [None] * len(checker.header), checker.columnCount, alignment)
+        return wbOut
+
+    phases["check"], checkResults = best_time(check, repeat)
+    phases["copy"], wbOut = best_time(copy, repeat)
+    outputPath = os.path.join(folder, "output.xlsx")
+    phases["save"], _ = best_time(lambda: wbOut.save(outputPath), repeat)
+
+    validateArgs = argparse.Namespace(
+        file=path, columns=None, baseColumn=None, ignoreOrder=False, verbose=False, outputFolder=folder,
+        createOutputFileFlag=True, configurationSheet="Modules_and_forms", configurationSheetColumnName="sheet_name",
+        outputMismatchTypesFlag=False, skipFormatCheckFlag=False, formatCheckCharacters=NON_LINGUISTIC_CHARACTERS,
+        formatCheckCharactersAdd=None, debugMode=False, memoSize=memoSize)
+    phases["validate_workbook"], _ = best_time(lambda: validate_workbook(path, validateArgs), repeat)
+
+    rowCount = sum(len(rows) for _, _, rows, _ in sheets)
+    cellCount = sum(len(rows) * len(header) for _, header, rows, _ in sheets)
+    return phases, {"sheets": len(sheets), "rows": rowCount, "cells": cellCount}, wb
+
+
+def time_functions(wb, repeat):
+    """
+    Time the functions on the hot path of the checks over every compared cell of wb, without memo
+    """
+    wbOut = xl.Workbook()
+    register_styles(wbOut)
+    wsOut = wbOut.active
+    rowCases = []
+    values = []
+    for ws in wb:
+        checker = WorksheetChecker(ws.title, [cell.value for cell in ws[1]], set(wb.sheetnames))
+        if not checker.copyRows:
+            continue
+        for row in ws.iter_rows(min_row=2):
+            rowCases.append((row, checker))
+            values.extend(row[colIdx].value for colIdx in checker.defaultColumnDict)
+    strings = [value for value in values if isinstance(value, str)]
+    cells = [row[colIdx] for row, checker in rowCases for colIdx in checker.defaultColumnDict]
+    characterCounter = get_character_counter(NON_LINGUISTIC_CHARACTERS, None)
+    lineLists = [value.splitlines() for value in strings]
+    # Cells with output values, fixed by removing their first output value
+    tokenized = [(value, tokens) for value, tokens in ((value, tokenize_output_values(value)) for value in strings)
+                 if tokens]
+    basePairs = [(row[checker.baseColumnIdx or min(checker.defaultColumnDict)].value, row[colIdx].value)
+                 for row, checker in rowCases for colIdx in checker.defaultColumnDict]
+    basePairs = [(base, value) for base, value in basePairs if isinstance(base, str) and isinstance(value, str)]
+
+    def each(function, items):
+        return lambda: [function(item) for item in items]
+
+    cases = [
+        ("checkRowForMismatch", len(rowCases), each(lambda case: checkRowForMismatch(
+            case[0], case[1].defaultColumnDict, case[1].fixedColumnDict, case[1].baseColumnIdx, False, wsOut,
+            case[1].mismatchFlagIdx, formatCheckCharacters=NON_LINGUISTIC_CHARACTERS), rowCases)),
+        ("compareRowValues", len(rowCases), each(lambda case: compareRowValues(
+            [cell.value for cell in case[0]], case[1].defaultColumnDict, case[1].baseColumnIdx,
+            formatCheckCharacters=NON_LINGUISTIC_CHARACTERS), rowCases)),
+        ("convertCellToOutputValueList", len(cells), each(convertCellToOutputValueList, cells)),
+        ("utils.tokenize_output_values", len(strings), each(tokenize_output_values, strings)),
+        ("utils.format_tag_counts", len(strings), each(format_tag_counts, strings)),
+        ("utils.normalizeQuotes", len(strings), each(normalizeQuotes, strings)),
+        ("utils.CharacterCounter.count", len(strings), each(characterCounter.count, strings)),
+        ("utils.block_tag_prefixes", len(lineLists), each(block_tag_prefixes, lineLists)),
+        ("utils.fix_block_tags_mismatch", len(basePairs),
+         each(lambda pair: fix_block_tags_mismatch(*pair), basePairs)),
+        ("utils.fix_output_values", len(tokenized), each(
+            lambda item: fix_output_values(item[0], item[1], [item[1][0].value]), tokenized)),
+    ]
+    functions = {}
+    for name, calls, function in cases:
+        seconds = best_time(function, repeat)[0]
+        functions[name] = {"calls": calls, "seconds": seconds,
+                           "microseconds_per_call": seconds * 1e6 / calls if calls else None}
+    return functions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_generator_arguments(parser)
+    parser.add_argument("--file", help="Benchmark this workbook rather than a generated one", default=None)
+    parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE, dest="memoSize")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-functions", action="store_true", default=False, dest="skipFunctions")
+    parser.add_argument("--output", help="Path of the JSON report. Defaults to printing it.", default=None)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    try:
+        parameters = {"repeat": args.repeat, "memo_size": args.memoSize}
+        if args.file:
+            path = args.file
+            parameters["file"] = os.path.basename(path)
+        else:
+            path = os.path.join(folder, "synthetic.xlsx")
+            options = generator_options(args)
+            generate_workbook(path, **options)
+            parameters.update(
+                sheets=options["sheets"], rows=options["rows"], languages=options["languages"],
+                output_tag_density=options["outputTagDensity"], markdown_density=options["markdownDensity"],
+                mismatch_rate=options["mismatchRate"], repeat_rate=options["repeatRate"], seed=options["seed"])
+        phases, workbook, wb = time_phases(path, folder, args.repeat, args.memoSize)
+        report = {
+            "schema": SCHEMA_VERSION,
+            "environment": {"python": platform.python_version(), "openpyxl": xl.__version__,
+                            "CommcareTranslationChecker": get_version("CommcareTranslationChecker")},
+            "parameters": parameters,
+            "workbook": workbook,
+            "phases": phases,
+            "functions": {} if args.skipFunctions else time_functions(wb, args.repeat),
+        }
+    finally:
+        shutil.rmtree(folder)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as reportFile:
+            reportFile.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
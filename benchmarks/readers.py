@@ -0,0 +1,83 @@
+"""
+Compare the time and peak memory of reading every row of a bulk translation workbook with each reader: openpyxl,
+openpyxl read-only (as with --stream or --jobs), and the xml reader, reading every column or only the compared
+columns (as with --report-format or --output-engine patch).
+
+$ python -m benchmarks.readers --sheets 20 --rows 5000
+$ python -m benchmarks.readers --file export.xlsx
+
+Peak memory is the peak of the memory allocated by Python while reading, as traced by tracemalloc, which also
+slows every reader down. Times are measured in separate runs without tracing.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from CommcareTranslationChecker.CommcareTranslationChecker import CheckedColumnFilter
+from CommcareTranslationChecker.xlsx_reader import openWorkbook
+
+from .common import best_time
+from .workbook_generator import add_generator_arguments, generate_workbook, generator_options
+
+READER_CASES = (
+    ("openpyxl", dict(reader="openpyxl")),
+    ("openpyxl read-only", dict(reader="openpyxl", readOnly=True)),
+    ("xml", dict(reader="xml")),
+    ("xml, compared columns", dict(reader="xml",
+                                   columnFilter=CheckedColumnFilter(None, "Modules_and_forms", "sheet_name"))),
+)
+
+
+def read_workbook(path, options):
+    """
+    Open the workbook at path and read every row of every worksheet
+
+    Output:
+    Tuple of the time taken to open the workbook, and the number of rows read
+    """
+    start = time.perf_counter()
+    wb = openWorkbook(path, **options)
+    loadTime = time.perf_counter() - start
+    rowCount = 0
+    for ws in wb:
+        for _ in ws.iter_rows(values_only=True):
+            rowCount += 1
+    wb.close()
+    return loadTime, rowCount
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_generator_arguments(parser)
+    parser.add_argument("--file", help="Benchmark this workbook rather than a generated one", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    folder = tempfile.mkdtemp()
+    try:
+        path = args.file
+        if not path:
+            path = os.path.join(folder, "synthetic.xlsx")
+            generate_workbook(path, **generator_options(args))
+        print("%s: %.1f MB" % (os.path.basename(path), os.path.getsize(path) / 1e6))
+        print("%-22s %10s %10s %10s %14s" % ("reader", "load (s)", "total (s)", "rows", "peak (MB)"))
+        for name, options in READER_CASES:
+            totalTime, (loadTime, rowCount) = best_time(lambda: read_workbook(path, options), args.repeat)
+            tracemalloc.start()
+            read_workbook(path, options)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print("%-22s %10.2f %10.2f %10s %14.1f" % (name, loadTime, totalTime, rowCount, peak / 1e6))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Load test the validation service: start it on a free port, upload a bulk translation workbook many times with a
+number of concurrent clients, and report the throughput and latency percentiles seen by the clients, then the
+metrics of the service.
+
+$ python -m benchmarks.server_load --sheets 5 --rows 500 --requests 200 --concurrency 1 4 16 --workers 2
+$ python -m benchmarks.server_load --file export.xlsx --query "ignore-order&output"
+
+Uploads rejected because the queue of the service is full are counted, not retried.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import warnings
+
+from CommcareTranslationChecker.server import createServer
+
+from .workbook_generator import add_generator_arguments, generate_workbook, generator_options
+
+
+def upload(url, data):
+    """
+    Output:
+    Tuple of the HTTP status of the upload and its latency in seconds
+    """
+    request = urllib.request.Request(url, data=data, method="POST",
+                                     headers={"Content-Type": "application/octet-stream"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def run_load(url, data, requests, concurrency):
+    """
+    Upload data requests times from concurrency threads
+
+    Output:
+    Tuple of the total time in seconds and the list of (status, latency) of the uploads
+    """
+    results = []
+    remaining = [requests]
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            result = upload(url, data)
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, results
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_generator_arguments(parser)
+    parser.add_argument("--file", help="Upload this workbook rather than a generated one", default=None)
+    parser.add_argument("--requests", help="Number of uploads per concurrency level", type=int, default=100)
+    parser.add_argument("--concurrency", help="Numbers of concurrent clients", type=int, nargs="+",
+                        default=[1, 4, 16])
+    parser.add_argument("--workers", help="Number of worker processes of the service", type=int, default=0)
+    parser.add_argument("--max-queue", type=int, default=16, dest="maxQueue")
+    parser.add_argument("--query", help="Query string of the uploads, for example ignore-order&output", default="")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    folder = tempfile.mkdtemp()
+    server = None
+    try:
+        path = args.file
+        if not path:
+            path = os.path.join(folder, "synthetic.xlsx")
+            generate_workbook(path, **generator_options(args))
+        with open(path, "rb") as f:
+            data = f.read()
+        print("%s: %.1f MB" % (os.path.basename(path), len(data) / 1e6))
+
+        start = time.perf_counter()
+        server = createServer(port=0, workers=args.workers, maxQueue=args.maxQueue)
+        print("Started %s warm workers in %.2f s" % (server.service.workers, time.perf_counter() - start))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+        url = "http://%s:%s/validate%s" % (host, port, "?" + args.query if args.query else "")
+
+        print("%12s %10s %10s %10s %10s %10s %10s" % ("concurrency", "ok", "rejected", "upload/s", "p50 (s)",
+                                                      "p90 (s)", "p99 (s)"))
+        for concurrency in args.concurrency:
+            totalTime, results = run_load(url, data, args.requests, concurrency)
+            latencies = sorted(latency for status, latency in results if status == 200)
+            rejected = sum(1 for status, _ in results if status == 503)
+            print("%12s %10s %10s %10.1f %10.3f %10.3f %10.3f" % (
+                concurrency, len(latencies), rejected, len(latencies) / totalTime, percentile(latencies, 0.5),
+                percentile(latencies, 0.9), percentile(latencies, 0.99)))
+
+        with urllib.request.urlopen("http://%s:%s/metrics" % (host, port)) as response:
+            print(json.dumps(json.loads(response.read().decode("utf-8")), indent=2))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            server.service.close()
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
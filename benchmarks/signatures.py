@@ -0,0 +1,100 @@
+"""
+Measure the time the signature prefilter saves when comparing the rows of a synthetic bulk translation workbook (or
+of a real one with --file): the rows of every sheet are read once, then compared with and without the prefilter,
+with every memo size given. The share of compared cells skipped is reported along with the times, and the results
+of both runs are checked to be the same.
+
+$ python -m benchmarks.signatures --sheets 20 --rows 2000 --markdown-density 0.1 --memo-sizes 0 65536
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import os
+import shutil
+import tempfile
+import warnings
+
+import openpyxl as xl
+
+from CommcareTranslationChecker.CommcareTranslationChecker import (
+    DEFAULT_MEMO_SIZE, NON_LINGUISTIC_CHARACTERS, ComparisonMemo, WorksheetChecker, compareRows)
+from CommcareTranslationChecker.rules import RuleSet
+
+from .common import best_time
+from .workbook_generator import add_generator_arguments, generate_workbook, generator_options
+
+
+def read_sheets(path):
+    """
+    Output:
+    List of the title, header and other rows of every worksheet of the workbook at path with columns to compare
+    """
+    wb = xl.load_workbook(path, read_only=True)
+    sheetTitles = set(wb.sheetnames)
+    sheets = []
+    for ws in wb:
+        rows = list(ws.iter_rows(values_only=True))
+        if rows and WorksheetChecker(ws.title, list(rows[0]), sheetTitles).copyRows:
+            sheets.append((ws.title, list(rows[0]), rows[1:]))
+    wb.close()
+    return sheets, sheetTitles
+
+
+def compare_sheets(sheets, sheetTitles, memoSize, prefilter):
+    """
+    Compare the rows of sheets as validate_workbook does
+
+    Output:
+    Tuple of the results of compareRows for every sheet, and the rules they were compared with
+    """
+    rules = RuleSet(prefilter=prefilter)
+    memo = ComparisonMemo(memoSize) if memoSize != 0 else None
+    results = []
+    for title, header, rows in sheets:
+        checker = WorksheetChecker(title, header, sheetTitles, formatCheckCharacters=NON_LINGUISTIC_CHARACTERS,
+                                   memo=memo, rules=rules)
+        results.append(compareRows(checker.compareArgs, 2, [list(row) for row in rows], memo))
+    return results, rules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_generator_arguments(parser)
+    parser.add_argument("--file", help="Compare the rows of this workbook rather than a generated one", default=None)
+    parser.add_argument("--memo-sizes", help="Memo sizes to compare the rows with, 0 comparing every row",
+                        type=int, nargs="+", default=[0, DEFAULT_MEMO_SIZE], dest="memoSizes")
+    parser.add_argument("--repeat", help="Number of runs of each configuration, the best one being reported",
+                        type=int, default=3)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    folder = tempfile.mkdtemp()
+    try:
+        path = args.file
+        if not path:
+            path = os.path.join(folder, "synthetic.xlsx")
+            generate_workbook(path, **generator_options(args))
+        sheets, sheetTitles = read_sheets(path)
+        rowCount = sum(len(rows) for title, header, rows in sheets)
+        print("%s: %s sheets, %s rows" % (os.path.basename(path), len(sheets), rowCount))
+        print("%10s %10s %10s %12s %12s %10s" % ("memo size", "prefilter", "check (s)", "rows/s", "skip rate",
+                                                 "speedup"))
+        for memoSize in args.memoSizes:
+            baseTime, (baseResults, rules) = best_time(
+                lambda: compare_sheets(sheets, sheetTitles, memoSize, False), args.repeat)
+            prefilterTime, (prefilterResults, prefilterRules) = best_time(
+                lambda: compare_sheets(sheets, sheetTitles, memoSize, True), args.repeat)
+            if prefilterResults != baseResults:
+                raise AssertionError("The results with and without the prefilter differ")
+            compared, skipped = prefilterRules.getPrefilterStats()
+            for prefilter, seconds in ((False, baseTime), (True, prefilterTime)):
+                print("%10s %10s %10.3f %12.0f %12s %9.2fx" % (
+                    memoSize, "on" if prefilter else "off", seconds, rowCount / seconds,
+                    "%.1f%%" % (100.0 * skipped / compared if compared else 0.0) if prefilter else "-",
+                    baseTime / seconds))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Generate synthetic bulk translation workbooks, shaped like the ones exported from CommCare: a Modules_and_forms
+configuration sheet, then a sheet per module with its case properties and a sheet per form with its labels, each
+with a default_<language> column per language.
+
+$ python -m benchmarks.workbook_generator /tmp/synthetic.xlsx --sheets 50 --rows 1000 --languages en es fr
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import hashlib
+import random
+
+import openpyxl as xl
+
+FORMS_PER_MODULE = 4
+WORDS = ("what", "is", "the", "name", "of", "your", "village", "household", "child", "date", "visit", "last",
+         "how", "many", "people", "live", "here", "please", "enter", "select", "weight", "height", "age", "did",
+         "receive", "treatment", "for", "this", "case", "follow", "up", "mother", "phone", "number", "address")
+# Labels repeated across forms and modules
+COMMON_LABELS = ("Yes", "No", "Next", "Back", "Other", "Don't know", "Save", "Name", "Date of birth",
+                 "Please specify", "Phone number", "Comments")
+INLINE_MARKERS = ("**", "*", "***", "~~")
+BLOCK_PREFIXES = ("# ", "## ", "### ", "* ", "1. ")
+
+
+def make_question(idx):
+    return "question_%s" % (idx,)
+
+
+def make_label(rng, rowIdx, outputTagDensity, markdownDensity, repeatRate):
+    """
+    Build an English label. Labels have output value tags with probability outputTagDensity and markdown with
+    probability markdownDensity, or are one of COMMON_LABELS with probability repeatRate.
+    """
+    if rng.random() < repeatRate:
+        return rng.choice(COMMON_LABELS)
+    words = [rng.choice(WORDS) for _ in range(rng.randint(3, 12))]
+    words[0] = words[0].capitalize()
+    if rng.random() < outputTagDensity:
+        for tagIdx in range(rng.randint(1, 3)):
+            words.insert(rng.randint(1, len(words)),
+                         '<output value="/data/%s"/>' % (make_question(rng.randint(0, rowIdx + tagIdx)),))
+    if rng.random() < markdownDensity:
+        if rng.random() < 0.5:
+            marker = rng.choice(INLINE_MARKERS)
+            wordIdx = rng.randrange(len(words))
+            words[wordIdx] = marker + words[wordIdx] + marker
+        else:
+            lines = [" ".join(words)]
+            prefix = rng.choice(BLOCK_PREFIXES)
+            for _ in range(rng.randint(1, 3)):
+                lines.append(prefix + " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))))
+            return "\n".join(lines) + "?"
+    return " ".join(words) + "?"
+
+
+def translate(label, language):
+    """
+    "Translate" a label by tagging the words outside of output value tags and markdown with the language,
+    keeping everything the checker compares unchanged
+    """
+    words = []
+    for word in label.split(" "):
+        if word.isalpha():
+            word = "%s%s" % (word, language.upper())
+        words.append(word)
+    return " ".join(words)
+
+
+def make_mismatch(rng, text):
+    """
+    Introduce one of the mismatches the checker finds in a translated label
+    """
+    mismatches = ["character"]
+    if '<output value="' in text:
+        mismatches.extend(["missing", "extra", "order"])
+    if "**" in text or "~~" in text:
+        mismatches.append("inline")
+    if "\n" in text:
+        mismatches.append("block")
+    mismatch = rng.choice(mismatches)
+    if mismatch == "missing":
+        start = text.index('<output value="')
+        return text[:start] + text[text.index('"/>', start) + 3:]
+    if mismatch == "extra":
+        return text + ' <output value="/data/extra"/>'
+    if mismatch == "order":
+        start = text.index('<output value="')
+        end = text.index('"/>', start) + 3
+        return text[end:] + " " + text[start:end] + " " + text[:start]
+    if mismatch == "inline":
+        return text.replace("**", "", 1).replace("~~", "", 1)
+    if mismatch == "block":
+        lines = text.split("\n")
+        lines[-1] = lines[-1].lstrip("#*1. ")
+        return "\n".join(lines)
+    return text + "!"
+
+
+def generate_workbook(path, sheets=10, rows=1000, languages=("en", "es", "fr"), outputTagDensity=0.3,
+                      markdownDensity=0.2, mismatchRate=0.05, repeatRate=0.2, seed=0):
+    """
+    Save a synthetic bulk translation workbook to path.
+
+    Input:
+    path (str): Path to save the workbook to
+    sheets (int): Number of module and form sheets, besides the Modules_and_forms sheet
+    rows (int): Number of rows of each module and form sheet
+    languages (list): Language codes, the first one being the base language
+    outputTagDensity (float): Fraction of labels with output value tags
+    markdownDensity (float): Fraction of labels with inline or block markdown
+    mismatchRate (float): Fraction of translated cells with a mismatch. If above 0, the configuration sheet also
+    lists a sheet that is missing from the workbook.
+    repeatRate (float): Fraction of labels that are common labels repeated across the workbook
+    seed (int): Seed of the random generator, so that the same arguments generate the same workbook
+    """
+    rng = random.Random(seed)
+    defaultColumns = ["default_%s" % (language,) for language in languages]
+    wb = xl.Workbook(write_only=True)
+
+    sheetNames = []
+    for sheetIdx in range(sheets):
+        moduleIdx, formIdx = divmod(sheetIdx, FORMS_PER_MODULE + 1)
+        if formIdx == 0:
+            sheetNames.append(("Module", "module%s" % (moduleIdx + 1,)))
+        else:
+            sheetNames.append(("Form", "module%s_form%s" % (moduleIdx + 1, formIdx)))
+
+    def translations(label):
+        values = [label]
+        for language in languages[1:]:
+            value = translate(label, language)
+            if rng.random() < mismatchRate:
+                value = make_mismatch(rng, value)
+            values.append(value)
+        return values
+
+    configurationSheet = wb.create_sheet("Modules_and_forms")
+    configurationSheet.append(["Type", "sheet_name"] + defaultColumns + ["unique_id"])
+    configurationRows = list(sheetNames)
+    if mismatchRate > 0:
+        configurationRows.append(("Form", "module0_form0"))
+    for sheetType, sheetName in configurationRows:
+        label = "%s %s" % (sheetType, sheetName.replace("_", " "))
+        configurationSheet.append([sheetType, sheetName] + translations(label) +
+                                  [hashlib.sha1(sheetName.encode("utf-8")).hexdigest()])
+
+    mediaColumns = ["%s_%s" % (media, language) for media in ("audio", "image", "video") for language in languages]
+    for sheetType, sheetName in sheetNames:
+        ws = wb.create_sheet(sheetName)
+        if sheetType == "Module":
+            ws.append(["case_property", "list_or_detail"] + defaultColumns)
+            for rowIdx in range(rows):
+                label = make_label(rng, rowIdx, outputTagDensity, markdownDensity, repeatRate)
+                ws.append(["property_%s" % (rowIdx // 2,), ("list", "detail")[rowIdx % 2]] + translations(label))
+        else:
+            ws.append(["label"] + defaultColumns + mediaColumns)
+            for rowIdx in range(rows):
+                label = make_label(rng, rowIdx, outputTagDensity, markdownDensity, repeatRate)
+                ws.append(["%s-label" % (make_question(rowIdx),)] + translations(label) +
+                          [None] * len(mediaColumns))
+    wb.save(path)
+
+
+def add_generator_arguments(parser):
+    """
+    Add the arguments of generate_workbook to an argparse parser
+    """
+    parser.add_argument("--sheets", help="Number of module and form sheets", type=int, default=10)
+    parser.add_argument("--rows", help="Number of rows per sheet", type=int, default=1000)
+    parser.add_argument("--languages", help="Language codes, the first one being the base language", nargs="+",
+                        default=["en", "es", "fr"])
+    parser.add_argument("--output-tag-density", help="Fraction of labels with output value tags", type=float,
+                        default=0.3, dest="outputTagDensity")
+    parser.add_argument("--markdown-density", help="Fraction of labels with markdown", type=float, default=0.2,
+                        dest="markdownDensity")
+    parser.add_argument("--mismatch-rate", help="Fraction of translated cells with a mismatch", type=float,
+                        default=0.05, dest="mismatchRate")
+    parser.add_argument("--repeat-rate", help="Fraction of labels repeated across the workbook", type=float,
+                        default=0.2, dest="repeatRate")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def generator_options(args):
+    """
+    Keyword arguments of generate_workbook from the arguments added by add_generator_arguments
+    """
+    return dict(sheets=args.sheets, rows=args.rows, languages=args.languages,
+                outputTagDensity=args.outputTagDensity, markdownDensity=args.markdownDensity,
+                mismatchRate=args.mismatchRate, repeatRate=args.repeatRate, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="Path to save the workbook to")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    generate_workbook(args.path, **generator_options(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import types
+import warnings
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker import xlsx_reader
+
+# The benchmarks are not installed by setup.py, like the tests, so the tests are run from the root of the repository,
+# which python -m pytest puts on the path
+from benchmarks.workbook_generator import generate_workbook
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EXAMPLES = os.path.join(os.path.dirname(HERE), "examples")
+WORKBOOKS = ("TranslationCheckerTest_BulkAppTranslation.xlsx", "sample1.xlsx", "sample1_Output.xlsx",
+             "generated.xlsx")
+
+
+@pytest.fixture(scope="session")
+def workbooks(tmp_path_factory):
+    """
+    Dictionary of the paths of the example workbooks and of a generated one, by name
+    """
+    paths = dict((name, os.path.join(EXAMPLES, name)) for name in WORKBOOKS[:-1])
+    paths["generated.xlsx"] = str(tmp_path_factory.mktemp("workbooks") / "generated.xlsx")
+    generate_workbook(paths["generated.xlsx"], sheets=3, rows=40, seed=0)
+    return paths
+
+
+@pytest.fixture(autouse=True)
+def ignore_warnings():
+    # openpyxl warns about the data validation extensions of the example workbooks
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+@pytest.fixture
+def full_loads(monkeypatch):
+    """
+    List of the workbooks the checker loads with openpyxl's full model rather than read-only, appended to as they
+    are loaded
+    """
+    loads = []
+
+    def load_workbook(source, read_only=False):
+        if not read_only:
+            loads.append(source)
+        return xl.load_workbook(source, read_only=read_only)
+
+    monkeypatch.setattr(xlsx_reader, "xl", types.SimpleNamespace(load_workbook=load_workbook))
+    return loads
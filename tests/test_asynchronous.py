@@ -0,0 +1,123 @@
+"""
+Check that other coroutines keep running in the event loop while validate_workbook_async checks generated workbooks
+concurrently, that the semaphore caps the number of checks running at a time, and that cancelling a task stops a
+check running in a thread.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import asyncio
+import concurrent.futures
+import io
+import threading
+
+import pytest
+
+from CommcareTranslationChecker import CheckOptions, validate_workbook, validate_workbook_async
+from CommcareTranslationChecker.exceptions import CheckCancelled
+
+from benchmarks.workbook_generator import generate_workbook
+
+
+class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """
+    Thread pool recording the functions submitted to it, the number of them running at a time and its maximum
+    """
+
+    def __init__(self, maxWorkers):
+        super(RecordingExecutor, self).__init__(maxWorkers)
+        self.submitted = []
+        self.futures = []
+        self.running = 0
+        self.maxRunning = 0
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted.append(fn)
+        future = super(RecordingExecutor, self).submit(self._run, fn, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+    def _run(self, fn, *args, **kwargs):
+        with self.lock:
+            self.running += 1
+            self.maxRunning = max(self.maxRunning, self.running)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.fixture(scope="module")
+def workbook(tmp_path_factory):
+    path = tmp_path_factory.mktemp("workbooks") / "generated.xlsx"
+    generate_workbook(str(path), sheets=4, rows=600, seed=0)
+    with open(str(path), "rb") as f:
+        return f.read()
+
+
+async def check_concurrently(data, uploads, concurrency, executor):
+    """
+    Output:
+    Tuple of the results of checking data uploads times, at most concurrency at a time, and of the number of checks
+    done at each step of a coroutine running meanwhile
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(validate_workbook_async(data, CheckOptions(), semaphore=semaphore,
+                                                         executor=executor)) for _ in range(uploads)]
+    steps = []
+    while not all(task.done() for task in tasks):
+        steps.append(sum(task.done() for task in tasks))
+        await asyncio.sleep(0.001)
+    return await asyncio.gather(*tasks), steps
+
+
+@pytest.mark.parametrize("executorType", ["thread", "process"])
+def test_other_coroutines_progress(workbook, executorType):
+    expectedMessages = validate_workbook(io.BytesIO(workbook))[1]
+
+    executor = concurrent.futures.ProcessPoolExecutor(2) if executorType == "process" else None
+    try:
+        results, steps = asyncio.run(check_concurrently(workbook, 4, 2, executor))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    assert [messages for wbOut, messages in results] == [expectedMessages] * 4
+    # The coroutine kept running before the first check was done and between checks, rather than only once a check
+    # blocking the loop was done
+    assert steps.count(0) > 1
+    assert any(0 < step < 4 for step in steps)
+
+
+def test_semaphore_caps_concurrent_checks(workbook):
+    executor = RecordingExecutor(8)
+    try:
+        results, steps = asyncio.run(check_concurrently(workbook, 6, 2, executor))
+    finally:
+        executor.shutdown()
+    assert len(results) == 6
+    assert len(executor.submitted) == 6
+    assert executor.maxRunning == 2
+
+
+def test_cancel_stops_thread_check(workbook):
+    executor = RecordingExecutor(1)
+
+    async def check_and_cancel():
+        task = asyncio.create_task(validate_workbook_async(workbook, executor=executor))
+        while not executor.running:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    try:
+        asyncio.run(check_and_cancel())
+        # The check stops before its next row rather than running to the end
+        future, = executor.futures
+        with pytest.raises(CheckCancelled):
+            future.result(timeout=60)
+    finally:
+        executor.shutdown()
+    args = executor.submitted[0].args[1]
+    assert args.cancelEvent.is_set()
@@ -0,0 +1,98 @@
+"""
+Check that several workbooks are checked in one run: that directories are replaced by the workbooks they contain,
+that each workbook has the messages of its own check, that the summary gives the status of each, and that the run
+exits with status 1 when a workbook could not be checked, in one and several processes.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import re
+import shutil
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker.CommcareTranslationChecker import (main, mainBatch, parseArguments,
+                                                                     validate_workbook, validate_workbooks)
+
+
+@pytest.fixture
+def batch_folder(tmp_path, workbooks):
+    """
+    Folder of a workbook with mismatches, one without, one that is not a workbook, an Excel lock file and a text file
+    """
+    folder = tmp_path / "batch"
+    folder.mkdir()
+    shutil.copy(workbooks["sample1.xlsx"], str(folder / "sample1.xlsx"))
+    shutil.copy(workbooks["sample1.xlsx"], str(folder / "~$sample1.xlsx"))
+    wb = xl.Workbook()
+    ws = wb.active
+    ws.title = "module1_form1"
+    for row in [["label", "default_en", "default_es"], ["a", "Hello", "Hola"], ["b", "Bye", "Adios"]]:
+        ws.append(row)
+    wb.save(str(folder / "matching.xlsx"))
+    (folder / "broken.xlsx").write_text("not a workbook")
+    (folder / "notes.txt").write_text("not a workbook either")
+    return str(folder)
+
+
+def test_file_is_always_a_list():
+    assert parseArguments(["app.xlsx"]).file == ["app.xlsx"]
+    assert parseArguments(["app.xlsx", "other.xlsx"]).file == ["app.xlsx", "other.xlsx"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_folder_expanded(batch_folder, jobs):
+    results = list(validate_workbooks([batch_folder], parseArguments([batch_folder]), jobs=jobs))
+    assert [os.path.basename(result.file) for result in results] == ["broken.xlsx", "matching.xlsx", "sample1.xlsx"]
+
+    broken, matching, sample = results
+    assert broken.error == "File is not a zip file"
+    assert (matching.error, matching.messages, matching.wsMismatchDict, matching.rowCount) == (None, [], {}, 2)
+    path = os.path.join(batch_folder, "sample1.xlsx")
+    assert sample.error is None
+    assert sample.messages == validate_workbook(path, parseArguments([path]))[1]
+    assert sample.wsMismatchDict == {"Sheet1": 11}
+
+
+@pytest.mark.parametrize("flags", [[], ["--jobs", "2"]])
+def test_summary_lines(batch_folder, capsys, flags):
+    args = parseArguments([batch_folder] + flags)
+    assert mainBatch(args.file, args) == 1
+    lines = capsys.readouterr().out.splitlines()
+
+    brokenPath, matchingPath, samplePath = (os.path.join(batch_folder, name)
+                                            for name in ("broken.xlsx", "matching.xlsx", "sample1.xlsx"))
+    assert lines[:7] == [
+        "== %s ==" % (brokenPath,),
+        "The process could not be completed. File is not a zip file",
+        "== %s ==" % (matchingPath,),
+        "== %s ==" % (samplePath,),
+        "There were issues with the following worksheets:",
+        "Sheet1 : 11 rows mismatched",
+        "Summary:",
+    ]
+    assert lines[7:10] == [
+        "%s : ERROR (File is not a zip file)" % (brokenPath,),
+        "%s : OK (0 rows mismatched in 0 worksheets, 0 missing sheets)" % (matchingPath,),
+        "%s : ISSUES (11 rows mismatched in 1 worksheet, 0 missing sheets)" % (samplePath,),
+    ]
+    assert re.match(r"Checked 3 workbooks and 19 rows in ", lines[10])
+    assert len(lines) == 11
+
+
+def test_exit_status(batch_folder, capsys):
+    # Exits with status 1 as a workbook could not be checked
+    with pytest.raises(SystemExit) as exitInfo:
+        main([batch_folder])
+    assert exitInfo.value.code == 1
+
+    # Workbooks with mismatches do not change the exit status
+    paths = [os.path.join(batch_folder, "matching.xlsx"), os.path.join(batch_folder, "sample1.xlsx")]
+    main(paths)
+    assert "Summary:" in capsys.readouterr().out
+
+    # A single workbook is checked without a summary
+    main(paths[1:])
+    assert capsys.readouterr().out.splitlines() == ["There were issues with the following worksheets:",
+                                                    "Sheet1 : 11 rows mismatched"]
@@ -0,0 +1,129 @@
+"""
+Check that the messages and output cells of every way of running a check are the same as those of the checker
+before the performance work, recorded in data/baseline_results.json for the example workbooks and a generated one.
+The recorded results were produced by validate_workbook of version 0.9.7 with --output-file: for each sheet of the
+saved output file, the number of cells copied unchanged from the input file, and the coordinate, value and style of
+every other cell. Checks with --output-mismatch-types or --skip-format-check raised errors before, so runs
+with them are compared with a single process run with the same options instead.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import glob
+import json
+import os
+import warnings
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker import CommcareTranslationChecker as checker
+from CommcareTranslationChecker.CommcareTranslationChecker import parseArguments, validate_workbook
+
+from conftest import WORKBOOKS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OPTIONS = {
+    "default": [],
+    "ignore-order": ["--ignore-order"],
+    "characters-add": ["--format-check-characters-add", "xz"],
+}
+# Options checks raised errors with before, see the module docstring
+NEW_OPTIONS = {
+    "mismatch-types": ["--output-mismatch-types"],
+    "skip-format-check": ["--skip-format-check"],
+}
+MODES = {
+    "single-process": [],
+    "no-memo-no-prefilter": ["--memo-size", "0", "--no-prefilter"],
+    "stream": ["--stream"],
+    "xml-reader": ["--reader", "xml"],
+    "memory-budget": ["--memory-budget", "1"],
+    "jobs": ["--jobs", "2", "--chunk-rows", "10"],
+    "dedup-pairs-jobs": ["--jobs", "2", "--dedup-pairs"],
+}
+
+
+@pytest.fixture(scope="module")
+def baseline_results():
+    with open(os.path.join(HERE, "data", "baseline_results.json")) as f:
+        return json.load(f)
+
+
+def get_annotations(pathIn, pathOut):
+    """
+    Output:
+    List of the title, number of cells copied unchanged from the workbook at pathIn, and coordinate, value and style
+    of every other cell, of every sheet of the workbook at pathOut. None if there is no output file.
+    """
+    if pathOut is None:
+        return None
+    wbIn = xl.load_workbook(pathIn)
+    wbOut = xl.load_workbook(pathOut)
+    sheets = []
+    for wsOut in wbOut:
+        wsIn = wbIn[wsOut.title]
+        copiedCount = 0
+        cells = []
+        for row in wsOut.iter_rows():
+            for cell in row:
+                if cell.value is None and cell.style == "Normal":
+                    continue
+                if cell.style == "Normal" and wsIn[cell.coordinate].value == cell.value:
+                    copiedCount += 1
+                else:
+                    cells.append([cell.coordinate, cell.value, cell.style])
+        sheets.append([wsOut.title, copiedCount, cells])
+    return sheets
+
+
+def run_check(path, flags, outputFolder):
+    """
+    Output:
+    Dictionary of the messages of the check of the workbook at path with the command line flags, and of the
+    annotations of its output file, see get_annotations
+    """
+    os.makedirs(outputFolder)
+    args = parseArguments([path, "--output-file", "--output-folder", outputFolder] + flags)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        wbOut, messages = validate_workbook(path, args)
+        outputFiles = glob.glob(os.path.join(outputFolder, "*.xlsx"))
+        annotations = get_annotations(path, outputFiles[0] if outputFiles else None)
+    # The name of the output file changes with every run, and --dedup-pairs and --memory-budget add a summary of
+    # the run
+    messages = [message for message in messages if "_Output.xlsx" not in message
+                and "repetition factor" not in message and not message.startswith("Memory budget")]
+    return {"messages": messages, "output": annotations}
+
+
+@pytest.mark.parametrize("mode", list(MODES))
+@pytest.mark.parametrize("optionName", list(OPTIONS))
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_same_results_as_baseline(workbooks, baseline_results, tmp_path, workbook, optionName, mode):
+    result = run_check(workbooks[workbook], OPTIONS[optionName] + MODES[mode], str(tmp_path / "output"))
+    assert result == baseline_results["%s %s" % (workbook, optionName)]
+
+
+@pytest.mark.parametrize("mode", [mode for mode in MODES if mode != "single-process"])
+@pytest.mark.parametrize("optionName", list(NEW_OPTIONS))
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_same_results_as_single_process(workbooks, tmp_path, workbook, optionName, mode):
+    if mode == "stream" and optionName == "mismatch-types":
+        pytest.skip("--stream adds a mismatch column for every compared column up front")
+    expected = run_check(workbooks[workbook], NEW_OPTIONS[optionName], str(tmp_path / "expected"))
+    result = run_check(workbooks[workbook], NEW_OPTIONS[optionName] + MODES[mode], str(tmp_path / "output"))
+    assert result == expected
+
+
+@pytest.mark.parametrize("mode", ["single-process", "dedup-pairs-jobs"])
+def test_dedup_pairs_bounded(workbooks, baseline_results, tmp_path, monkeypatch, mode):
+    # Pairs whose comparison was dropped are compared again, with the same results
+    monkeypatch.setattr(checker, "DEFAULT_DEDUP_MEMO_SIZE", 2)
+    path = workbooks["generated.xlsx"]
+    flags = ["--dedup-pairs", "--memo-size", "0"] + MODES[mode]
+    result = run_check(path, flags, str(tmp_path / "output"))
+    assert result == baseline_results["generated.xlsx default"]
+
+    summary = [message for message in validate_workbook(path, parseArguments([path] + flags))[1]
+               if "repetition factor" in message]
+    assert len(summary) == 1 and summary[0].endswith("dropped beyond the 2 kept, see --memo-size")
@@ -0,0 +1,132 @@
+"""
+Check that --max-mismatches and --fail-fast stop reading a workbook once it has more mismatched rows and missing
+sheets than allowed, that the run then exits with status 1, and that with --jobs the worker processes stop checking
+the worksheets whose results are no longer needed.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import time
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker import check_workbook, rules
+from CommcareTranslationChecker.CommcareTranslationChecker import main, parseArguments
+
+from conftest import WORKBOOKS
+
+STOPPED = "Stopped checking after more than %s mismatched rows and missing sheets, see --max-mismatches"
+# Rows of the worksheet checked slowly by SlowRule
+SLOW_ROWS = 2000
+
+
+def get_issue_count(result):
+    return sum(result.wsMismatchDict.values()) + len(result.missingSheets or [])
+
+
+@pytest.mark.parametrize("maxMismatches", [0, 1, 3])
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_stops_at_budget(workbooks, workbook, maxMismatches):
+    path = workbooks[workbook]
+    full = check_workbook(path, parseArguments([path]))
+    result = check_workbook(path, parseArguments([path, "--max-mismatches", str(maxMismatches)]))
+    assert result.wbOut is None
+
+    if get_issue_count(full) <= maxMismatches:
+        assert result.messages == full.messages
+        assert result.rowCount == full.rowCount
+        return
+    # Stops at the row exceeding the budget
+    assert result.messages[-1] == STOPPED % (maxMismatches,)
+    assert get_issue_count(result) == maxMismatches + 1
+    assert result.rowCount <= full.rowCount
+    assert all(result.wsMismatchDict[title] <= full.wsMismatchDict[title] for title in result.wsMismatchDict)
+
+
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_fail_fast(workbooks, workbook):
+    path = workbooks[workbook]
+    assert check_workbook(path, parseArguments([path, "--fail-fast"])) == \
+        check_workbook(path, parseArguments([path, "--max-mismatches", "0"]))
+
+
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_stops_at_budget_with_jobs(workbooks, workbook):
+    path = workbooks[workbook]
+    full = check_workbook(path, parseArguments([path]))
+    result = check_workbook(path, parseArguments([path, "--jobs", "2", "--chunk-rows", "10", "--fail-fast"]))
+    # Worksheets checked in other processes have their own budget, so more issues may be found
+    assert result.messages[-1] == STOPPED % (0,)
+    assert 0 < get_issue_count(result) <= get_issue_count(full)
+    assert result.rowCount <= full.rowCount
+
+
+def test_exit_status(workbooks, capsys):
+    path = workbooks["sample1.xlsx"]
+    for flags, maxMismatches in [(["--fail-fast"], 0), (["--max-mismatches", "10"], 10),
+                                 (["--jobs", "2", "--fail-fast"], 0)]:
+        with pytest.raises(SystemExit) as exitInfo:
+            main([path] + flags)
+        assert exitInfo.value.code == 1
+        assert capsys.readouterr().out.splitlines()[-1] == STOPPED % (maxMismatches,)
+
+    # Within the budget
+    main([path, "--max-mismatches", "11"])
+    assert capsys.readouterr().out.splitlines() == ["There were issues with the following worksheets:",
+                                                    "Sheet1 : 11 rows mismatched"]
+
+    # When checking many workbooks, exits with status 1 if any is over the budget
+    with pytest.raises(SystemExit) as exitInfo:
+        main([path, workbooks["generated.xlsx"], "--max-mismatches", "10"])
+    assert exitInfo.value.code == 1
+
+
+class SlowRule(rules.Rule):
+    """
+    Takes SLOW_ROWS / 100 seconds to check the rows of the worksheet whose base values start with "slow"
+    """
+    name = "slow"
+    cost = 0
+
+    def check(self, comparison):
+        if str(comparison.base.value).startswith("slow"):
+            time.sleep(0.01)
+            with open(self.logPath, "a") as log:
+                log.write("%s\n" % (comparison.base.value,))
+
+
+@pytest.fixture
+def slow_rule(tmp_path):
+    rule = SlowRule()
+    rule.logPath = str(tmp_path / "slow.log")
+    rules.registerRule(rule)
+    yield rule
+    del rules.RULES[rule.name]
+
+
+def test_workers_stop(slow_rule, tmp_path):
+    # The first worksheet exceeds the budget at its first row, while the second one is checked in another process
+    path = str(tmp_path / "workers.xlsx")
+    wb = xl.Workbook()
+    ws = wb.active
+    ws.title = "mismatched"
+    ws.append(["label", "default_en", "default_es"])
+    for rowNumber in range(SLOW_ROWS + 1):
+        ws.append(["label%s" % (rowNumber,), '<output value="/data/a"/>', "no output value"])
+    ws = wb.create_sheet("slow")
+    ws.append(["label", "default_en", "default_es"])
+    for rowNumber in range(SLOW_ROWS):
+        ws.append(["label%s" % (rowNumber,), "slow %s" % (rowNumber,), "lento %s" % (rowNumber,)])
+    wb.save(path)
+
+    result = check_workbook(path, parseArguments([path, "--jobs", "2", "--chunk-rows", "0", "--fail-fast",
+                                                  "--no-prefilter"]))
+    assert result.messages == ["There were issues with the following worksheets:", "mismatched : 1 row mismatched",
+                               STOPPED % (0,)]
+    # The slow worksheet was not checked to its end, if it was started at all
+    slowRows = 0
+    if os.path.exists(slow_rule.logPath):
+        with open(slow_rule.logPath) as log:
+            slowRows = len(log.read().splitlines())
+    assert slowRows < SLOW_ROWS
@@ -0,0 +1,106 @@
+"""
+Check that check_workbook keeps the mismatch of every cell when asked to, that iterating its MismatchStore yields the
+mismatches of the output file of the same check in workbook order, and that kinds added with addMismatchKind are
+kept, described and styled like the built-in ones.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import itertools
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker import MismatchRecord, MismatchStore, check_workbook, results, rules
+from CommcareTranslationChecker.CommcareTranslationChecker import discardWriteOnlyWorkbook, parseArguments
+
+from conftest import WORKBOOKS
+from test_reports import get_output_records
+
+UNTRANSLATED = results.addMismatchKind("Untranslated", lesser=True)
+EMPTY = results.addMismatchKind("Empty")
+
+
+class UntranslatedRule(rules.Rule):
+    name = "untranslated"
+    cost = 0
+
+    def check(self, comparison):
+        if comparison.base.value and comparison.cur.value == comparison.base.value:
+            comparison.differs = True
+            comparison.mismatchTypes.append(results.Mismatch(UNTRANSLATED, ()))
+        elif comparison.base.value and not comparison.cur.value:
+            comparison.differs = True
+            comparison.mismatchTypes.append(results.Mismatch(EMPTY, ("default_es",)))
+
+
+@pytest.fixture
+def untranslated_rule():
+    rule = rules.registerRule(UntranslatedRule())
+    yield rule
+    del rules.RULES[rule.name]
+
+
+@pytest.mark.parametrize("flags", [[], ["--jobs", "2", "--chunk-rows", "10"], ["--memory-budget", "1"]])
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_mismatches_match_output_file(workbooks, workbook, flags):
+    path = workbooks[workbook]
+    # --memory-budget builds a write-only output workbook, so compare with the output file of a default check
+    expectedMessages, expectedRecords = get_output_records(path, [])
+
+    result = check_workbook(path, parseArguments([path, "--output-mismatch-types"] + flags), keepMismatches=True)
+    discardWriteOnlyWorkbook(result.wbOut)
+    assert [message for message in result.messages if not message.startswith("Memory budget")] == expectedMessages
+    assert isinstance(result.mismatches, MismatchStore)
+    mismatches = list(result.mismatches)
+    assert len(result.mismatches) == len(mismatches)
+    assert all(isinstance(mismatch, MismatchRecord) for mismatch in mismatches)
+
+    # In workbook order, the mismatches of a cell being in the order of their kinds
+    sheetTitles = xl.load_workbook(path, read_only=True).sheetnames
+    positions = [(sheetTitles.index(mismatch.sheet), mismatch.row) for mismatch in mismatches]
+    assert positions == sorted(positions)
+    cells = []
+    for (sheet, row, column), cellMismatches in itertools.groupby(
+            mismatches, lambda mismatch: (mismatch.sheet, mismatch.row, mismatch.column)):
+        cellMismatches = list(cellMismatches)
+        assert [mismatch.kind for mismatch in cellMismatches] == sorted(mismatch.kind for mismatch in cellMismatches)
+        cells.append((sheet, row, column, ",".join(mismatch.message for mismatch in cellMismatches)))
+    assert sorted(cells) == [record[:4] for record in expectedRecords]
+
+
+def test_mismatches_not_kept_by_default(workbooks):
+    path = workbooks["sample1.xlsx"]
+    assert check_workbook(path, parseArguments([path])).mismatches is None
+
+
+@pytest.mark.parametrize("flags", [[], ["--jobs", "2", "--chunk-rows", "1"]])
+def test_added_mismatch_kinds(untranslated_rule, tmp_path, flags):
+    path = str(tmp_path / "untranslated.xlsx")
+    wb = xl.Workbook()
+    ws = wb.active
+    ws.title = "module1_form1"
+    for row in [["label", "default_en", "default_es"], ["a", "Hello", "Hello"], ["b", "Bye", None],
+                ["c", "Yes", "Si"]]:
+        ws.append(row)
+    wb.save(path)
+
+    # Added after the built-in kinds, so listed after them
+    assert UNTRANSLATED > max(results.OUT_OF_ORDER, results.MISSING_VALUES, results.EXTRA_VALUES,
+                              results.ILL_FORMATTED_TAGS, results.FORMAT_CHARACTER_COUNTS)
+    assert EMPTY == UNTRANSLATED + 1
+    assert UNTRANSLATED in results.LESSER_MISMATCH_KINDS and EMPTY not in results.LESSER_MISMATCH_KINDS
+
+    result = check_workbook(path, parseArguments([path, "--output-mismatch-types"] + flags), keepMismatches=True)
+    assert result.messages == ["There were issues with the following worksheets:",
+                               "module1_form1 : 2 rows mismatched"]
+    assert list(result.mismatches) == [MismatchRecord("module1_form1", 2, "default_es", UNTRANSLATED, ()),
+                                       MismatchRecord("module1_form1", 3, "default_es", EMPTY, ("default_es",))]
+    assert [mismatch.message for mismatch in result.mismatches] == ["Untranslated", "Empty - default_es"]
+
+    # Cells with only a lesser kind of mismatch are styled as lesser mismatches
+    wsOut = result.wbOut["module1_form1"]
+    assert (wsOut["C2"].value, wsOut["C2"].style) == ("Hello", "lesserMismatchFillStyle")
+    assert (wsOut["F2"].value, wsOut["F2"].style) == ("Untranslated", "lesserMismatchFillStyle")
+    assert (wsOut["C3"].value, wsOut["C3"].style) == (None, "mismatchFillStyle")
+    assert (wsOut["F3"].value, wsOut["F3"].style) == ("Empty - default_es", "mismatchFillStyle")
+    assert (wsOut["C4"].value, wsOut["C4"].style) == ("Si", "Normal")
@@ -0,0 +1,55 @@
+"""
+Pin the fix of output value tags of cells with ill-formatted tags: tags are removed and swapped where they are in the
+cell, and ill-formatted tags are left as they are, see the README. Up to version 0.9.7, tags were removed by value
+one after the other, and swapped at the first occurrence of their text, garbling it when one was not found.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+from CommcareTranslationChecker.CommcareTranslationChecker import (MISMATCH_FILL_STYLE_NAME, NON_LINGUISTIC_CHARACTERS,
+                                                                   compareRowValues)
+from CommcareTranslationChecker.utils import (fix_output_values, removeExtraOutputValues, swapOutputValues,
+                                              tokenize_output_values)
+
+# Ill-formatted tag containing the tag of /data/b, followed by the tag of /data/a
+NESTED = '<output value="/data/a<output value="/data/b"/>"/> Hola <output value="/data/a"/>'
+
+
+def test_remove_keeps_rest_of_ill_formatted_tag():
+    # Removing the tag of /data/b used to form a tag of /data/a, which was removed too, leaving " Hola "
+    assert removeExtraOutputValues(["/data/b", "/data/a"], NESTED) == '<output value="/data/a"/> Hola '
+
+
+def test_remove_ignores_value_of_ill_formatted_tag():
+    text = 'Hola <output value="/data/a <output value="/data/b"/>'
+    assert removeExtraOutputValues(["/data/a "], text) == text
+
+
+def test_swap_without_tag_leaves_text():
+    # The tag of /data/b was not found, and the text used to be garbled
+    text = ' x <output value="/data/a '
+    assert swapOutputValues(["/data/a", "/data/b"], text) == text
+
+
+def test_swap_skips_ill_formatted_tag():
+    text = '<output value="/data/b"/> y <output value="/data/x <output value="/data/a"/>'
+    assert swapOutputValues(["/data/b", "/data/a"], text) == \
+        '<output value="/data/a"/> y <output value="/data/x <output value="/data/b"/>'
+
+
+def test_swap_two_tags():
+    # Cells with two tags are swapped from the spans of their tags, like cells with more tags
+    text = 'Hola <output value="/data/b"/> y <output value="/data/a"/>.'
+    swapped = 'Hola <output value="/data/a"/> y <output value="/data/b"/>.'
+    for swapValueList in (["/data/b", "/data/a"], ["/data/a", "/data/b"]):
+        assert swapOutputValues(swapValueList, text) == swapped
+        assert fix_output_values(text + " <output value=", tokenize_output_values(text + " <output value="),
+                                 swapValueList=swapValueList) == swapped + " <output value="
+    assert swapOutputValues(["/data/a", "/data/a"], text) == text
+    assert swapOutputValues(["/data/a", "/data/c"], text) == text
+
+
+def test_fix_column_of_cell_with_ill_formatted_tag():
+    baseColumnDict, mismatchDict, fixDict = compareRowValues(["Hello", NESTED], {0: "default_en", 1: "default_es"},
+                                                             formatCheckCharacters=NON_LINGUISTIC_CHARACTERS)
+    assert 1 in mismatchDict
+    assert fixDict[1] == ('<output value="/data/a"/> Hola ', MISMATCH_FILL_STYLE_NAME)
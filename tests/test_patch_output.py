@@ -0,0 +1,104 @@
+"""
+Check that --output-engine patch reads the workbook read-only, and that its output file has the same cells as the
+output file of the workbook engine, value and fill, apart from the rows of sheets without compared columns, which
+the workbook engine leaves out and the patch engine keeps. The workbook engine copies values only, while the patch
+engine keeps the formatting of the input file, so cells the check does not fill keep the fill of the input file.
+Fills are compared by color rather than by named style, as openpyxl cannot tell the named style of cells of files
+whose cell style formats are not all named styles, such as sample1.xlsx.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import glob
+import os
+import zipfile
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker.CommcareTranslationChecker import parseArguments, validate_workbook
+
+from conftest import WORKBOOKS
+
+
+def save_output(path, flags, outputFolder):
+    """
+    Output:
+    Tuple of the messages of the check of the workbook at path with the command line flags, but the first one
+    naming the output file, and of the path of its output file (None if it has none)
+    """
+    os.makedirs(outputFolder)
+    wbOut, messages = validate_workbook(path, parseArguments([path, "--output-file", "--output-folder", outputFolder]
+                                                             + flags))
+    outputFiles = glob.glob(os.path.join(outputFolder, "*.xlsx"))
+    return messages[1:], outputFiles[0] if outputFiles else None
+
+
+def get_fill(cell):
+    """
+    Output:
+    ARGB color of the solid fill of cell, None if it has none
+    """
+    return cell.fill.fgColor.rgb if cell.fill.fill_type == "solid" else None
+
+
+def get_cells(ws):
+    """
+    Output:
+    Dictionary of the value and fill of every cell of ws with a value or a fill, by coordinate
+    """
+    return dict((cell.coordinate, (cell.value, get_fill(cell))) for row in ws.iter_rows() for cell in row
+                if cell.value is not None or get_fill(cell) is not None)
+
+
+@pytest.mark.parametrize("flags", [[], ["--output-mismatch-types"], ["--stream"], ["--reader", "xml"],
+                                   ["--memory-budget", "1"], ["--jobs", "2", "--chunk-rows", "10"]])
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_same_cells_as_workbook_engine(workbooks, full_loads, tmp_path, workbook, flags):
+    path = workbooks[workbook]
+    expectedMessages, expectedPath = save_output(path, flags, str(tmp_path / "workbook"))
+    del full_loads[:]
+    messages, outputPath = save_output(path, ["--output-engine", "patch"] + flags, str(tmp_path / "patch"))
+    assert full_loads == []
+    assert messages == expectedMessages
+    if expectedPath is None:
+        assert outputPath is None
+        return
+
+    wbIn = xl.load_workbook(path)
+    wbExpected = xl.load_workbook(expectedPath)
+    wbOut = xl.load_workbook(outputPath)
+    assert wbOut.sheetnames == wbExpected.sheetnames
+    for wsExpected in wbExpected:
+        inputCells = get_cells(wbIn[wsExpected.title])
+        expectedCells = {}
+        for coordinate, (value, fill) in get_cells(wsExpected).items():
+            if fill is None:
+                fill = inputCells.get(coordinate, (None, None))[1]
+            expectedCells[coordinate] = (value, fill)
+        cells = get_cells(wbOut[wsExpected.title])
+        if wsExpected.max_row > 1:
+            for coordinate, (value, fill) in inputCells.items():
+                expectedCells.setdefault(coordinate, (None, fill))
+            assert cells == expectedCells, wsExpected.title
+        else:
+            # Only the header of sheets without compared columns is written by the workbook engine
+            assert dict((coordinate, cells.get(coordinate)) for coordinate in expectedCells) == expectedCells
+
+
+def test_untouched_parts_copied_as_stored(workbooks, tmp_path):
+    path = workbooks["TranslationCheckerTest_BulkAppTranslation.xlsx"]
+    messages, outputPath = save_output(path, ["--output-engine", "patch"], str(tmp_path / "patch"))
+    with zipfile.ZipFile(path) as zipIn, zipfile.ZipFile(outputPath) as zipOut:
+        assert zipOut.testzip() is None
+        assert zipOut.namelist() == zipIn.namelist()
+        patched = set()
+        for info in zipIn.infolist():
+            outInfo = zipOut.getinfo(info.filename)
+            if zipOut.read(info.filename) != zipIn.read(info):
+                patched.add(info.filename)
+            else:
+                assert (outInfo.compress_type, outInfo.compress_size, outInfo.CRC) == \
+                    (info.compress_type, info.compress_size, info.CRC)
+    # Only the styles and the worksheets with compared columns are rewritten
+    assert "xl/styles.xml" in patched
+    assert all(name == "xl/styles.xml" or name.startswith("xl/worksheets/") for name in patched)
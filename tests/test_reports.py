@@ -0,0 +1,62 @@
+"""
+Check that --report-format runs read the workbook read-only, and that their records are the mismatches of the output
+file of the same check: one record for each cell of a mismatch_ column, with the text of the fix_ column, and one
+for each sheet missing from the configuration sheet.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import json
+
+import pytest
+
+from CommcareTranslationChecker.CommcareTranslationChecker import parseArguments, validate_workbook
+from CommcareTranslationChecker.reports import createReportWriter
+
+from conftest import WORKBOOKS
+
+MISSING_SHEET = "Missing Sheet - "
+
+
+def get_output_records(path, flags):
+    """
+    Output:
+    Tuple of the messages of the check of the workbook at path with the command line flags, and of the sorted
+    (sheet, row, column, mismatch types, fix) of the mismatch_ cells of its output workbook
+    """
+    wbOut, messages = validate_workbook(path, parseArguments([path, "--output-mismatch-types"] + flags))
+    records = []
+    for wsOut in wbOut:
+        header = [cell.value for cell in next(wsOut.iter_rows(max_row=1))]
+        for rowNumber, row in enumerate(wsOut.iter_rows(min_row=2, values_only=True), 2):
+            for columnIdx, name in enumerate(header):
+                if name and name.startswith("mismatch_") and row[columnIdx] is not None:
+                    column = name[len("mismatch_"):]
+                    fix = row[header.index("fix_" + column)] if "fix_" + column in header else None
+                    records.append((wsOut.title, rowNumber, column, row[columnIdx], fix))
+    return messages, sorted(records)
+
+
+@pytest.mark.parametrize("flags", [[], ["--ignore-order"], ["--jobs", "2", "--chunk-rows", "10"]])
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_records_match_output_file(workbooks, full_loads, workbook, flags):
+    path = workbooks[workbook]
+    expectedMessages, expectedRecords = get_output_records(path, flags)
+    del full_loads[:]
+
+    reportFile = io.StringIO()
+    wbOut, messages = validate_workbook(path, parseArguments([path] + flags),
+                                        reportWriter=createReportWriter("jsonl", reportFile, path))
+    assert wbOut is None
+    assert full_loads == []
+    assert messages == expectedMessages
+
+    records = [json.loads(line) for line in reportFile.getvalue().splitlines()]
+    assert all(record["file"] == path for record in records)
+    missingSheets = [record["mismatch_types"][0][len(MISSING_SHEET):] for record in records
+                     if record["mismatch_types"][0].startswith(MISSING_SHEET)]
+    assert ["%s is missing from the workbook." % (sheet,) for sheet in missingSheets] == \
+        [message for message in expectedMessages if message.endswith("is missing from the workbook.")]
+    assert sorted((record["sheet"], record["row"], record["column"], ",".join(record["mismatch_types"]),
+                   record["fix"]) for record in records
+                  if not record["mismatch_types"][0].startswith(MISSING_SHEET)) == expectedRecords
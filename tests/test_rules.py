@@ -0,0 +1,128 @@
+"""
+Check that --skip-rules turns off the rules given by name, that custom rules registered with registerRule are run
+in this process and in worker processes, that rule names are unique, and that the built-in rules are registered
+once, also when the checker is run with python -m.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import subprocess
+import sys
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker import results, rules
+from CommcareTranslationChecker.CommcareTranslationChecker import parseArguments, validate_workbook
+from CommcareTranslationChecker.exceptions import FatalError
+
+from conftest import EXAMPLES, WORKBOOKS
+
+BUILTIN_RULES = ["output_values", "character_counts", "ill_formatted_tags", "format_tags"]
+EMPTY_TRANSLATION = results.addMismatchKind("Empty Translation")
+
+
+class EmptyTranslationRule(rules.Rule):
+    name = "empty_translation"
+    cost = 0
+
+    def check(self, comparison):
+        if comparison.base.value and not comparison.cur.value:
+            comparison.differs = True
+            comparison.mismatchTypes.append(results.Mismatch(EMPTY_TRANSLATION, ()))
+
+
+@pytest.fixture
+def empty_translation_rule():
+    rule = rules.registerRule(EmptyTranslationRule())
+    yield rule
+    del rules.RULES[rule.name]
+
+
+def get_mismatch_cells(path, flags):
+    """
+    Output:
+    Tuple of the messages of the check of the workbook at path with the command line flags and
+    --output-mismatch-types, and of the sorted (sheet, coordinate, mismatch types) of every mismatch_ cell of its
+    output workbook
+    """
+    wbOut, messages = validate_workbook(path, parseArguments([path, "--output-mismatch-types"] + flags))
+    cells = []
+    for wsOut in wbOut:
+        rows = list(wsOut.iter_rows())
+        for colIdx, headerCell in enumerate(rows[0] if rows else []):
+            if isinstance(headerCell.value, str) and headerCell.value.startswith("mismatch_"):
+                cells.extend((wsOut.title, row[colIdx].coordinate, row[colIdx].value) for row in rows[1:]
+                             if row[colIdx].value is not None)
+    return messages, sorted(cells)
+
+
+def test_builtin_rules():
+    assert list(rules.RULES) == BUILTIN_RULES
+
+
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_skip_rules_same_as_skip_format_check(workbooks, workbook):
+    path = workbooks[workbook]
+    assert get_mismatch_cells(path, ["--skip-rules", "character_counts,format_tags"]) == \
+        get_mismatch_cells(path, ["--skip-format-check"])
+
+
+def test_skip_rules_drops_mismatches_of_rule(workbooks):
+    path = workbooks["TranslationCheckerTest_BulkAppTranslation.xlsx"]
+    messages, cells = get_mismatch_cells(path, [])
+    assert any("Text Formatting Mismatch" in mismatchTypes for sheet, coordinate, mismatchTypes in cells)
+    skippedMessages, skippedCells = get_mismatch_cells(path, ["--skip-rules", "character_counts"])
+    assert skippedCells
+    assert not any("Text Formatting Mismatch" in mismatchTypes for sheet, coordinate, mismatchTypes in skippedCells)
+    # No other cell mismatches
+    assert set((sheet, coordinate) for sheet, coordinate, mismatchTypes in skippedCells) < \
+        set((sheet, coordinate) for sheet, coordinate, mismatchTypes in cells)
+
+
+def test_skip_unknown_rule(workbooks):
+    path = workbooks["sample1.xlsx"]
+    with pytest.raises(FatalError, match="Unknown rule no_such_rule, the rules are %s" % (",".join(BUILTIN_RULES),)):
+        validate_workbook(path, parseArguments([path, "--skip-rules", "no_such_rule"]))
+
+
+@pytest.mark.parametrize("flags", [[], ["--jobs", "2"], ["--jobs", "2", "--chunk-rows", "1"]])
+def test_custom_rule(empty_translation_rule, tmp_path, flags):
+    path = str(tmp_path / "empty.xlsx")
+    wb = xl.Workbook()
+    ws = wb.active
+    ws.title = "module1_form1"
+    for row in [["label", "default_en", "default_es"], ["a", "Hello", "Hola"], ["b", "Bye", None],
+                ["c", "Yes", "Si"]]:
+        ws.append(row)
+    wb.save(path)
+
+    assert list(rules.RULES) == BUILTIN_RULES + ["empty_translation"]
+    messages, cells = get_mismatch_cells(path, flags)
+    assert messages == ["There were issues with the following worksheets:", "module1_form1 : 1 row mismatched"]
+    assert cells == [("module1_form1", "F3", "Empty Translation")]
+    # Skipped like the built-in rules
+    assert get_mismatch_cells(path, flags + ["--skip-rules", "empty_translation"]) == ([], [])
+
+
+def test_duplicate_rule_name(empty_translation_rule):
+    class OtherEmptyTranslationRule(EmptyTranslationRule):
+        pass
+
+    with pytest.raises(FatalError, match="A rule named empty_translation is already registered"):
+        rules.registerRule(OtherEmptyTranslationRule())
+    with pytest.raises(FatalError, match="A rule named output_values is already registered"):
+        rules.registerRule(rules.OutputValuesRule())
+    assert rules.RULES["empty_translation"] is empty_translation_rule
+    assert list(rules.RULES) == BUILTIN_RULES + ["empty_translation"]
+
+
+def test_run_as_module():
+    # The package does not import the checker before runpy runs it, so it is neither imported twice nor warned about
+    process = subprocess.run(
+        [sys.executable, "-W", "error::RuntimeWarning", "-m", "CommcareTranslationChecker.CommcareTranslationChecker",
+         os.path.join(EXAMPLES, "sample1.xlsx"), "--skip-rules", "format_tags"],
+        cwd=os.path.dirname(EXAMPLES), stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    assert process.returncode == 0, process.stderr
+    assert "RuntimeWarning" not in process.stderr
+    assert "Sheet1 : 11 rows mismatched" in process.stdout
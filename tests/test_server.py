@@ -0,0 +1,158 @@
+"""
+Check the validation service over HTTP: that uploads are checked like files with the options of the query string,
+that other options are rejected with 400, too large uploads with 413, files that are not workbooks with 422 and
+uploads beyond the queue with 503, and that /metrics gives the percentiles of the latencies of the uploads.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import base64
+import concurrent.futures
+import http.client
+import io
+import json
+import threading
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker.CommcareTranslationChecker import check_workbook, parseArguments
+from CommcareTranslationChecker.server import createServer
+
+MAX_UPLOAD_MB = 1
+
+
+@pytest.fixture
+def server():
+    server = createServer(port=0, workers=1, maxQueue=0, maxUploadMb=MAX_UPLOAD_MB)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+    server.service.close()
+
+
+def request(server, method, path, body=None):
+    """
+    Output:
+    Tuple of the HTTP status and the JSON body of the response
+    """
+    connection = http.client.HTTPConnection(*server.server_address, timeout=60)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+    finally:
+        connection.close()
+
+
+def read_workbook(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("query,flags", [
+    ("", []),
+    ("?ignore-order&skip-rules=format_tags", ["--ignore-order", "--skip-rules", "format_tags"]),
+    ("?output-mismatch-types&max-mismatches=100", ["--output-mismatch-types", "--max-mismatches", "100"]),
+])
+def test_upload_checked_with_query_options(server, workbooks, query, flags):
+    path = workbooks["sample1.xlsx"]
+    status, body = request(server, "POST", "/validate" + query, read_workbook(path))
+    assert status == 200
+    result = check_workbook(path, parseArguments([path] + flags))
+    assert body["status"] == "ISSUES"
+    assert body["messages"] == result.messages
+    assert body["mismatched_rows"] == result.wsMismatchDict
+    assert body["rows"] == result.rowCount
+    assert body["output_xlsx"] is None
+
+
+def test_output_returned(server, workbooks):
+    path = workbooks["sample1.xlsx"]
+    status, body = request(server, "POST", "/validate?output", read_workbook(path))
+    assert status == 200
+    wbOut = xl.load_workbook(io.BytesIO(base64.b64decode(body["output_xlsx"])))
+    assert "mismatchFlag" in [cell.value for cell in wbOut["Sheet1"][1]]
+
+
+@pytest.mark.parametrize("query,error", [
+    ("?jobs=4", "Unsupported option: jobs"),
+    ("?report-format=csv", "Unsupported option: report-format"),
+    ("?output-folder=/tmp", "Unsupported option: output-folder"),
+    ("?max-mismatches=many", "Invalid options: --max-mismatches many"),
+    ("?output&output-engine=patch", "The patch output engine only patches saved files, so output cannot be "
+                                    "returned with it"),
+])
+def test_unsupported_options(server, workbooks, query, error):
+    status, body = request(server, "POST", "/validate" + query, read_workbook(workbooks["sample1.xlsx"]))
+    assert (status, body) == (400, {"error": error})
+
+
+def test_oversized_upload(server):
+    # Rejected from its Content-Length, before the body is read, so the body is not sent
+    connection = http.client.HTTPConnection(*server.server_address, timeout=60)
+    try:
+        connection.putrequest("POST", "/validate")
+        connection.putheader("Content-Length", str(MAX_UPLOAD_MB * 1024 * 1024 + 1))
+        connection.endheaders()
+        response = connection.getresponse()
+        status, body = response.status, json.loads(response.read().decode("utf-8"))
+    finally:
+        connection.close()
+    assert (status, body) == (413, {"error": "Uploads are limited to %s bytes" % (MAX_UPLOAD_MB * 1024 * 1024,)})
+
+
+def test_not_a_workbook(server):
+    status, body = request(server, "POST", "/validate", b"not a workbook")
+    assert status == 422
+    assert body["error"] == "File is not a zip file"
+
+
+def test_queue_full(server, workbooks, monkeypatch):
+    # The first upload holds the only worker until its result is set, and there is no queue
+    result = concurrent.futures.Future()
+    submitted = threading.Event()
+
+    def submit(*args):
+        submitted.set()
+        return result
+
+    monkeypatch.setattr(server.service.executor, "submit", submit)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        first = pool.submit(request, server, "POST", "/validate", read_workbook(workbooks["sample1.xlsx"]))
+        assert submitted.wait(60)
+        status, body = request(server, "POST", "/validate", read_workbook(workbooks["sample1.xlsx"]))
+        assert (status, body) == (503, {"error": "Too many uploads are being checked, try again later"})
+        assert request(server, "GET", "/metrics")[1]["in_flight"] == 1
+
+        result.set_result({"status": "OK"})
+        status, body = first.result()
+    assert status == 200 and body["status"] == "OK"
+    metrics = request(server, "GET", "/metrics")[1]
+    assert metrics["requests"] == {"200": 1, "503": 1}
+    assert (metrics["in_flight"], metrics["queued"]) == (0, 0)
+
+
+def test_metrics_percentiles(server, workbooks):
+    assert request(server, "GET", "/metrics")[1]["latency_seconds"] == {
+        "count": 0, "p50": None, "p90": None, "p99": None, "max": None}
+
+    latencies = []
+    for workbook in ["sample1.xlsx", "TranslationCheckerTest_BulkAppTranslation.xlsx", "generated.xlsx"]:
+        status, body = request(server, "POST", "/validate", read_workbook(workbooks[workbook]))
+        assert status == 200
+        latencies.append(body["latency_seconds"])
+    latencies.append(request(server, "POST", "/validate", b"not a workbook")[1]["latency_seconds"])
+    request(server, "POST", "/validate?jobs=4", b"not a workbook")
+
+    status, metrics = request(server, "GET", "/metrics")
+    assert status == 200
+    # Rejected options are not checked, so they have no latency
+    assert metrics["requests"] == {"200": 3, "422": 1}
+    assert (metrics["workers"], metrics["max_queue"]) == (1, 0)
+    # The latencies at the index of each fraction of the sorted latencies
+    latencies.sort()
+    assert metrics["latency_seconds"] == {"count": 4, "p50": latencies[2], "p90": latencies[3], "p99": latencies[3],
+                                          "max": latencies[3]}
@@ -0,0 +1,60 @@
+"""
+Check that --sparse-output reads the workbook read-only, and that its output file has the cells and styles of the
+flagged rows of the output file of the same check, after their input row number, and nothing else.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import glob
+import os
+
+import openpyxl as xl
+import pytest
+
+from CommcareTranslationChecker.CommcareTranslationChecker import (SPARSE_ROW_NUMBER_COLUMN, parseArguments,
+                                                                   validate_workbook)
+
+from conftest import WORKBOOKS
+
+
+def get_cells(row):
+    """
+    Output:
+    List of the value and style of the cells of row, without the empty cells at its end
+    """
+    cells = [(cell.value, cell.style) for cell in row]
+    while cells and cells[-1] == (None, "Normal"):
+        cells.pop()
+    return cells
+
+
+@pytest.mark.parametrize("flags", [[], ["--output-mismatch-types"], ["--stream"],
+                                   ["--jobs", "2", "--chunk-rows", "10"]])
+@pytest.mark.parametrize("workbook", WORKBOOKS)
+def test_flagged_rows_of_output_file(workbooks, full_loads, tmp_path, workbook, flags):
+    path = workbooks[workbook]
+    # The workbook engine with the same columns, in a single process
+    wbExpected, expectedMessages = validate_workbook(path, parseArguments(
+        [path] + [flag for flag in flags if flag == "--output-mismatch-types"]))
+    expected = {}
+    for wsExpected in wbExpected:
+        rows = list(wsExpected.iter_rows())
+        # Every flag of a row, of a mismatch or of a missing sheet, has a fill style
+        flaggedRows = [[(rowNumber, "Normal")] + get_cells(row) for rowNumber, row in enumerate(rows[1:], 2)
+                       if any(cell.style != "Normal" for cell in row)]
+        if flaggedRows:
+            expected[wsExpected.title] = [[(SPARSE_ROW_NUMBER_COLUMN, "Normal")] + get_cells(rows[0])] + flaggedRows
+    del full_loads[:]
+
+    outputFolder = str(tmp_path)
+    wbOut, messages = validate_workbook(path, parseArguments([path, "--sparse-output", "--output-file",
+                                                              "--output-folder", outputFolder] + flags))
+    assert full_loads == []
+    # Only the first message names the output file
+    assert messages[1:] == expectedMessages[1:]
+    outputFiles = glob.glob(os.path.join(outputFolder, "*.xlsx"))
+    if not outputFiles:
+        assert expected == {}
+        return
+    wbSparse = xl.load_workbook(outputFiles[0])
+    assert dict((wsSparse.title, [get_cells(row) for row in wsSparse.iter_rows()]) for wsSparse in wbSparse) == \
+        expected
@@ -0,0 +1,95 @@
+"""
+Check that SpillLists keep their records as they are within their MemoryBudget, spill the largest list to a
+temporary file beyond it, and give back every record in order across the spill, also for a MismatchStore kept
+within a budget.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+from CommcareTranslationChecker import results
+from CommcareTranslationChecker.results import MismatchRecord, MismatchStore
+from CommcareTranslationChecker.spill import SIZE_SAMPLE_INTERVAL, MemoryBudget, SpillList, getRecordSize
+
+
+def make_row(rowNumber):
+    return (rowNumber, ["label_%s" % (rowNumber,), "Hello", "Hola %s" % (rowNumber,)], [None, None, "mismatch"], 3)
+
+
+def test_records_kept_as_they_are_within_budget():
+    rows = [make_row(rowNumber) for rowNumber in range(2, 12)]
+    # Only the first of these records is measured, and the others are counted as its size
+    budget = MemoryBudget(getRecordSize(rows[0]) * len(rows))
+    spillList = SpillList(budget)
+    for row in rows:
+        spillList.append(row)
+
+    assert spillList.spillFile is None
+    assert budget.usedBytes == budget.limitBytes and budget.spilledBytes == 0
+    assert len(spillList) == len(rows)
+    assert all(record is row for record, row in zip(spillList, rows))
+
+
+def test_sampled_record_sizes():
+    rows = [make_row(rowNumber) for rowNumber in range(2, 2 + SIZE_SAMPLE_INTERVAL * 2)]
+    budget = MemoryBudget(1000 * 1000)
+    spillList = SpillList(budget)
+    for row in rows:
+        spillList.append(row)
+    # The records are counted as the mean size of the first record and of the first record of the second interval
+    meanSize = (getRecordSize(rows[0]) + getRecordSize(rows[SIZE_SAMPLE_INTERVAL])) // 2
+    assert budget.usedBytes == getRecordSize(rows[0]) * SIZE_SAMPLE_INTERVAL + meanSize * SIZE_SAMPLE_INTERVAL
+
+
+def test_records_round_trip_across_spill():
+    rows = [make_row(rowNumber) for rowNumber in range(2, 107)]
+    budget = MemoryBudget(getRecordSize(rows[0]) * 10)
+    spillList = SpillList(budget)
+    for row in rows:
+        spillList.append(row)
+        assert budget.usedBytes <= budget.limitBytes
+
+    assert spillList.spillFile is not None
+    assert 0 < spillList.spilledCount < len(rows)
+    assert budget.spilledBytes == spillList.spillFile.tell()
+    assert len(spillList) == len(rows)
+    assert list(spillList) == rows
+    # Iterated again, with the records still in memory after the spilled ones
+    assert list(spillList) == rows
+    spilled = list(spillList)[:spillList.spilledCount]
+    assert all(record is not row for record, row in zip(spilled, rows))
+    assert all(record is row for record, row in zip(list(spillList)[spillList.spilledCount:],
+                                                     rows[spillList.spilledCount:]))
+
+    spillList.close()
+    assert spillList.spillFile is None
+    assert budget.usedBytes == 0 and budget.spillLists == []
+
+
+def test_largest_list_spilled():
+    budget = MemoryBudget(getRecordSize(make_row(2)) * 5)
+    small = SpillList(budget)
+    large = SpillList(budget)
+    small.append(make_row(2))
+    for rowNumber in range(3, 8):
+        large.append(make_row(rowNumber))
+
+    assert small.spillFile is None and large.spilledCount == 5
+    assert list(small) == [make_row(2)]
+    assert list(large) == [make_row(rowNumber) for rowNumber in range(3, 8)]
+
+
+def test_mismatch_store_round_trip_across_spill():
+    budget = MemoryBudget(1000)
+    store = MismatchStore(budget)
+    sheetIdx = store.addSheet("module1_form1", {2: "default_es", 3: "default_fr"})
+    expected = []
+    for rowNumber in range(2, 202):
+        details = ("/data/question%s" % (rowNumber,),)
+        store.addCodes(sheetIdx, rowNumber, 2, results.MISSING_VALUES, details)
+        store.addCodes(sheetIdx, rowNumber, 3, results.OUT_OF_ORDER, ())
+        expected.append(MismatchRecord("module1_form1", rowNumber, "default_es", results.MISSING_VALUES, details))
+        expected.append(MismatchRecord("module1_form1", rowNumber, "default_fr", results.OUT_OF_ORDER, ()))
+
+    assert store.records.spilledCount > 0
+    assert len(store) == len(expected)
+    assert list(store) == expected
+    assert store.countByKind() == {results.MISSING_VALUES: 200, results.OUT_OF_ORDER: 200}